@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+로컬 인식 파이프라인(recognize-fen.py) 벤치마크.
+
+FEN에서 합성한 스크린샷(board_synth)으로 단계별 시간과 칸 단위 정확도를 측정하고
+JSON 리포트를 남깁니다. 같은 --seed면 같은 케이스 집합이 만들어지므로
+변경 전후 리포트를 --compare로 비교할 수 있습니다.
+
+  python scripts/bench-recognition.py --out bench.json
+  python scripts/bench-recognition.py --compare bench.json --out bench-new.json
+  # 해상도별 비교 (4K/5K가 1080p와 비슷한 시간인지)
+  python scripts/bench-recognition.py --resolutions 1920x1080,3840x2160,5120x2880
+
+측정 단계:
+  decode        PNG/JPEG bytes → BGR (cv2.imdecode)
+  detect.pyramid  감지용 GrayPyramid 생성
+  detect.<방식>  DETECTION_METHODS 각각을 단독 실행 (같은 피라미드 공유)
+  detect        detect_board_area 전체 (그레이 변환 + 피라미드 + DetectorScheduler의 학습된 순서/동시 실행/조기 종료).
+                스케줄러는 케이스를 거치며 방식별 비용/성공률을 학습하므로 상주 worker와 같은 조건입니다
+  warp          extract_board (보드를 정사각형으로 펴기)
+  classify      내장 분류기(64칸 13클래스 배치), 가중치가 없으면 classify_colors
+                (테마 프로파일 또는 classify_cells 규칙으로 64칸 색상 판정)
+  assemble      placement_from_pieces / placement_from_colors (방향 판단 + FEN 조립)
+  debug_encode  오버레이 + 600px 리사이즈 + PNG + base64
+"""
+import argparse
+import base64
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+import board_synth  # noqa: E402
+
+RESOLUTIONS = ((1280, 800), (1920, 1080), (2560, 1440))
+ENCODINGS = (("png", None), ("jpeg", 90), ("jpeg", 60))
+BOARD_FRACTIONS = (0.55, 0.7, 0.85)
+
+
+def load_recognizer():
+    """하이픈이 들어간 파일명이라 importlib로 직접 로드합니다."""
+    spec = importlib.util.spec_from_file_location("recognize_fen", os.path.join(SCRIPTS_DIR, "recognize-fen.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_cases(seed, limit=None, resolutions=RESOLUTIONS):
+    """테마 × 해상도 × 방향 × 인코딩 매트릭스. 위치/패딩/배치는 seed로 고정됩니다."""
+    rng = np.random.default_rng(seed)
+    cases = []
+    for theme in board_synth.THEMES:
+        for canvas in resolutions:
+            for flipped in (False, True):
+                for encoding, quality in ENCODINGS:
+                    index = len(cases)
+                    placement = (
+                        board_synth.START_PLACEMENT if index % 4 == 0
+                        else board_synth.random_placement(rng)
+                    )
+                    cases.append({
+                        "id": f"{theme}-{canvas[0]}x{canvas[1]}-{'black' if flipped else 'white'}-"
+                              f"{encoding}{quality or ''}",
+                        "theme": theme,
+                        "canvas": list(canvas),
+                        "flipped": flipped,
+                        "encoding": encoding,
+                        "quality": quality,
+                        "boardFraction": float(BOARD_FRACTIONS[int(rng.integers(len(BOARD_FRACTIONS)))]),
+                        "background": int(rng.integers(len(board_synth.BACKGROUNDS))),
+                        "placement": placement,
+                        "seed": int(rng.integers(2 ** 31)),
+                    })
+    if limit:
+        cases = cases[:limit]
+    return cases
+
+
+def render_case(case):
+    img, box = board_synth.render_screenshot(
+        case["placement"],
+        canvas=tuple(case["canvas"]),
+        board_fraction=case["boardFraction"],
+        theme=case["theme"],
+        flipped=case["flipped"],
+        background=board_synth.BACKGROUNDS[case["background"]],
+        rng=np.random.default_rng(case["seed"]),
+    )
+    if case["encoding"] == "jpeg":
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, case["quality"]])
+    else:
+        ok, buf = cv2.imencode(".png", img)
+    if not ok:
+        raise RuntimeError(f"encode failed: {case['id']}")
+    return buf.tobytes(), box
+
+
+def area_box(area):
+    if not area:
+        return None
+    return (area["topLeft"]["x"], area["topLeft"]["y"], area["bottomRight"]["x"], area["bottomRight"]["y"])
+
+
+def iou(a, b):
+    if a is None or b is None:
+        return 0.0
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def square_accuracy(truth, predicted):
+    """백 시점 기준 64칸 비교: 점유 여부, 기물 색, 정확한 기물."""
+    expected = board_synth.placement_to_grid(truth)
+    actual = board_synth.placement_to_grid(predicted)
+    occupancy = color = piece = 0
+    for rank in range(8):
+        for file in range(8):
+            e, a = expected[rank][file], actual[rank][file]
+            occupancy += bool(e) == bool(a)
+            color += (e.isupper() if e else None) == (a.isupper() if a else None)
+            piece += e == a
+    return {"occupancy": occupancy / 64.0, "color": color / 64.0, "piece": piece / 64.0}
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000.0
+
+
+def run_case(rec, case, repeat):
+    """케이스 하나를 repeat회 실행하고 단계별 최소 시간(ms)과 정확도를 기록합니다."""
+    data, truth_box = render_case(case)
+    timings = {}
+
+    def record(stage, ms):
+        timings[stage] = min(ms, timings.get(stage, ms))
+
+    for _ in range(repeat):
+        img, ms = timed(cv2.imdecode, np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        record("decode", ms)
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        pyramid, ms = timed(rec.GrayPyramid, gray, cv2)
+        record("detect.pyramid", ms)
+
+        methods = {}
+        for name, detect, _ in rec.DETECTION_METHODS:
+            try:
+                (found, found_details), ms = timed(detect, pyramid, cv2, np)
+                error = None
+            except Exception as e:
+                found, found_details, ms, error = None, {}, 0.0, str(e)
+            record(f"detect.{name}", ms)
+            confidence = found_details.get("confidence", 0.0) if found is not None else None
+            methods[name] = {
+                "found": found is not None,
+                "iou": round(iou(area_box(found), truth_box), 4),
+                "confidence": confidence,
+            }
+            if error:
+                methods[name]["error"] = error
+        (area, method, _), ms = timed(rec.detect_board_area, img, cv2, np)
+        record("detect", ms)
+
+        if area is None:
+            break
+        board_img, ms = timed(rec.extract_board, img, area, cv2, np)
+        record("warp", ms)
+        classifier = rec.get_piece_classifier()
+        if classifier is not None:
+            (_pieces, probs), ms = timed(classifier.classify, board_img)
+            record("classify", ms)
+            (placement, flipped, _), ms = timed(rec.placement_from_pieces, probs)
+        else:
+            (colors, _profile), ms = timed(rec.classify_colors, board_img, cv2, np)
+            record("classify", ms)
+            (placement, flipped), ms = timed(rec.placement_from_colors, colors, np)
+        record("assemble", ms)
+
+        def debug_encode():
+            debug_img = img.copy()
+            rec.draw_debug_overlay(debug_img, area, placement, None, None, cv2)
+            h, w = debug_img.shape[:2]
+            if w > 600:
+                debug_img = cv2.resize(debug_img, (600, int(h * 600.0 / w)))
+            ok, buf = cv2.imencode(".png", debug_img)
+            return base64.b64encode(buf.tobytes()) if ok else b""
+
+        _, ms = timed(debug_encode)
+        record("debug_encode", ms)
+
+    result = {
+        "id": case["id"],
+        "bytes": len(data),
+        "method": method,
+        "methods": methods,
+        "iou": round(iou(area_box(area), truth_box), 4),
+        "timings": {k: round(v, 3) for k, v in timings.items()},
+    }
+    if area is None:
+        result.update({"placement": None, "flipCorrect": False,
+                       "squares": {"occupancy": 0.0, "color": 0.0, "piece": 0.0}})
+    else:
+        result.update({
+            "placement": placement,
+            "flipCorrect": flipped == case["flipped"],
+            "squares": square_accuracy(case["placement"], placement),
+        })
+    return result
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 3) if values else None
+
+
+def summarize(results):
+    stages = sorted({stage for r in results for stage in r["timings"]})
+    timings = {}
+    for stage in stages:
+        values = [r["timings"][stage] for r in results if stage in r["timings"]]
+        timings[stage] = {
+            "n": len(values),
+            "mean": round(float(np.mean(values)), 3),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+        }
+    n = len(results) or 1
+    detection = {}
+    for name in sorted({m for r in results for m in r["methods"]}):
+        entries = [r["methods"][name] for r in results if name in r["methods"]]
+        detection[name] = {
+            "foundRate": round(sum(e["found"] for e in entries) / len(entries), 4),
+            "meanIou": round(sum(e["iou"] for e in entries) / len(entries), 4),
+        }
+    methods_used = {}
+    for r in results:
+        methods_used[r["method"] or "none"] = methods_used.get(r["method"] or "none", 0) + 1
+    return {
+        "cases": len(results),
+        "timings": timings,
+        "detection": detection,
+        "methodsUsed": methods_used,
+        "accuracy": {
+            "meanIou": round(sum(r["iou"] for r in results) / n, 4),
+            "detected90": round(sum(r["iou"] >= 0.9 for r in results) / n, 4),
+            "occupancy": round(sum(r["squares"]["occupancy"] for r in results) / n, 4),
+            "color": round(sum(r["squares"]["color"] for r in results) / n, 4),
+            "piece": round(sum(r["squares"]["piece"] for r in results) / n, 4),
+            "flip": round(sum(r["flipCorrect"] for r in results) / n, 4),
+        },
+    }
+
+
+def print_summary(summary, baseline=None):
+    def delta(new, old, lower_is_better):
+        if old is None or new is None:
+            return ""
+        diff = new - old
+        if old:
+            pct = diff / old * 100.0
+            mark = "+" if diff >= 0 else ""
+            better = (diff < 0) == lower_is_better and abs(pct) >= 5
+            worse = (diff > 0) == lower_is_better and abs(pct) >= 5
+            tag = " better" if better else " WORSE" if worse else ""
+            return f"  ({mark}{pct:.1f}%{tag})"
+        return f"  ({diff:+.3f})"
+
+    base_timings = (baseline or {}).get("timings", {})
+    base_accuracy = (baseline or {}).get("accuracy", {})
+    print(f"cases: {summary['cases']}  methods: {summary['methodsUsed']}")
+    print(f"{'stage':<30}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage, t in summary["timings"].items():
+        old = base_timings.get(stage, {})
+        print(f"{stage:<30}{t['p50']:>10.2f}{t['p95']:>10.2f}{delta(t['p50'], old.get('p50'), True)}")
+    print("accuracy:")
+    for key, value in summary["accuracy"].items():
+        print(f"  {key:<12}{value:>8.4f}{delta(value, base_accuracy.get(key), False)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local board recognition pipeline.")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--limit", type=int, default=0, help="run only the first N cases")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case (min time is reported)")
+    parser.add_argument("--out", help="write JSON report to this path")
+    parser.add_argument("--compare", help="baseline JSON report to diff against")
+    parser.add_argument("--resolutions", help="comma-separated WxH canvases (default: 1280x800,1920x1080,2560x1440)")
+    args = parser.parse_args()
+    resolutions = RESOLUTIONS
+    if args.resolutions:
+        resolutions = tuple(tuple(int(v) for v in r.lower().split("x")) for r in args.resolutions.split(","))
+
+    rec = load_recognizer()
+    cv2.setNumThreads(1)  # 스레드 수에 따른 편차를 없애 런 간 비교가 가능하도록
+    cases = build_cases(args.seed, args.limit, resolutions)
+    results = []
+    for i, case in enumerate(cases, 1):
+        results.append(run_case(rec, case, max(1, args.repeat)))
+        print(f"\r[bench] {i}/{len(cases)} {case['id']:<40}", end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+
+    summary = summarize(results)
+    report = {
+        "config": {"seed": args.seed, "limit": args.limit, "repeat": args.repeat, "cases": len(cases),
+                   "resolutions": ["x".join(map(str, r)) for r in resolutions]},
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+            "pyramidMinSide": rec.PYRAMID_MIN_SIDE,
+            "pyramidMaxSide": rec.PYRAMID_MAX_SIDE,
+            "detectMinConfidence": rec.DETECT_MIN_CONFIDENCE,
+            "detectParallel": rec.DETECT_PARALLEL,
+            "detectScheduler": rec.get_detect_scheduler().stats(),
+            "pieceClassifier": rec.get_piece_classifier() is not None,
+        },
+        "summary": summary,
+        "results": results,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f).get("summary")
+    print_summary(summary, baseline)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
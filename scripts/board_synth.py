@@ -0,0 +1,179 @@
+"""
+FEN에서 체스판 스크린샷을 합성합니다 (벤치마크/학습용).
+
+실제 사이트 에셋 대신 cv2 도형으로 기물 실루엣을 그리므로 외부 파일이 필요 없고,
+같은 seed에서는 항상 같은 이미지가 나옵니다.
+"""
+import cv2
+import numpy as np
+
+# BGR (밝은 칸, 어두운 칸)
+THEMES = {
+    "green": ((210, 238, 238), (86, 150, 118)),
+    "brown": ((181, 217, 240), (99, 136, 181)),
+    "blue": ((236, 227, 222), (178, 146, 120)),
+    "gray": ((220, 220, 220), (140, 140, 140)),
+}
+
+# 화면 배경색 후보 (보드 바깥 UI)
+BACKGROUNDS = ((40, 40, 40), (49, 46, 43), (245, 245, 245), (30, 30, 36))
+
+PIECES = "PNBRQKpnbrqk"
+START_PLACEMENT = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR"
+
+
+def placement_to_grid(placement):
+    """FEN 배치 문자열 → 8x8 list ('' 는 빈칸). rank 8이 0번 행입니다."""
+    grid = []
+    for row in placement.split()[0].split("/"):
+        cells = []
+        for char in row:
+            if char.isdigit():
+                cells.extend([""] * int(char))
+            else:
+                cells.append(char)
+        grid.append(cells)
+    return grid
+
+
+def grid_to_placement(grid):
+    rows = []
+    for cells in grid:
+        row = ""
+        empty = 0
+        for piece in cells:
+            if not piece:
+                empty += 1
+                continue
+            if empty:
+                row += str(empty)
+                empty = 0
+            row += piece
+        if empty:
+            row += str(empty)
+        rows.append(row)
+    return "/".join(rows)
+
+
+def random_placement(rng, min_pieces=4, max_pieces=32):
+    """양쪽 킹 + 무작위 기물 배치 (폰은 1/8랭크 제외)."""
+    grid = [[""] * 8 for _ in range(8)]
+    free = list(range(64))
+    rng.shuffle(free)
+    for king in ("K", "k"):
+        square = free.pop()
+        grid[square // 8][square % 8] = king
+    count = int(rng.integers(min_pieces, max_pieces + 1)) - 2
+    pool = "PPPPPPPPNNBBRRQpppppppppnnbbrrq"
+    for _ in range(max(0, count)):
+        if not free:
+            break
+        piece = pool[int(rng.integers(len(pool)))]
+        square = free.pop()
+        rank = square // 8
+        if piece in "Pp" and rank in (0, 7):
+            piece = "N" if piece == "P" else "n"
+        grid[rank][square % 8] = piece
+    return grid_to_placement(grid)
+
+
+def draw_piece(img, x, y, size, piece):
+    """(x, y) 좌상단, size 크기의 칸에 기물 실루엣을 그립니다. 종류마다 모양이 다릅니다."""
+    fill = (245, 245, 245) if piece.isupper() else (35, 35, 35)
+    edge = (30, 30, 30) if piece.isupper() else (200, 200, 200)
+    kind = piece.lower()
+    s = size / 100.0
+
+    def pt(px, py):
+        return int(round(x + px * s)), int(round(y + py * s))
+
+    shapes = []
+    # 공통 받침대
+    shapes.append(("rect", pt(25, 78), pt(75, 88)))
+    if kind == "p":
+        shapes += [("circle", pt(50, 42), int(12 * s)), ("poly", [pt(38, 78), pt(44, 52), pt(56, 52), pt(62, 78)])]
+    elif kind == "n":
+        shapes += [("poly", [pt(32, 78), pt(36, 40), pt(52, 18), pt(72, 38), pt(62, 44), pt(56, 40), pt(64, 78)])]
+    elif kind == "b":
+        shapes += [("ellipse", pt(50, 52), (int(14 * s), int(24 * s))), ("circle", pt(50, 22), int(6 * s))]
+    elif kind == "r":
+        shapes += [
+            ("rect", pt(32, 36), pt(68, 78)),
+            ("rect", pt(28, 20), pt(38, 36)),
+            ("rect", pt(45, 20), pt(55, 36)),
+            ("rect", pt(62, 20), pt(72, 36)),
+        ]
+    elif kind == "q":
+        shapes += [
+            ("poly", [pt(30, 78), pt(22, 28), pt(38, 50), pt(50, 18), pt(62, 50), pt(78, 28), pt(70, 78)]),
+            ("circle", pt(50, 16), int(5 * s)),
+        ]
+    elif kind == "k":
+        shapes += [
+            ("rect", pt(34, 34), pt(66, 78)),
+            ("rect", pt(46, 10), pt(54, 34)),
+            ("rect", pt(38, 16), pt(62, 24)),
+        ]
+
+    thickness = max(1, int(round(3 * s)))
+    for shape in shapes:
+        if shape[0] == "rect":
+            cv2.rectangle(img, shape[1], shape[2], fill, -1)
+            cv2.rectangle(img, shape[1], shape[2], edge, thickness)
+        elif shape[0] == "circle":
+            cv2.circle(img, shape[1], shape[2], fill, -1)
+            cv2.circle(img, shape[1], shape[2], edge, thickness)
+        elif shape[0] == "ellipse":
+            cv2.ellipse(img, shape[1], shape[2], 0, 0, 360, fill, -1)
+            cv2.ellipse(img, shape[1], shape[2], 0, 0, 360, edge, thickness)
+        else:
+            poly = np.array(shape[1], np.int32)
+            cv2.fillPoly(img, [poly], fill)
+            cv2.polylines(img, [poly], True, edge, thickness)
+
+
+def render_board(placement, square=80, theme="green", flipped=False):
+    """보드만 (8*square, 8*square, 3) 로 렌더링합니다. flipped이면 흑 시점."""
+    light, dark = THEMES[theme]
+    board = np.empty((8 * square, 8 * square, 3), np.uint8)
+    grid = placement_to_grid(placement)
+    if flipped:
+        grid = [row[::-1] for row in grid[::-1]]
+    for rank in range(8):
+        for file in range(8):
+            y, x = rank * square, file * square
+            board[y:y + square, x:x + square] = light if (rank + file) % 2 == 0 else dark
+            if grid[rank][file]:
+                draw_piece(board, x, y, square, grid[rank][file])
+    return board
+
+
+def render_screenshot(placement, canvas=(1280, 800), board_fraction=0.7, offset=None,
+                      theme="green", flipped=False, background=BACKGROUNDS[0], rng=None):
+    """
+    배경 캔버스 위에 보드를 배치한 스크린샷을 만듭니다.
+
+    Returns: (img, box) - box는 실제 보드의 (x1, y1, x2, y2), x2/y2는 포함하지 않는 끝
+    """
+    width, height = canvas
+    square = max(8, int(min(width, height) * board_fraction) // 8)
+    side = square * 8
+    if offset is None:
+        if rng is None:
+            offset = ((width - side) // 2, (height - side) // 2)
+        else:
+            offset = (int(rng.integers(0, width - side + 1)), int(rng.integers(0, height - side + 1)))
+    x, y = offset
+    img = np.empty((height, width, 3), np.uint8)
+    img[:] = background
+    # 보드 주변 UI 흉내 (패널, 좌표 텍스트 영역)
+    cv2.rectangle(img, (max(0, x - 12), max(0, y - 12)), (min(width - 1, x + side + 12), min(height - 1, y + side + 12)),
+                  tuple(int(c * 0.8) for c in background), -1)
+    img[y:y + side, x:x + side] = render_board(placement, square, theme, flipped)
+    return img, (x, y, x + side, y + side)
+
+
+def jpeg_roundtrip(img, quality):
+    """JPEG 압축 노이즈를 입힙니다."""
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR) if ok else img
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+classify_cells(64칸 배치 버전)가 has_piece(칸 하나씩)와 같은 결과를 내는지 확인하는 회귀 검사.
+
+board_synth로 합성한 보드(테마 × 칸 크기 × 방향)에 JPEG 압축 / 가우시안 노이즈 / 8의 배수가 아닌 크롭을
+섞고 순수 노이즈 이미지도 넣어, 64칸 'w'/'b'/'' 격자가 하나라도 다르면 exit code 1로 끝납니다.
+
+  python scripts/check-classify-cells.py
+  python scripts/check-classify-cells.py --boards 200 --seed 3
+"""
+import argparse
+import importlib.util
+import os
+import sys
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+import board_synth  # noqa: E402
+
+# 칸 크기 (px): has_piece가 빈칸으로 처리하는 20px 미만과 큰 보드까지
+SQUARE_SIZES = (18, 24, 37, 56, 80, 110)
+
+
+def load_recognizer():
+    """하이픈이 들어간 파일명이라 importlib로 직접 로드합니다."""
+    spec = importlib.util.spec_from_file_location("recognize_fen", os.path.join(SCRIPTS_DIR, "recognize-fen.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_boards(seed, count):
+    """(이름, 보드 이미지) 목록. 같은 seed에서는 항상 같은 이미지입니다."""
+    rng = np.random.default_rng(seed)
+    themes = sorted(board_synth.THEMES)
+    boards = []
+    for i in range(count):
+        square = SQUARE_SIZES[i % len(SQUARE_SIZES)]
+        theme = themes[(i // len(SQUARE_SIZES)) % len(themes)]
+        flipped = bool(rng.integers(2))
+        board = board_synth.render_board(board_synth.random_placement(rng), square, theme, flipped)
+        variant = i % 4
+        if variant == 1:
+            board = board_synth.jpeg_roundtrip(board, int(rng.integers(40, 95)))
+        elif variant == 2:
+            noise = rng.normal(0, 6, board.shape)
+            board = np.clip(board.astype(np.float64) + noise, 0, 255).astype(np.uint8)
+        elif variant == 3:
+            # 감지 결과처럼 가장자리가 어긋난 크롭 (8의 배수가 아닌 크기)
+            dy, dx = (int(v) for v in rng.integers(1, 8, 2))
+            board = np.ascontiguousarray(board[dy:, :board.shape[1] - dx])
+        boards.append((f"{theme}-{square}px-v{variant}{'-flipped' if flipped else ''}", board))
+    for i in range(max(1, count // 10)):
+        side = 8 * SQUARE_SIZES[i % len(SQUARE_SIZES)] + int(rng.integers(0, 8))
+        boards.append((f"noise-{side}px", rng.integers(0, 256, (side, side, 3), dtype=np.uint8)))
+    return boards
+
+
+def reference_cells(rec, board, cv2, np):
+    """has_piece를 칸마다 호출한 8x8 격자 (classify_cells와 같은 칸 분할)."""
+    cell_h, cell_w = board.shape[0] // 8, board.shape[1] // 8
+    return [
+        [rec.has_piece(board[r * cell_h:(r + 1) * cell_h, c * cell_w:(c + 1) * cell_w], cv2, np) for c in range(8)]
+        for r in range(8)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check classify_cells against per-square has_piece.")
+    parser.add_argument("--boards", type=int, default=48, help="synthetic boards (plus 10%% pure-noise images)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rec = load_recognizer()
+    failures = []
+    boards = build_boards(args.seed, args.boards)
+    occupied = 0
+    for name, board in boards:
+        expected = reference_cells(rec, board, cv2, np)
+        actual = rec.classify_cells(board, cv2, np)
+        occupied += sum(1 for row in expected for cell in row if cell)
+        diff = [(r, c, expected[r][c], actual[r][c]) for r in range(8) for c in range(8) if expected[r][c] != actual[r][c]]
+        if diff:
+            failures.append(f"{name}: {len(diff)} squares differ, e.g. {diff[:3]}")
+
+    print(f"[classify_cells] {len(boards)} boards, {occupied} occupied squares by has_piece")
+    if failures:
+        print("FAILED", file=sys.stderr)
+        for failure in failures:
+            print(f"  - {failure}", file=sys.stderr)
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
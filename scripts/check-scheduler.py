@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+fen_scheduler.DetectorScheduler 동작 회귀 검사.
+
+sleep으로 시간을 흉내 낸 가짜 감지 방식으로 다음을 확인하고, 하나라도 실패하면 exit code 1로 끝납니다.
+- 느린 주 방식이 성공하면 fallback 방식은 시작하지 않음
+- 주 방식이 모두 실패하면 fallback 방식을 시작함
+- deadline이 주 방식보다 먼저 지나도 fallback 결과는 마감 안에 끝나 있음 (처음 보는 fallback / 학습된 fallback)
+- 마감을 넘겨 무시된 방식이 남아 있으면 shutdown()이 True
+
+  python scripts/check-scheduler.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fen_scheduler import DetectorScheduler  # noqa: E402
+
+# 가짜 방식 시간 (초)
+SLOW = 0.3
+FAST = 0.01
+
+
+def method(seconds, result, started):
+    def run():
+        started.append(time.perf_counter())
+        time.sleep(seconds)
+        return result
+    return run
+
+
+def accept(result):
+    return result is not None
+
+
+def scheduler(parallel=3):
+    return DetectorScheduler(["primary", "second", "fallback"], parallel=parallel, fallback=("fallback",), cold_hedge=0.02)
+
+
+def check_fallback_waits_for_success():
+    started = []
+    sched = scheduler()
+    tasks = {
+        "primary": method(SLOW, "box", []),
+        "second": method(FAST, None, []),
+        "fallback": method(FAST, "rough", started),
+    }
+    winner, finished, timed_out, _ = sched.run(tasks, accept)
+    if winner != "primary" or started or timed_out:
+        return f"winner={winner} fallbackStarted={bool(started)} timedOut={timed_out}"
+    return None
+
+
+def check_fallback_after_failures():
+    sched = scheduler()
+    tasks = {"primary": method(FAST, None, []), "second": method(FAST, None, []), "fallback": method(FAST, "rough", [])}
+    winner, finished, _, _ = sched.run(tasks, accept)
+    if winner is not None or finished.get("fallback", (None,))[0] != "rough":
+        return f"winner={winner} finished={sorted(finished)}"
+    return None
+
+
+def check_deadline_keeps_fallback(parallel, warm):
+    sched = scheduler(parallel)
+    if warm:
+        sched.record("fallback", FAST, True)
+    tasks = {"primary": method(SLOW, "box", []), "second": method(SLOW, "box", []), "fallback": method(FAST, "rough", [])}
+    start = time.perf_counter()
+    deadline = start + 0.1
+    winner, finished, timed_out, _ = sched.run(tasks, accept, deadline)
+    elapsed = time.perf_counter() - start
+    problems = []
+    if not timed_out or winner is not None:
+        problems.append(f"timedOut={timed_out} winner={winner}")
+    if finished.get("fallback", (None,))[0] != "rough":
+        problems.append(f"fallback missing (finished={sorted(finished)})")
+    if elapsed > 0.1 + 0.05:
+        problems.append(f"returned {elapsed * 1000:.0f}ms after start (deadline 100ms)")
+    if not sched.shutdown():
+        problems.append("shutdown() did not report the ignored slow methods")
+    return "; ".join(problems) or None
+
+
+def main():
+    checks = (
+        ("fallback waits while a primary can still win", check_fallback_waits_for_success),
+        ("fallback runs after primaries fail", check_fallback_after_failures),
+        ("deadline keeps cold fallback (parallel=3)", lambda: check_deadline_keeps_fallback(3, False)),
+        ("deadline keeps learned fallback (parallel=1)", lambda: check_deadline_keeps_fallback(1, True)),
+    )
+    failures = []
+    for name, check in checks:
+        problem = check()
+        print(f"[scheduler] {name}: {'ok' if problem is None else problem}")
+        if problem is not None:
+            failures.append(f"{name}: {problem}")
+    if failures:
+        print("FAILED", file=sys.stderr)
+        for failure in failures:
+            print(f"  - {failure}", file=sys.stderr)
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
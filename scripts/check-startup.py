@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+recognize-fen.py one-shot 시작 비용 회귀 검사.
+
+`python -X importtime` 출력으로 시나리오별 import 목록과 누적 import 시간을 측정하여
+- 이미지가 없는 요청이 numpy/cv2/board_to_fen 등 무거운 모듈을 import 하는지
+- 디코딩할 수 없는 이미지 요청이 딥러닝 프레임워크(board_to_fen)를 import 하는지
+- 이미지 없는 요청의 전체 import 시간이 예산(--budget-ms)을 넘는지
+를 확인하고, 하나라도 실패하면 exit code 1로 끝납니다.
+
+  python scripts/check-startup.py
+  python scripts/check-startup.py --budget-ms 40 --runs 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recognize-fen.py")
+
+HEAVY_MODULES = ("numpy", "cv2", "PIL", "board_to_fen", "torch", "tensorflow", "onnxruntime", "sqlite3")
+ML_MODULES = ("board_to_fen", "torch", "tensorflow", "onnxruntime")
+
+SCENARIOS = (
+    # (이름, stdin, 금지 모듈, 시간 예산 적용 여부)
+    ("no_image", {}, HEAVY_MODULES, True),
+    ("undecodable_image", {"imageBase64": "aGVsbG8=", "debug": "none"}, ML_MODULES, False),
+)
+
+
+def parse_importtime(stderr):
+    """
+    importtime 출력 → (모듈별 누적 시간 us, 최상위 import 누적 합 us).
+    들여쓰기가 없는 줄이 최상위 import 입니다.
+    """
+    modules = {}
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        cumulative = int(cumulative_us.strip())
+        module = name.strip()
+        modules[module] = max(modules.get(module, 0), cumulative)
+        if not name[1:].startswith(" "):
+            total += cumulative
+    return modules, total
+
+
+def run_scenario(payload, runs):
+    """runs번 실행하여 가장 빠른 실행의 결과를 돌려줍니다 (디스크 캐시/스케줄링 잡음 제거)."""
+    best = None
+    env = dict(os.environ, CHESS_FEN_PROFILE="")
+    for _ in range(max(1, runs)):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", SCRIPT],
+            input=json.dumps(payload).encode(),
+            capture_output=True,
+            env=env,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.decode(errors="replace")[-2000:])
+        modules, total = parse_importtime(proc.stderr.decode(errors="replace"))
+        if best is None or total < best[1]:
+            best = (modules, total)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check recognize-fen.py cold-start imports.")
+    parser.add_argument("--budget-ms", type=float, default=60.0,
+                        help="max total import time for a request without an image")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8, help="print the N slowest imports per scenario")
+    args = parser.parse_args()
+
+    failures = []
+    for name, payload, forbidden, budgeted in SCENARIOS:
+        modules, total = run_scenario(payload, args.runs)
+        total_ms = total / 1000.0
+        print(f"[{name}] total import time {total_ms:.1f} ms ({len(modules)} modules)")
+        for module, cumulative in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"    {cumulative / 1000.0:8.1f} ms  {module}")
+        loaded = sorted({m for m in modules if m.split(".")[0] in forbidden})
+        if loaded:
+            failures.append(f"{name}: imported {', '.join(loaded)}")
+        if budgeted and total_ms > args.budget_ms:
+            failures.append(f"{name}: {total_ms:.1f} ms exceeds budget {args.budget_ms:.1f} ms")
+
+    if failures:
+        print("FAILED", file=sys.stderr)
+        for failure in failures:
+            print(f"  - {failure}", file=sys.stderr)
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+recognize-fen.py --worker 프로토콜 smoke 검사.
+
+CHESS_WORKER_THREADS별로 worker를 띄워 ready 한 줄을 받은 뒤 ping / stats / recognize(합성 보드 여러 장,
+스레드가 여럿이면 동시에 처리됨) / analyse(fen 없는 요청)를 한꺼번에 보내고, 모든 id에 제시간에 응답하는지와
+응답 모양을 확인합니다. 하나라도 실패하면 exit code 1로 끝납니다.
+
+  python scripts/check-worker.py
+  python scripts/check-worker.py --threads 1,4 --timeout 60
+"""
+import argparse
+import base64
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(SCRIPTS_DIR, "recognize-fen.py")
+sys.path.insert(0, SCRIPTS_DIR)
+
+# recognize 요청 수 (스레드 풀과 추론 마이크로 배치가 실제로 겹치도록 스레드 수보다 많이)
+RECOGNIZE_REQUESTS = 6
+
+
+def board_images(count):
+    """합성 보드 PNG의 base64 목록."""
+    import cv2
+    import numpy as np
+
+    import board_synth
+
+    rng = np.random.default_rng(0)
+    themes = sorted(board_synth.THEMES)
+    images = []
+    for i in range(count):
+        board = board_synth.render_board(board_synth.random_placement(rng), 48, themes[i % len(themes)], False)
+        ok, encoded = cv2.imencode(".png", board)
+        images.append(base64.b64encode(encoded.tobytes()).decode("ascii"))
+    return images
+
+
+def build_requests(images):
+    """(id, 요청, 응답 검사 함수) 목록."""
+    requests = [
+        (1, {"id": 1, "type": "ping"}, lambda r: r.get("pong") is True),
+        (2, {"id": 2, "type": "stats"}, lambda r: isinstance(r.get("stats"), dict)),
+        (3, {"id": 3, "type": "analyse", "payload": {}}, lambda r: r.get("result", {}).get("error") == "fen is required"),
+    ]
+    for i, image in enumerate(images):
+        request_id = 10 + i
+        requests.append((
+            request_id,
+            {"id": request_id, "payload": {"imageBase64": image}},
+            lambda r: isinstance(r.get("result", {}).get("fen"), str) and "timings" in r,
+        ))
+    return requests
+
+
+def run_worker(threads, requests, timeout):
+    """worker 하나를 띄워 요청을 보내고 실패 메시지 목록을 돌려줍니다."""
+    env = dict(os.environ, CHESS_WORKER_THREADS=str(threads), CHESS_FEN_PROFILE="")
+    proc = subprocess.Popen(
+        [sys.executable, SCRIPT, "--worker"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env,
+    )
+    lines = queue.Queue()
+    threading.Thread(target=lambda: [lines.put(line) for line in proc.stdout], daemon=True).start()
+    stderr = []
+    threading.Thread(target=lambda: stderr.extend(proc.stderr), daemon=True).start()
+
+    failures = []
+    try:
+        try:
+            ready = json.loads(lines.get(timeout=timeout))
+        except queue.Empty:
+            ready = None
+        if not ready or ready.get("type") != "ready":
+            tail = b"".join(stderr).decode(errors="replace")[-1500:]
+            return [f"no ready line (exit code {proc.poll()}): {tail}"]
+        if ready.get("threads") != threads:
+            failures.append(f"ready reports {ready.get('threads')} threads")
+
+        for _, message, _ in requests:
+            proc.stdin.write((json.dumps(message) + "\n").encode())
+        proc.stdin.flush()
+
+        expected = {request_id: check for request_id, _, check in requests}
+        while expected:
+            try:
+                response = json.loads(lines.get(timeout=timeout))
+            except queue.Empty:
+                failures.append(f"no response for ids {sorted(expected)} (exit code {proc.poll()})")
+                break
+            check = expected.pop(response.get("id"), None)
+            if check is None:
+                failures.append(f"unexpected response: {json.dumps(response)[:200]}")
+            elif "error" in response or not check(response):
+                failures.append(f"bad response for id {response.get('id')}: {json.dumps(response)[:200]}")
+    finally:
+        proc.stdin.close()
+        try:
+            code = proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            code = "killed"
+    if code != 0:
+        failures.append(f"worker exited with {code} after stdin EOF")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Smoke-test recognize-fen.py --worker.")
+    parser.add_argument("--threads", default="1,2", help="comma-separated CHESS_WORKER_THREADS values")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for each line")
+    args = parser.parse_args()
+
+    requests = build_requests(board_images(RECOGNIZE_REQUESTS))
+    failures = []
+    for threads in (int(v) for v in args.threads.split(",") if v.strip()):
+        problems = run_worker(threads, requests, args.timeout)
+        print(f"[worker] threads={threads}: {len(requests)} requests, {len(problems)} problems")
+        failures.extend(f"threads={threads}: {problem}" for problem in problems)
+
+    if failures:
+        print("FAILED", file=sys.stderr)
+        for failure in failures:
+            print(f"  - {failure}", file=sys.stderr)
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+fen_engine 점검용 가짜 UCI 엔진 (실제 탐색 없음, 표준 라이브러리 + fen_moves만 사용).
+
+- uci / isready / setoption / ucinewgame / position fen ... / go depth N | movetime M / stop / quit
+- bestmove는 둘 차례 기물 중 보드 순서로 처음 찾은 이동(잡기 우선), 점수는 둘 차례 기준 기물 점수 차이(cp)
+- 시간 초과/엔진 사망 경로를 시험할 수 있도록 지연과 종료를 흉내 냅니다
+
+  CHESS_ENGINE_PATH="python scripts/fake-uci-engine.py" python scripts/recognize-fen.py analyse "<fen>"
+  python scripts/fake-uci-engine.py --delay-ms 200 --crash-after 3
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fen_moves import attacks, is_white, placement_to_board, square_name  # noqa: E402
+
+PIECE_VALUES = {"p": 100, "n": 300, "b": 300, "r": 500, "q": 900, "k": 0}
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
+def choose_move(board, white):
+    """잡기가 있으면 첫 잡기, 없으면 첫 폰 전진/기물 이동 (합법성은 보지 않습니다)."""
+    quiet = None
+    for rank in range(8):
+        for file in range(8):
+            piece = board[rank][file]
+            if not piece or is_white(piece) != white:
+                continue
+            origin = square_name((rank, file))
+            for r, f in attacks(board, (rank, file)):
+                target = board[r][f]
+                if piece.lower() == "p":
+                    if target and is_white(target) != white:
+                        return origin + square_name((r, f))
+                    continue
+                if target and is_white(target) != white:
+                    return origin + square_name((r, f))
+                if not target and quiet is None:
+                    quiet = origin + square_name((r, f))
+            if piece.lower() == "p" and quiet is None:
+                r = rank + (-1 if white else 1)
+                if 0 <= r < 8 and not board[r][file]:
+                    quiet = origin + square_name((r, file))
+    return quiet or "0000"
+
+
+def material(board, white):
+    score = 0
+    for row in board:
+        for piece in row:
+            if piece:
+                value = PIECE_VALUES[piece.lower()]
+                score += value if is_white(piece) == white else -value
+    return score
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Minimal fake UCI engine for exercising fen_engine.")
+    parser.add_argument("--delay-ms", type=float, default=float(os.environ.get("FAKE_UCI_DELAY_MS", "0")),
+                        help="sleep per reported depth")
+    parser.add_argument("--crash-after", type=int, default=0, help="exit after N go commands (0 = never)")
+    parser.add_argument("--ignore-stop", action="store_true", help="never answer stop (simulates a hung engine)")
+    args = parser.parse_args()
+
+    lock = threading.Lock()
+    stop = threading.Event()
+    fen = START_FEN
+    searches = 0
+    search = None
+
+    def send(line):
+        with lock:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+
+    def run(position, depth, movetime):
+        fields = position.split()
+        board = placement_to_board(fields[0])
+        white = fields[1:2] != ["b"]
+        best = choose_move(board, white)
+        score = material(board, white)
+        started = time.monotonic()
+        for d in range(1, depth + 1):
+            if stop.is_set() and not args.ignore_stop:
+                break
+            if movetime and (time.monotonic() - started) * 1000 >= movetime:
+                break
+            time.sleep(args.delay_ms / 1000.0)
+            send(f"info depth {d} score cp {score} nodes {d * 1000} pv {best}")
+        if args.ignore_stop and stop.is_set():
+            return
+        send(f"bestmove {best}")
+
+    for raw in sys.stdin:
+        line = raw.strip()
+        if line == "uci":
+            send("id name FakeEngine")
+            send("id author chess_front")
+            send("option name Threads type spin default 1 min 1 max 512")
+            send("option name Hash type spin default 16 min 1 max 33554432")
+            send("uciok")
+        elif line == "isready":
+            send("readyok")
+        elif line.startswith("position"):
+            tokens = line.split()
+            if len(tokens) > 1 and tokens[1] == "fen":
+                end = tokens.index("moves") if "moves" in tokens else len(tokens)
+                fen = " ".join(tokens[2:end])
+            else:
+                fen = START_FEN
+        elif line.startswith("go"):
+            searches += 1
+            if args.crash_after and searches > args.crash_after:
+                sys.exit(3)
+            tokens = line.split()
+            depth = int(tokens[tokens.index("depth") + 1]) if "depth" in tokens else 64
+            movetime = int(tokens[tokens.index("movetime") + 1]) if "movetime" in tokens else 0
+            stop.clear()
+            search = threading.Thread(target=run, args=(fen, depth, movetime), daemon=True)
+            search.start()
+        elif line == "stop":
+            stop.set()
+        elif line == "quit":
+            break
+    stop.set()
+
+
+if __name__ == "__main__":
+    main()
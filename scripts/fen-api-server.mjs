@@ -1,5 +1,7 @@
 import http from "node:http";
+import net from "node:net";
 import { spawn } from "node:child_process";
+import { createHash } from "node:crypto";
 
 const PORT = process.env.CHESS_FEN_API_PORT || 5179;
 const DEFAULT_FEN =
@@ -7,6 +9,183 @@ const DEFAULT_FEN =
   "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1";
 const MODEL_CMD = process.env.CHESS_FEN_MODEL_CMD || "";
 const BOARD_AREA_ENV = process.env.CHESS_BOARD_AREA || "";
+// 상주 worker 수 (0이면 요청마다 프로세스를 띄우는 기존 방식)
+const WORKER_COUNT = Number(process.env.CHESS_FEN_WORKERS ?? 2);
+// worker 하나에 동시에 보낼 요청 수. 1보다 크면 worker를 CHESS_WORKER_THREADS=같은 값으로 띄워
+// recognizer가 요청을 스레드로 처리하고 분류기 추론을 요청 간 마이크로 배치로 묶게 합니다
+const WORKER_CONCURRENCY = Math.max(1, Number(process.env.CHESS_FEN_WORKER_CONCURRENCY || 1));
+// 동시에 처리/대기할 수 있는 최대 요청 수 (초과 시 503)
+const MAX_IN_FLIGHT = Number(process.env.CHESS_FEN_MAX_IN_FLIGHT || 8);
+const REQUEST_TIMEOUT_MS = Number(process.env.CHESS_FEN_REQUEST_TIMEOUT_MS || 30_000);
+const HEALTH_INTERVAL_MS = Number(process.env.CHESS_FEN_HEALTH_INTERVAL_MS || 15_000);
+const HEALTH_TIMEOUT_MS = Number(process.env.CHESS_FEN_HEALTH_TIMEOUT_MS || 5_000);
+const RESTART_DELAY_MS = 500;
+// `recognize-fen.py --fork-server` socket. 설정되면 worker 풀 대신 연결마다 fork된 프로세스가 처리합니다.
+const FORK_SOCKET = process.env.CHESS_FEN_FORK_SOCKET || "";
+// 요청에 debug 값이 없을 때의 기본 디버그 단계 (none | info | path | image)
+const DEBUG_LEVELS = ["none", "info", "path", "image"];
+const DEFAULT_DEBUG_LEVEL = (process.env.CHESS_DEBUG_LEVEL || "image").toLowerCase();
+
+// 같은 이미지(base64 원문 기준) 재요청 시 worker를 거치지 않고 응답하는 캐시
+const CACHE_SIZE = Number(process.env.CHESS_FEN_CACHE_SIZE ?? 256);
+const CACHE_TTL_MS = Number(process.env.CHESS_FEN_CACHE_TTL ?? 600) * 1000;
+
+const createResultCache = (maxEntries, ttlMs) => {
+  const entries = new Map();
+  let hits = 0;
+  let misses = 0;
+
+  return {
+    enabled: maxEntries > 0,
+    get: (key) => {
+      const entry = entries.get(key);
+      if (entry && (ttlMs <= 0 || Date.now() - entry.created <= ttlMs)) {
+        // Map은 삽입 순서를 유지하므로 다시 넣어 최근 사용으로 갱신
+        entries.delete(key);
+        entries.set(key, entry);
+        hits += 1;
+        return entry.value;
+      }
+      if (entry) entries.delete(key);
+      misses += 1;
+      return null;
+    },
+    set: (key, value) => {
+      entries.delete(key);
+      entries.set(key, { created: Date.now(), value });
+      while (entries.size > maxEntries) {
+        entries.delete(entries.keys().next().value);
+      }
+    },
+    stats: () => ({ hits, misses, size: entries.size }),
+  };
+};
+
+const resultCache = createResultCache(CACHE_SIZE, CACHE_TTL_MS);
+
+// GET /metrics (Prometheus text format). 지연 시간은 초 단위 누적 히스토그램으로 집계합니다.
+const LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30];
+
+const createHistogram = () => ({ counts: new Array(LATENCY_BUCKETS.length).fill(0), sum: 0, count: 0 });
+
+const observeHistogram = (histogram, seconds) => {
+  for (let i = 0; i < LATENCY_BUCKETS.length; i += 1) {
+    if (seconds <= LATENCY_BUCKETS[i]) histogram.counts[i] += 1;
+  }
+  histogram.sum += seconds;
+  histogram.count += 1;
+};
+
+const createMetrics = () => {
+  const requests = new Map(); // status → count
+  const requestLatency = createHistogram();
+  const modelLatency = createHistogram();
+  const stageLatency = new Map(); // recognizer stage → histogram
+  const methods = new Map(); // 감지 방식 → count
+  const cascadePaths = new Map(); // 인식 경로(local / ml_squares / ml_board / ml_frame / none) → count
+  let mlCalls = 0;
+  let mlSquares = 0;
+
+  const histogramLines = (name, histogram, labels = "") => {
+    const prefix = labels ? `${labels},` : "";
+    const lines = LATENCY_BUCKETS.map(
+      (bound, i) => `${name}_bucket{${prefix}le="${bound}"} ${histogram.counts[i]}`
+    );
+    lines.push(`${name}_bucket{${prefix}le="+Inf"} ${histogram.count}`);
+    const suffix = labels ? `{${labels}}` : "";
+    lines.push(`${name}_sum${suffix} ${histogram.sum}`, `${name}_count${suffix} ${histogram.count}`);
+    return lines;
+  };
+
+  return {
+    observeRequest: (status, seconds) => {
+      requests.set(status, (requests.get(status) || 0) + 1);
+      observeHistogram(requestLatency, seconds);
+    },
+    // recognizer가 돌려준 timings(ms)를 단계별 히스토그램에, cascade(칸별 인식 경로)를 ML 호출 수에 반영
+    observeModel: (timings, method, cascade) => {
+      if (method) methods.set(method, (methods.get(method) || 0) + 1);
+      if (cascade && typeof cascade === "object" && !cascade.cached) {
+        const path = cascade.path || "none";
+        cascadePaths.set(path, (cascadePaths.get(path) || 0) + 1);
+        if (cascade.mlCalled) {
+          mlCalls += 1;
+          mlSquares += Number(cascade.uncertainSquares) || 0;
+        }
+      }
+      if (!timings || typeof timings !== "object") return;
+      for (const [stage, ms] of Object.entries(timings)) {
+        if (typeof ms !== "number") continue;
+        if (stage === "total") {
+          observeHistogram(modelLatency, ms / 1000);
+          continue;
+        }
+        if (!stageLatency.has(stage)) stageLatency.set(stage, createHistogram());
+        observeHistogram(stageLatency.get(stage), ms / 1000);
+      }
+    },
+    render: (poolStatus, cacheStats) => {
+      const recognitions = [...cascadePaths.values()].reduce((sum, count) => sum + count, 0);
+      const lines = [
+        "# HELP chess_fen_requests_total POST /fen requests by HTTP status.",
+        "# TYPE chess_fen_requests_total counter",
+        ...[...requests].map(([status, count]) => `chess_fen_requests_total{status="${status}"} ${count}`),
+        "# HELP chess_fen_request_duration_seconds POST /fen latency including queueing.",
+        "# TYPE chess_fen_request_duration_seconds histogram",
+        ...histogramLines("chess_fen_request_duration_seconds", requestLatency),
+        "# HELP chess_fen_recognizer_duration_seconds Time spent inside the recognizer per request.",
+        "# TYPE chess_fen_recognizer_duration_seconds histogram",
+        ...histogramLines("chess_fen_recognizer_duration_seconds", modelLatency),
+        "# HELP chess_fen_stage_duration_seconds Recognizer stage latency (debugInfo.timings).",
+        "# TYPE chess_fen_stage_duration_seconds histogram",
+        ...[...stageLatency].flatMap(([stage, histogram]) =>
+          histogramLines("chess_fen_stage_duration_seconds", histogram, `stage="${stage}"`)
+        ),
+        "# HELP chess_fen_detection_method_total Winning detection method per recognizer run.",
+        "# TYPE chess_fen_detection_method_total counter",
+        ...[...methods].map(([method, count]) => `chess_fen_detection_method_total{method="${method}"} ${count}`),
+        "# HELP chess_fen_cascade_total Recognizer runs by the path that produced the squares.",
+        "# TYPE chess_fen_cascade_total counter",
+        ...[...cascadePaths].map(([path, count]) => `chess_fen_cascade_total{path="${path}"} ${count}`),
+        "# HELP chess_fen_ml_calls_total Recognizer runs that called the board_to_fen model.",
+        "# TYPE chess_fen_ml_calls_total counter",
+        `chess_fen_ml_calls_total ${mlCalls}`,
+        "# HELP chess_fen_ml_squares_total Squares the cascade sent to the board_to_fen model.",
+        "# TYPE chess_fen_ml_squares_total counter",
+        `chess_fen_ml_squares_total ${mlSquares}`,
+        "# HELP chess_fen_ml_call_ratio Fraction of recognizer runs that called the board_to_fen model.",
+        "# TYPE chess_fen_ml_call_ratio gauge",
+        `chess_fen_ml_call_ratio ${recognitions > 0 ? mlCalls / recognitions : 0}`,
+        "# HELP chess_fen_server_cache_total Server result cache lookups.",
+        "# TYPE chess_fen_server_cache_total counter",
+        `chess_fen_server_cache_total{result="hit"} ${cacheStats.hits}`,
+        `chess_fen_server_cache_total{result="miss"} ${cacheStats.misses}`,
+      ];
+      if (poolStatus) {
+        lines.push(
+          "# TYPE chess_fen_pool_in_flight gauge",
+          `chess_fen_pool_in_flight ${poolStatus.inFlight}`,
+          "# TYPE chess_fen_pool_queued gauge",
+          `chess_fen_pool_queued ${poolStatus.queued}`,
+          "# TYPE chess_fen_pool_restarts_total counter",
+          `chess_fen_pool_restarts_total ${poolStatus.restarts}`
+        );
+      }
+      return `${lines.join("\n")}\n`;
+    },
+  };
+};
+
+const metrics = createMetrics();
+
+const hashImage = (image) => createHash("sha1").update(image).digest("hex");
+
+const resolveDebugLevel = (payload) => {
+  const value = payload?.debug;
+  if (typeof value === "boolean") return value ? "image" : "none";
+  if (typeof value === "string" && DEBUG_LEVELS.includes(value.toLowerCase())) return value.toLowerCase();
+  return DEBUG_LEVELS.includes(DEFAULT_DEBUG_LEVEL) ? DEFAULT_DEBUG_LEVEL : "image";
+};
 
 const parseBoardArea = (value) => {
   if (!value) return null;
@@ -20,12 +199,327 @@ const parseBoardArea = (value) => {
 };
 
 let lastBoardArea = parseBoardArea(BOARD_AREA_ENV);
+// 세션별로 recognizer가 마지막으로 돌려준 영역(이미지 좌표). 같은 세션의 다음 요청에 boardAreaHint로 넘겨
+// 빠른 재검증만으로 전체 감지를 건너뛸 수 있게 합니다. 세션은 클라이언트가 X-Chess-Session 헤더
+// (또는 session 필드)로 밝힌 경우에만 있으며, 없으면 힌트를 쓰지 않습니다 (다른 클라이언트의 영역이 섞이지 않도록).
+const REUSE_BOARD_HINT = (process.env.CHESS_FEN_REUSE_BOARD_HINT || "true").toLowerCase() === "true";
+const HINT_SESSIONS_MAX = Math.max(1, Number(process.env.CHESS_FEN_HINT_SESSIONS || 256));
+const detectedAreas = new Map();
 
-const runModel = async (payload) => {
+const rememberDetectedArea = (session, area) => {
+  // Map 삽입 순서를 LRU로 씁니다
+  detectedAreas.delete(session);
+  detectedAreas.set(session, area);
+  if (detectedAreas.size > HINT_SESSIONS_MAX) detectedAreas.delete(detectedAreas.keys().next().value);
+};
+
+const splitCommand = (value) => value.split(" ").filter(Boolean);
+
+class BusyError extends Error {}
+
+class RequestError extends Error {
+  constructor(status, message) {
+    super(message);
+    this.status = status;
+  }
+}
+
+// recognizer(worker / fork server / one-shot 프로세스) 쪽 실패: 502, 시간 초과는 504
+class ModelError extends Error {
+  constructor(message, status = 502) {
+    super(message);
+    this.status = status;
+  }
+}
+
+const MAX_BODY_BYTES = 10_000_000;
+
+// recognize-fen.py binary frame: "FEN1" | uint32 meta 길이 | uint32 이미지 길이 | meta JSON | 이미지
+const FRAME_MAGIC = Buffer.from("FEN1");
+
+const writeFrame = (stream, meta, image) => {
+  const metaBuffer = Buffer.from(JSON.stringify(meta));
+  const header = Buffer.alloc(12);
+  FRAME_MAGIC.copy(header, 0);
+  header.writeUInt32BE(metaBuffer.length, 4);
+  header.writeUInt32BE(image.length, 8);
+  // 이미지 Buffer는 합치지 않고 그대로 써서 복사를 피합니다
+  stream.cork();
+  stream.write(header);
+  stream.write(metaBuffer);
+  stream.write(image);
+  process.nextTick(() => stream.uncork());
+};
+
+// payload.image(Buffer)가 있으면 binary frame, 없으면 JSON으로 전송
+const writeRequest = (stream, message, { newline }) => {
+  const { image, ...payload } = message.payload || {};
+  if (image) {
+    writeFrame(stream, { ...message, payload }, image);
+  } else {
+    stream.write(`${JSON.stringify(message)}${newline ? "\n" : ""}`);
+  }
+};
+
+// recognize-fen.py --worker 프로세스 하나. NDJSON으로 요청/응답을 주고받습니다.
+const createWorker = (index, onExit) => {
+  const [cmd, ...args] = splitCommand(MODEL_CMD);
+  const child = spawn(cmd, [...args, "--worker"], {
+    stdio: ["pipe", "pipe", "pipe"],
+    env: { CHESS_WORKER_THREADS: String(WORKER_CONCURRENCY), ...process.env },
+  });
+  const pending = new Map();
+  let nextId = 1;
+  let buffer = "";
+  let resolveReady;
+  let rejectReady;
+
+  const worker = {
+    index,
+    pid: child.pid,
+    ready: new Promise((resolve, reject) => {
+      resolveReady = resolve;
+      rejectReady = reject;
+    }),
+    alive: true,
+    busy: false,
+    active: 0,
+    isReady: false,
+    preloaded: null,
+    handled: 0,
+  };
+  // ready 전에 죽는 경우 unhandled rejection 방지
+  worker.ready.catch(() => {});
+
+  const failAll = (error) => {
+    for (const { reject, timer } of pending.values()) {
+      clearTimeout(timer);
+      reject(error);
+    }
+    pending.clear();
+  };
+
+  worker.send = (message, timeoutMs = REQUEST_TIMEOUT_MS) =>
+    new Promise((resolve, reject) => {
+      if (!worker.alive) {
+        reject(new ModelError(`Worker ${index} is not running`));
+        return;
+      }
+      const id = nextId++;
+      const timer = setTimeout(() => {
+        pending.delete(id);
+        reject(new ModelError(`Worker ${index} timed out after ${timeoutMs}ms`, 504));
+        // 응답이 없는 worker는 재시작
+        worker.kill();
+      }, timeoutMs);
+      pending.set(id, { resolve, reject, timer });
+      writeRequest(child.stdin, { id, ...message }, { newline: true });
+    });
+
+  worker.kill = () => {
+    if (worker.alive) child.kill("SIGKILL");
+  };
+
+  child.stdout.on("data", (chunk) => {
+    buffer += chunk.toString();
+    let newline;
+    while ((newline = buffer.indexOf("\n")) !== -1) {
+      const line = buffer.slice(0, newline).trim();
+      buffer = buffer.slice(newline + 1);
+      if (!line) continue;
+      let message;
+      try {
+        message = JSON.parse(line);
+      } catch {
+        console.warn(`[fen-api] worker ${index} invalid output`, line.slice(0, 200));
+        continue;
+      }
+      if (message.type === "ready") {
+        worker.isReady = true;
+        worker.preloaded = message.preloaded || null;
+        resolveReady();
+        continue;
+      }
+      const entry = pending.get(message.id);
+      if (!entry) continue;
+      pending.delete(message.id);
+      clearTimeout(entry.timer);
+      if (message.error) entry.reject(new ModelError(message.error));
+      else entry.resolve(message);
+    }
+  });
+  child.stderr.on("data", (chunk) => {
+    process.stderr.write(`[fen-api] worker ${index}: ${chunk}`);
+  });
+  child.stdin.on("error", () => {});
+  child.on("error", (error) => {
+    console.error(`[fen-api] worker ${index} error`, error);
+  });
+  child.on("exit", (code, signal) => {
+    worker.alive = false;
+    const error = new ModelError(`Worker ${index} exited (code ${code}, signal ${signal})`);
+    rejectReady(error);
+    failAll(error);
+    onExit(worker, code, signal);
+  });
+
+  return worker;
+};
+
+// 고정 크기 worker 풀: worker당 WORKER_CONCURRENCY 요청씩, 나머지는 MAX_IN_FLIGHT까지 대기열에 둡니다.
+const createWorkerPool = (size) => {
+  const workers = new Array(size).fill(null);
+  const queue = [];
+  let inFlight = 0;
+  let restarts = 0;
+  let closed = false;
+
+  const start = (index) => {
+    workers[index] = createWorker(index, (worker, code, signal) => {
+      if (closed || workers[index] !== worker) return;
+      restarts += 1;
+      console.warn(`[fen-api] worker ${index} exited (code ${code}, signal ${signal}), restarting`);
+      setTimeout(() => {
+        if (!closed) {
+          start(index);
+          dispatch();
+        }
+      }, RESTART_DELAY_MS);
+    });
+    workers[index].ready.then(dispatch, () => {});
+  };
+
+  const dispatch = () => {
+    while (queue.length > 0) {
+      const worker = workers.find((w) => w && w.alive && w.isReady && w.active < WORKER_CONCURRENCY);
+      if (!worker) return;
+      const job = queue.shift();
+      worker.active += 1;
+      worker.busy = true;
+      worker
+        .send({ type: "recognize", payload: job.payload })
+        .then((message) => {
+          metrics.observeModel(message.timings, message.result?.debugInfo?.method, message.result?.cascade);
+          job.resolve(message.result);
+        }, job.reject)
+        .finally(() => {
+          worker.active -= 1;
+          worker.busy = worker.active > 0;
+          worker.handled += 1;
+          inFlight -= 1;
+          dispatch();
+        });
+    }
+  };
+
+  const healthCheck = () => {
+    for (const worker of workers) {
+      if (!worker || !worker.alive || worker.busy || !worker.isReady) continue;
+      worker.send({ type: "ping" }, HEALTH_TIMEOUT_MS).catch((error) => {
+        console.warn(`[fen-api] worker ${worker.index} failed health check`, error.message);
+        worker.kill();
+      });
+    }
+  };
+
+  for (let i = 0; i < size; i += 1) start(i);
+  const healthTimer = setInterval(healthCheck, HEALTH_INTERVAL_MS);
+  healthTimer.unref();
+
+  return {
+    run: (payload) =>
+      new Promise((resolve, reject) => {
+        if (inFlight >= MAX_IN_FLIGHT) {
+          reject(new BusyError(`Too many requests in flight (${inFlight})`));
+          return;
+        }
+        inFlight += 1;
+        queue.push({ payload, resolve, reject });
+        dispatch();
+      }),
+    // worker별 stats 요청 (스레드 수, 처리 중 요청 수, 추론 마이크로 배치 통계)
+    workerStats: () =>
+      Promise.all(
+        workers.map((w) =>
+          w && w.alive && w.isReady
+            ? w.send({ type: "stats" }, HEALTH_TIMEOUT_MS).then(
+                (message) => ({ index: w.index, pid: w.pid, ...message.stats }),
+                (error) => ({ index: w.index, pid: w.pid, error: error.message })
+              )
+            : null
+        )
+      ),
+    status: () => ({
+      size,
+      inFlight,
+      queued: queue.length,
+      restarts,
+      workers: workers.map((w) =>
+        w
+          ? {
+              index: w.index,
+              pid: w.pid,
+              alive: w.alive,
+              busy: w.busy,
+              active: w.active,
+              ready: w.isReady,
+              handled: w.handled,
+            }
+          : null
+      ),
+    }),
+    close: () => {
+      closed = true;
+      clearInterval(healthTimer);
+      for (const worker of workers) worker?.kill();
+    },
+  };
+};
+
+const pool = MODEL_CMD && WORKER_COUNT > 0 && !FORK_SOCKET ? createWorkerPool(WORKER_COUNT) : null;
+
+const parseModelOutput = (stdout) => {
+  const output = stdout.trim();
+  if (!output) return null;
+  try {
+    const json = JSON.parse(output);
+    // one-shot 모드는 debugInfo가 있을 때만 단계별 시간을 알 수 있습니다
+    metrics.observeModel(json?.debugInfo?.timings, json?.debugInfo?.method, json?.cascade);
+    return json;
+  } catch {
+    return { fen: output };
+  }
+};
+
+// fork-server 연결 하나 = 요청 하나. one-shot stdin과 같은 내용을 쓰고 write 방향을 닫습니다.
+const runModelForked = (payload) =>
+  new Promise((resolve, reject) => {
+    const socket = net.createConnection(FORK_SOCKET);
+    const chunks = [];
+    socket.setTimeout(REQUEST_TIMEOUT_MS, () => {
+      socket.destroy(new ModelError(`Fork server timed out after ${REQUEST_TIMEOUT_MS}ms`, 504));
+    });
+    socket.on("data", (chunk) => chunks.push(chunk));
+    socket.on("error", (error) =>
+      reject(error instanceof ModelError ? error : new ModelError(`Fork server error: ${error.message}`))
+    );
+    socket.on("end", () => resolve(parseModelOutput(Buffer.concat(chunks).toString("utf8"))));
+    socket.on("connect", () => {
+      const { image, ...meta } = payload;
+      if (image) {
+        writeFrame(socket, meta, image);
+        process.nextTick(() => socket.end());
+      } else {
+        socket.end(JSON.stringify(payload));
+      }
+    });
+  });
+
+const runModelOnce = async (payload) => {
   if (!MODEL_CMD) return null;
 
   return new Promise((resolve, reject) => {
-    const [cmd, ...args] = MODEL_CMD.split(" ").filter(Boolean);
+    const [cmd, ...args] = splitCommand(MODEL_CMD);
     if (!cmd) {
       resolve(null);
       return;
@@ -41,134 +535,332 @@ const runModel = async (payload) => {
     child.stderr.on("data", (chunk) => {
       stderr += chunk.toString();
     });
-    child.on("error", reject);
+    child.on("error", (error) => reject(new ModelError(`Could not start model: ${error.message}`)));
     child.on("close", (code) => {
       if (code !== 0) {
-        reject(new Error(stderr || `Model exited with code ${code}`));
+        reject(new ModelError(stderr.trim() || `Model exited with code ${code}`));
         return;
       }
 
-      const output = stdout.trim();
-      if (!output) {
-        resolve(null);
+      resolve(parseModelOutput(stdout));
+    });
+
+    // one-shot 모드에서는 payload 자체가 frame의 meta가 됩니다
+    const { image, ...meta } = payload;
+    if (image) {
+      writeFrame(child.stdin, meta, image);
+      process.nextTick(() => child.stdin.end());
+    } else {
+      child.stdin.end(JSON.stringify(payload));
+    }
+  });
+};
+
+const runModel = async (payload) => {
+  if (FORK_SOCKET) return runModelForked(payload);
+  if (!MODEL_CMD) return null;
+  if (pool) return pool.run(payload);
+  return runModelOnce(payload);
+};
+
+const readBody = (req) =>
+  new Promise((resolve, reject) => {
+    const chunks = [];
+    let size = 0;
+    req.on("data", (chunk) => {
+      size += chunk.length;
+      if (size > MAX_BODY_BYTES) {
+        // 남은 본문은 버리고 413으로 응답
+        req.removeAllListeners("data");
+        req.resume();
+        reject(new RequestError(413, "Payload too large"));
         return;
       }
+      chunks.push(chunk);
+    });
+    req.on("end", () => resolve(chunks.length === 1 ? chunks[0] : Buffer.concat(chunks, size)));
+    req.on("error", reject);
+  });
 
+const parseJsonField = (value) => {
+  try {
+    return JSON.parse(value);
+  } catch {
+    return value;
+  }
+};
+
+// multipart/form-data: "image"(또는 filename이 있는 part)는 이미지, "meta"는 JSON, 나머지는 필드
+const parseMultipart = (body, boundary) => {
+  const delimiter = Buffer.from(`--${boundary}`);
+  const payload = {};
+  let image = null;
+  let start = body.indexOf(delimiter);
+  while (start !== -1) {
+    const partStart = start + delimiter.length;
+    if (body.subarray(partStart, partStart + 2).toString() === "--") break;
+    const next = body.indexOf(delimiter, partStart);
+    if (next === -1) break;
+    const headerEnd = body.indexOf("\r\n\r\n", partStart);
+    if (headerEnd === -1 || headerEnd > next) throw new RequestError(400, "Invalid multipart body");
+    const headers = body.subarray(partStart, headerEnd).toString("utf8");
+    // 본문 끝의 CRLF 제외, subarray라 복사 없음
+    const content = body.subarray(headerEnd + 4, next - 2);
+    const name = /name="([^"]*)"/i.exec(headers)?.[1];
+    const isFile = /filename="/i.test(headers);
+    if (name === "image" || (isFile && !image)) {
+      image = content;
+    } else if (name === "meta") {
       try {
-        const json = JSON.parse(output);
-        resolve(json);
+        Object.assign(payload, JSON.parse(content.toString("utf8") || "{}"));
       } catch {
-        resolve({ fen: output });
+        throw new RequestError(400, "Invalid multipart meta JSON");
       }
-    });
+    } else if (name) {
+      payload[name] = parseJsonField(content.toString("utf8"));
+    }
+    start = next;
+  }
+  return { payload, image };
+};
 
-    child.stdin.write(JSON.stringify(payload));
-    child.stdin.end();
-  });
+// JSON(imageBase64), application/octet-stream / image/*, multipart/form-data 요청을
+// { payload, image: Buffer | null } 으로 정규화합니다.
+const parseRequest = (req, url, body) => {
+  const contentType = (req.headers["content-type"] || "").toLowerCase();
+  let payload;
+  let image = null;
+
+  if (contentType.startsWith("multipart/form-data")) {
+    const boundary = /boundary=(?:"([^"]+)"|([^;]+))/i.exec(req.headers["content-type"]);
+    if (!boundary) throw new RequestError(400, "Missing multipart boundary");
+    ({ payload, image } = parseMultipart(body, boundary[1] || boundary[2]));
+  } else if (contentType.startsWith("application/octet-stream") || contentType.startsWith("image/")) {
+    const meta = req.headers["x-chess-meta"];
+    try {
+      payload = meta ? JSON.parse(meta) : {};
+    } catch {
+      throw new RequestError(400, "Invalid X-Chess-Meta header");
+    }
+    image = body.length > 0 ? body : null;
+  } else {
+    try {
+      payload = JSON.parse(body.toString("utf8") || "{}");
+    } catch {
+      throw new RequestError(400, "Invalid JSON");
+    }
+    if (typeof payload?.imageBase64 === "string" && payload.imageBase64) {
+      image = Buffer.from(payload.imageBase64, "base64");
+    }
+  }
+
+  if (!payload || typeof payload !== "object") payload = {};
+  for (const key of ["debug", "boardAreaHint", "boardArea", "multiBoard", "deadlineMs", "session"]) {
+    const value = url.searchParams.get(key);
+    if (value !== null && payload[key] === undefined) payload[key] = parseJsonField(value);
+  }
+  return { payload, image };
 };
 
 const server = http.createServer(async (req, res) => {
   const corsHeaders = {
     "Access-Control-Allow-Origin": "*",
-    "Access-Control-Allow-Methods": "POST, OPTIONS",
-    "Access-Control-Allow-Headers": "Content-Type",
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type, X-Chess-Meta, X-Chess-Session",
   };
+  const url = new URL(req.url, "http://localhost");
+  const startedAt = process.hrtime.bigint();
 
-  if (req.method === "OPTIONS" && req.url === "/fen") {
+  if (req.method === "OPTIONS" && url.pathname === "/fen") {
     res.writeHead(204, corsHeaders);
     res.end();
     return;
   }
 
-  if (req.method !== "POST" || req.url !== "/fen") {
+  if (req.method === "GET" && url.pathname === "/health") {
+    res.writeHead(200, { "Content-Type": "application/json", ...corsHeaders });
+    res.end(
+      JSON.stringify({ ok: true, pool: pool ? pool.status() : null, cache: resultCache.stats() })
+    );
+    return;
+  }
+
+  if (req.method === "GET" && url.pathname === "/stats") {
+    const workerStats = pool ? await pool.workerStats() : null;
+    res.writeHead(200, { "Content-Type": "application/json", ...corsHeaders });
+    res.end(JSON.stringify({ pool: pool ? pool.status() : null, workers: workerStats }));
+    return;
+  }
+
+  if (req.method === "GET" && url.pathname === "/metrics") {
+    res.writeHead(200, { "Content-Type": "text/plain; version=0.0.4", ...corsHeaders });
+    res.end(metrics.render(pool ? pool.status() : null, resultCache.stats()));
+    return;
+  }
+
+  if (req.method !== "POST" || url.pathname !== "/fen") {
     res.writeHead(404, { "Content-Type": "application/json", ...corsHeaders });
     res.end(JSON.stringify({ error: "Not found" }));
     return;
   }
 
-  let body = "";
-  req.on("data", (chunk) => {
-    body += chunk;
-    if (body.length > 10_000_000) {
-      req.destroy();
+  try {
+    res.on("finish", () => {
+      metrics.observeRequest(res.statusCode, Number(process.hrtime.bigint() - startedAt) / 1e9);
+    });
+    const { payload, image } = parseRequest(req, url, await readBody(req));
+    const debugLevel = resolveDebugLevel(payload);
+    console.log("[fen-api] request", {
+      hasImage: Boolean(image),
+      imageBytes: image ? image.length : 0,
+      boardArea: payload?.boardArea || null,
+      debug: debugLevel,
+    });
+    // 여러 보드 요청은 보드 목록을 돌려주므로 단일 보드 캐시/힌트 흐름과 섞지 않음
+    // (recognizer가 자체 결과 캐시에서 보드 목록을 재사용)
+    const multiBoard = Boolean(payload?.multiBoard);
+    // 디버그 이미지가 필요한 요청은 recognizer가 오버레이를 그려야 하므로 캐시를 쓰지 않음
+    const cacheKey =
+      resultCache.enabled && image && !multiBoard && (debugLevel === "none" || debugLevel === "info")
+        ? hashImage(image)
+        : null;
+    const cached = cacheKey ? resultCache.get(cacheKey) : null;
+    const headerSession = req.headers["x-chess-session"];
+    const session = String(headerSession || payload?.session || "").slice(0, 128) || null;
+    // recognizer에는 base64 대신 원본 bytes를 binary frame으로 전달
+    const modelPayload = { ...payload, imageBase64: undefined, session: undefined, image };
+    const sessionArea = REUSE_BOARD_HINT && session ? detectedAreas.get(session) : null;
+    if (sessionArea && !multiBoard && !payload?.boardAreaHint) {
+      modelPayload.boardAreaHint = sessionArea;
     }
-  });
-
-  req.on("end", async () => {
-    try {
-      const payload = JSON.parse(body || "{}");
-      console.log("[fen-api] request", {
-        hasImage: Boolean(payload?.imageBase64),
-        boardArea: payload?.boardArea || null,
+    const modelResult = cached
+      ? {
+          fen: cached.fen,
+          boardArea: cached.boardArea,
+          debugInfo: { method: cached.method, details: {} },
+          cascade: cached.cascade ? { ...cached.cascade, mlCalled: false, cached: true } : null,
+        }
+      : await runModel(modelPayload);
+    if (REUSE_BOARD_HINT && session && !cached && !multiBoard && modelResult?.boardArea) {
+      rememberDetectedArea(session, modelResult.boardArea);
+    }
+    if (cacheKey && !cached && modelResult?.fen) {
+      resultCache.set(cacheKey, {
+        fen: modelResult.fen,
+        boardArea: modelResult.boardArea || null,
+        method: modelResult.debugInfo?.method || null,
+        cascade: modelResult.cascade || null,
       });
-      const modelResult = await runModel(payload);
-      const fen =
-        modelResult?.fen ||
-        modelResult?.data?.fen ||
-        modelResult?.result?.fen ||
-        payload?.fen ||
-        payload?.data?.fen ||
-        payload?.result?.fen ||
-        DEFAULT_FEN;
-
-      const incomingBoardArea =
-        modelResult?.boardArea ||
-        modelResult?.data?.boardArea ||
-        modelResult?.result?.boardArea ||
-        payload?.boardArea ||
-        payload?.data?.boardArea ||
-        payload?.result?.boardArea ||
-        parseBoardArea(BOARD_AREA_ENV) ||
-        null;
-
-      if (incomingBoardArea) {
-        lastBoardArea = incomingBoardArea;
-      }
+    }
+    const fen =
+      modelResult?.fen ||
+      modelResult?.data?.fen ||
+      modelResult?.result?.fen ||
+      payload?.fen ||
+      payload?.data?.fen ||
+      payload?.result?.fen ||
+      DEFAULT_FEN;
 
-      const debugImageBase64 =
-        modelResult?.debugImageBase64 ||
-        modelResult?.data?.debugImageBase64 ||
-        modelResult?.result?.debugImageBase64 ||
-        payload?.imageBase64 ||
-        null;
-      const debugImagePath =
-        modelResult?.debugImagePath ||
-        modelResult?.data?.debugImagePath ||
-        modelResult?.result?.debugImagePath ||
-        null;
-      const debugInfo =
-        modelResult?.debugInfo ||
-        modelResult?.data?.debugInfo ||
-        modelResult?.result?.debugInfo ||
-        null;
-
-      console.log("[fen-api] debugImage", JSON.stringify({
-        hasDebugBase64: Boolean(debugImageBase64),
-        debugSize: debugImageBase64 ? debugImageBase64.length : 0,
-        debugImagePath,
-        debugInfo,
-      }, null, 2));
+    const incomingBoardArea =
+      modelResult?.boardArea ||
+      modelResult?.data?.boardArea ||
+      modelResult?.result?.boardArea ||
+      payload?.boardArea ||
+      payload?.data?.boardArea ||
+      payload?.result?.boardArea ||
+      parseBoardArea(BOARD_AREA_ENV) ||
+      null;
+
+    if (incomingBoardArea && !multiBoard) {
+      lastBoardArea = incomingBoardArea;
+    }
+
+    const debugImageBase64 =
+      debugLevel === "image"
+        ? modelResult?.debugImageBase64 ||
+          modelResult?.data?.debugImageBase64 ||
+          modelResult?.result?.debugImageBase64 ||
+          payload?.imageBase64 ||
+          image?.toString("base64") ||
+          null
+        : null;
+    const debugImagePath =
+      modelResult?.debugImagePath ||
+      modelResult?.data?.debugImagePath ||
+      modelResult?.result?.debugImagePath ||
+      null;
+    const debugInfo =
+      debugLevel === "none"
+        ? null
+        : modelResult?.debugInfo ||
+          modelResult?.data?.debugInfo ||
+          modelResult?.result?.debugInfo ||
+          null;
+    if (cacheKey && debugInfo?.details) {
+      debugInfo.details.serverCache = { hit: Boolean(cached), ...resultCache.stats() };
+    }
 
-      const boardArea = lastBoardArea;
+    console.log("[fen-api] debugImage", JSON.stringify({
+      hasDebugBase64: Boolean(debugImageBase64),
+      debugSize: debugImageBase64 ? debugImageBase64.length : 0,
+      debugImagePath,
+      debugInfo,
+    }, null, 2));
 
-      console.log("[fen-api] response", {
-        fen: fen ? `${fen.slice(0, 20)}...` : null,
+    const boardArea = multiBoard ? incomingBoardArea : lastBoardArea;
+
+    console.log("[fen-api] response", {
+      fen: fen ? `${fen.slice(0, 20)}...` : null,
+      boardArea,
+      debugImagePath,
+    });
+
+    res.writeHead(200, { "Content-Type": "application/json", ...corsHeaders });
+    res.end(
+      JSON.stringify({
+        fen,
         boardArea,
+        boardHintReused: Boolean(modelResult?.boardHintReused),
+        cascade: modelResult?.cascade || null,
+        ...(multiBoard ? { boards: Array.isArray(modelResult?.boards) ? modelResult.boards : [] } : {}),
+        debugImageBase64,
         debugImagePath,
-      });
-
-      res.writeHead(200, { "Content-Type": "application/json", ...corsHeaders });
-      res.end(
-        JSON.stringify({ fen, boardArea, debugImageBase64, debugImagePath, debugInfo })
-      );
-    } catch (error) {
-      console.error("[fen-api] error", error);
-      res.writeHead(400, { "Content-Type": "application/json", ...corsHeaders });
-      res.end(JSON.stringify({ error: "Invalid JSON" }));
+        debugInfo,
+      })
+    );
+  } catch (error) {
+    if (error instanceof BusyError) {
+      console.warn("[fen-api] busy", error.message);
+      res.writeHead(503, { "Content-Type": "application/json", "Retry-After": "1", ...corsHeaders });
+      res.end(JSON.stringify({ error: "Recognizer busy" }));
+      return;
     }
-  });
+    if (error instanceof RequestError) {
+      res.writeHead(error.status, { "Content-Type": "application/json", ...corsHeaders });
+      res.end(JSON.stringify({ error: error.message }));
+      return;
+    }
+    if (error instanceof ModelError) {
+      console.error("[fen-api] recognizer error", error.message);
+      res.writeHead(error.status, { "Content-Type": "application/json", ...corsHeaders });
+      res.end(JSON.stringify({ error: error.message }));
+      return;
+    }
+    console.error("[fen-api] error", error);
+    res.writeHead(500, { "Content-Type": "application/json", ...corsHeaders });
+    res.end(JSON.stringify({ error: "Internal server error" }));
+  }
 });
 
 server.listen(PORT, () => {
   console.log(`FEN API listening on http://localhost:${PORT}/fen`);
+  if (pool) console.log(`[fen-api] recognizer pool: ${WORKER_COUNT} workers, max ${MAX_IN_FLIGHT} in flight`);
+  if (FORK_SOCKET) console.log(`[fen-api] recognizer fork server: ${FORK_SOCKET}`);
 });
+
+const shutdown = () => {
+  pool?.close();
+  server.close(() => process.exit(0));
+};
+process.on("SIGINT", shutdown);
+process.on("SIGTERM", shutdown);
@@ -0,0 +1,147 @@
+"""
+recognize-fen.py 의 추론 마이크로 배치 스케줄러.
+
+- worker 스레드들이 동시에 처리 중인 요청의 칸 특징 (n, D)을 submit 하면, 스케줄러 스레드가
+  첫 입력이 들어온 뒤 최대 max_wait_ms 동안 또는 모은 행이 max_rows에 닿을 때까지 모아
+  run_batch 한 번(forward pass 한 번)으로 처리하고 요청별 결과 행을 나눠 돌려줍니다.
+- 처리 중인 요청이 모두 모였으면(expected) 기다리지 않고 바로 실행하므로, 요청이 하나뿐일 때는 지연이 없습니다.
+- 한 요청의 행은 나누지 않으므로 배치는 max_rows를 요청 하나만큼 넘을 수 있습니다.
+- 대기열은 max_queue 요청까지이며, 가득 차면 submit이 자리가 날 때까지 기다립니다.
+"""
+import collections
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class _Pending:
+    __slots__ = ("rows", "submitted", "done", "result", "error")
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    run_batch(features) → (N, K) 를 요청 간에 묶어 호출합니다 (스레드 안전).
+    expected()는 지금 처리 중인 요청 수로, 그만큼 모이면 대기 시간을 채우지 않고 실행합니다.
+    """
+
+    def __init__(self, run_batch, max_rows=512, max_wait_ms=3.0, max_queue=32, expected=None, history=64):
+        self.run_batch = run_batch
+        self.max_rows = max(1, int(max_rows))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.expected = expected
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._lock = threading.Lock()
+        self._recent = collections.deque(maxlen=history)
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+        self.max_batch_rows = 0
+        self.wait_total = 0.0
+        self.run_total = 0.0
+        self._thread = threading.Thread(target=self._loop, name="inference-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, rows):
+        """
+        rows (n, D) → run_batch 결과 중 이 요청의 n행.
+        스케줄러에서 run_batch가 던진 예외는 묶인 요청 모두에서 그대로 다시 던집니다.
+        """
+        pending = _Pending(rows)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            rows = len(first.rows)
+            closing = False
+            deadline = first.submitted + self.max_wait
+            while rows < self.max_rows:
+                if self.expected is not None and len(batch) >= self.expected():
+                    break
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+                rows += len(item.rows)
+            self._run(batch, rows)
+            if closing:
+                return
+
+    def _run(self, batch, rows):
+        started = time.perf_counter()
+        depth = self._queue.qsize()
+        try:
+            features = batch[0].rows if len(batch) == 1 else np.concatenate([p.rows for p in batch])
+            output = self.run_batch(features)
+        except Exception as e:
+            for pending in batch:
+                pending.error = e
+        else:
+            offset = 0
+            for pending in batch:
+                pending.result = output[offset:offset + len(pending.rows)]
+                offset += len(pending.rows)
+        ran = time.perf_counter() - started
+        wait = started - min(p.submitted for p in batch)
+        for pending in batch:
+            pending.done.set()
+
+        with self._lock:
+            self.batches += 1
+            self.requests += len(batch)
+            self.rows += rows
+            self.max_batch_rows = max(self.max_batch_rows, rows)
+            self.wait_total += wait
+            self.run_total += ran
+            self._recent.append({
+                "requests": len(batch),
+                "rows": rows,
+                "waitMs": round(wait * 1000.0, 3),
+                "runMs": round(ran * 1000.0, 3),
+                "queueDepth": depth,
+            })
+
+    def stats(self):
+        """누적 통계와 최근 배치들 (요청 수, 행 수, 첫 요청의 대기 시간, 실행 시간, 실행 시점 대기열 길이)."""
+        with self._lock:
+            batches = max(1, self.batches)
+            return {
+                "maxRows": self.max_rows,
+                "maxWaitMs": self.max_wait * 1000.0,
+                "batches": self.batches,
+                "requests": self.requests,
+                "rows": self.rows,
+                "meanRequests": round(self.requests / batches, 3),
+                "meanRows": round(self.rows / batches, 3),
+                "maxBatchRows": self.max_batch_rows,
+                "meanWaitMs": round(self.wait_total * 1000.0 / batches, 3),
+                "meanRunMs": round(self.run_total * 1000.0 / batches, 3),
+                "queueDepth": self._queue.qsize(),
+                "recent": list(self._recent),
+            }
+
+    def close(self):
+        """남은 요청을 처리한 뒤 스케줄러 스레드를 끝냅니다."""
+        self._queue.put(None)
+        self._thread.join()
@@ -0,0 +1,276 @@
+"""
+recognize-fen.py 의 압축 보드 표현과 여러 보드를 한 번에 다루는 FEN 변환 / 타당성 검사.
+
+- 보드 하나는 64바이트 uint8 (rank 8의 a파일부터 FEN 순서)이고, 값은 fen_classifier.CLASSES 의 인덱스
+  (0 빈칸, 1-6 PNBRQK, 7-12 pnbrqk)라 분류기 argmax를 그대로 담습니다. 180도 회전은 64칸을 뒤집는 것과 같습니다.
+- 여러 보드는 (N, 64) uint8 배열로 다룹니다. encode / decode는 고정 폭 바이트 배열과 bytes.replace
+  몇 번(빈칸 구간 ↔ 숫자)으로, 방향 판단 / 킹 보정 / 타당성 검사는 numpy 연산으로만 처리하므로
+  칸 단위 Python 루프가 없습니다.
+"""
+import itertools
+
+import numpy as np
+
+PIECES = "PNBRQKpnbrqk"
+EMPTY = 0
+WHITE_PAWN, WHITE_KNIGHT, WHITE_BISHOP, WHITE_ROOK, WHITE_QUEEN, WHITE_KING = range(1, 7)
+BLACK_PAWN, BLACK_KNIGHT, BLACK_BISHOP, BLACK_ROOK, BLACK_QUEEN, BLACK_KING = range(7, 13)
+NUM_CODES = 13
+
+# validate_boards 결과 비트
+WHITE_KING_COUNT = 1 << 0
+BLACK_KING_COUNT = 1 << 1
+PAWN_ON_BACK_RANK = 1 << 2
+TOO_MANY_PAWNS = 1 << 3
+TOO_MANY_PIECES = 1 << 4
+TOO_MANY_PROMOTED = 1 << 5
+KINGS_ADJACENT = 1 << 6
+PROBLEMS = (
+    (WHITE_KING_COUNT, "whiteKingCount"),
+    (BLACK_KING_COUNT, "blackKingCount"),
+    (PAWN_ON_BACK_RANK, "pawnOnBackRank"),
+    (TOO_MANY_PAWNS, "tooManyPawns"),
+    (TOO_MANY_PIECES, "tooManyPieces"),
+    (TOO_MANY_PROMOTED, "tooManyPromoted"),
+    (KINGS_ADJACENT, "kingsAdjacent"),
+)
+
+# 칸 인덱스(FEN 순서) → 칸 이름
+SQUARE_NAMES = tuple(f"{file}{rank}" for rank in "87654321" for file in "abcdefgh")
+
+# 배치 문자열 고정 폭 표현: 8칸 × 8줄 + '/' 7개 (빈칸은 '1'), 보드 사이는 '\n'
+_ROW_BYTES = 71
+_SQUARE_COLUMNS = (np.arange(8)[:, None] * 9 + np.arange(8)).ravel()
+_SLASH_COLUMNS = np.arange(8, _ROW_BYTES, 9)
+_CODE_CHARS = np.frombuffer(b"1" + PIECES.encode("ascii"), dtype=np.uint8)
+_INVALID = 255
+_CHAR_CODES = np.full(256, _INVALID, np.uint8)
+_CHAR_CODES[_CODE_CHARS] = np.arange(NUM_CODES)
+# code → 기물 색 (+1 백, -1 흑, 0 빈칸)
+_SIDE = np.array([0] + [1] * 6 + [-1] * 6, np.int8)
+# 빈칸 구간 ↔ 숫자 (encode는 긴 구간부터 바꿔야 합니다)
+_RUNS = tuple((b"1" * n, str(n).encode("ascii")) for n in range(8, 1, -1))
+
+
+def as_boards(boards):
+    """보드 하나 (64,) / (8, 8) 또는 여러 개 (N, 64) / (N, 8, 8) → (N, 64) uint8."""
+    boards = np.asarray(boards, dtype=np.uint8)
+    return boards.reshape(-1, 64)
+
+
+def encode_placements(boards):
+    """(N, 64) 보드 → FEN 배치 문자열 N개."""
+    boards = as_boards(boards)
+    if not len(boards):
+        return []
+    if boards.max() >= NUM_CODES:
+        raise ValueError(f"Invalid square code {int(boards.max())}")
+    text = np.empty((len(boards), _ROW_BYTES + 1), np.uint8)
+    text[:, _SQUARE_COLUMNS] = _CODE_CHARS[boards]
+    text[:, _SLASH_COLUMNS] = ord("/")
+    text[:, -1] = ord("\n")
+    data = text.tobytes()
+    for run, digit in _RUNS:
+        data = data.replace(run, digit)
+    return data.decode("ascii").split("\n")[:-1]
+
+
+def decode_placements(placements):
+    """
+    FEN(또는 배치만) 문자열 N개 → (boards (N, 64) uint8, valid (N,) bool).
+    8x8이 아니거나 모르는 문자가 있는 항목은 valid가 False이고 보드는 빈 보드입니다.
+    """
+    fields = [(placement.split(None, 1) or ("",))[0] for placement in placements]
+    boards = np.zeros((len(fields), 64), np.uint8)
+    valid = np.zeros(len(fields), bool)
+    if not fields:
+        return boards, valid
+    data = "\n".join(fields).encode("ascii", "replace")
+    for run, digit in _RUNS:
+        data = data.replace(digit, run)
+    lines = data.split(b"\n")
+    sized = np.fromiter(map(len, lines), np.int64, len(lines)) == _ROW_BYTES
+    if sized.any():
+        text = np.frombuffer(b"".join(itertools.compress(lines, sized)), np.uint8).reshape(-1, _ROW_BYTES)
+        codes = _CHAR_CODES[text[:, _SQUARE_COLUMNS]]
+        ok = (text[:, _SLASH_COLUMNS] == ord("/")).all(axis=1) & (codes != _INVALID).all(axis=1)
+        rows = np.flatnonzero(sized)[ok]
+        boards[rows] = codes[ok]
+        valid[rows] = True
+    return boards, valid
+
+
+def piece_counts(boards):
+    """(N, 64) 보드 → (N, 13) 코드별 칸 수."""
+    boards = as_boards(boards)
+    return np.stack([np.count_nonzero(boards == code, axis=1) for code in range(NUM_CODES)], axis=1)
+
+
+def orient_boards(boards):
+    """
+    화면 기준 보드들에서 흰 기물이 위쪽 두 줄에 더 많으면 흑 시점으로 보고 180도 돌립니다
+    (recognize-fen.board_is_flipped 와 같은 기준).
+
+    Returns: (boards, flipped) - 백 시점 (N, 64) 보드와 (N,) bool (돌릴 보드가 없으면 입력 배열 그대로)
+    """
+    boards = as_boards(boards)
+    # (위쪽 백 + 아래쪽 흑) > (아래쪽 백 + 위쪽 흑)  ⇔  위쪽 색 합 > 아래쪽 색 합
+    side = _SIDE[boards]
+    flipped = side[:, :16].sum(axis=1, dtype=np.int32) > side[:, 48:].sum(axis=1, dtype=np.int32)
+    if not flipped.any():
+        return boards, flipped
+    return np.where(flipped[:, None], boards[:, ::-1], boards), flipped
+
+
+def place_missing_kings(boards, king_scores):
+    """
+    킹이 없는 보드에서 그 색 기물 칸 중 킹 점수가 가장 높은 칸을 킹으로 바꿉니다 (백 먼저). boards를 직접 바꿉니다.
+    빈칸이나 상대 기물 칸에는 두지 않으므로 그 색 기물이 하나도 없으면 킹 없이 남고 validate_boards가 알립니다.
+
+    king_scores: (N, 64, 13) 클래스 확률 (boards와 같은 방향)
+    Returns: (boards, forced) - forced는 킹으로 바꾼 칸 (N, 64) bool
+    """
+    forced = np.zeros(boards.shape, bool)
+    for king, side in ((WHITE_KING, 1), (BLACK_KING, -1)):
+        rows = np.flatnonzero(~(boards == king).any(axis=1))
+        if not rows.size:
+            continue
+        own = _SIDE[boards[rows]] == side
+        rows, own = rows[own.any(axis=1)], own[own.any(axis=1)]
+        if not rows.size:
+            continue
+        squares = np.where(own, king_scores[rows, :, king], -1.0).argmax(axis=1)
+        boards[rows, squares] = king
+        forced[rows, squares] = True
+    return boards, forced
+
+
+def square_names(mask):
+    """(64,) 또는 (8, 8) bool (FEN 방향) → True인 칸 이름 목록 (예: ["e1", "e8"])."""
+    return [SQUARE_NAMES[i] for i in np.flatnonzero(np.asarray(mask).reshape(64))]
+
+
+def assemble_boards(probs):
+    """
+    분류기 확률 (N, 64, 13) 또는 (N, 8, 8, 13) (화면 기준) → 방향을 맞추고 킹을 채운 보드.
+
+    Returns: (boards, flipped, forced) - (N, 64) uint8, (N,) bool, 킹으로 바꾼 칸 (N, 64) bool (백 시점)
+    """
+    probs = np.asarray(probs).reshape(-1, 64, NUM_CODES)
+    boards, flipped = orient_boards(probs.argmax(axis=-1))
+    if flipped.any():
+        probs = np.where(flipped[:, None, None], probs[:, ::-1], probs)
+    boards, forced = place_missing_kings(boards, probs)
+    return boards, flipped, forced
+
+
+def validate_boards(boards):
+    """
+    보드들의 타당성 검사 (합법성 전체가 아니라 인식 오류를 잡기 위한 조건들).
+
+    Returns: (N,) uint8 - PROBLEMS 비트의 OR (0이면 문제 없음)
+    """
+    boards = as_boards(boards)
+    counts = piece_counts(boards)
+    white, black = counts[:, WHITE_PAWN:WHITE_KING + 1], counts[:, BLACK_PAWN:BLACK_KING + 1]
+    problems = np.zeros(len(boards), np.uint8)
+    problems[counts[:, WHITE_KING] != 1] |= WHITE_KING_COUNT
+    problems[counts[:, BLACK_KING] != 1] |= BLACK_KING_COUNT
+    back_ranks = np.concatenate([boards[:, :8], boards[:, 56:]], axis=1)
+    problems[((back_ranks == WHITE_PAWN) | (back_ranks == BLACK_PAWN)).any(axis=1)] |= PAWN_ON_BACK_RANK
+
+    # 시작 수보다 많은 기물(N, B, R 2개 / Q 1개 초과분)은 승격으로만 생기므로 없어진 폰 수를 넘을 수 없습니다
+    start = np.array([8, 2, 2, 2, 1, 1])
+    for side in (white, black):
+        pawns = side[:, 0]
+        problems[pawns > 8] |= TOO_MANY_PAWNS
+        problems[side.sum(axis=1) > 16] |= TOO_MANY_PIECES
+        promoted = np.maximum(side[:, 1:5] - start[1:5], 0).sum(axis=1)
+        problems[promoted > np.maximum(8 - pawns, 0)] |= TOO_MANY_PROMOTED
+
+    single = (counts[:, WHITE_KING] == 1) & (counts[:, BLACK_KING] == 1)
+    white_king = (boards == WHITE_KING).argmax(axis=1)
+    black_king = (boards == BLACK_KING).argmax(axis=1)
+    distance = np.maximum(abs(white_king // 8 - black_king // 8), abs(white_king % 8 - black_king % 8))
+    problems[single & (distance <= 1)] |= KINGS_ADJACENT
+    return problems
+
+
+def problem_names(mask):
+    """validate_boards 결과 하나 → 문제 이름 목록."""
+    return [name for bit, name in PROBLEMS if int(mask) & bit]
+
+
+class PackedBoard:
+    """
+    보드 하나 (64바이트 uint8, FEN 순서). 해시 가능하며 같은 배치면 같습니다.
+    squares를 직접 바꾸면 해시 키로 쓰는 중에는 안 됩니다.
+    """
+
+    __slots__ = ("squares",)
+
+    def __init__(self, squares=None):
+        if squares is None:
+            self.squares = np.zeros(64, np.uint8)
+        else:
+            self.squares = np.array(squares, dtype=np.uint8).reshape(64)
+
+    @classmethod
+    def from_placement(cls, placement):
+        """FEN 또는 배치 문자열 → PackedBoard. 8x8이 아니거나 모르는 문자가 있으면 ValueError."""
+        boards, valid = decode_placements([placement])
+        if not valid[0]:
+            raise ValueError(f"Invalid placement: {placement}")
+        return cls(boards[0])
+
+    @classmethod
+    def from_rows(cls, rows):
+        """8x8 기물 격자 (rank 8부터, '' 는 빈칸) → PackedBoard."""
+        text = "".join(piece or "1" for row in rows for piece in row).encode("ascii", "replace")
+        codes = _CHAR_CODES[np.frombuffer(text, np.uint8)]
+        if codes.size != 64 or (codes == _INVALID).any():
+            raise ValueError("Board must be 8x8 FEN piece letters")
+        return cls(codes)
+
+    @classmethod
+    def frombytes(cls, data):
+        return cls(np.frombuffer(data, np.uint8))
+
+    @property
+    def placement(self):
+        return encode_placements(self.squares)[0]
+
+    def tobytes(self):
+        return self.squares.tobytes()
+
+    def grid(self):
+        """(8, 8) 뷰 (rank 8부터)."""
+        return self.squares.reshape(8, 8)
+
+    def rows(self):
+        """8x8 기물 격자 list (rank 8부터, '' 는 빈칸)."""
+        return np.array(("",) + tuple(PIECES), dtype=object)[self.grid()].tolist()
+
+    def pieces(self):
+        """[(rank_index, file_index, 기물 문자)] - rank_index 0이 rank 8."""
+        squares = np.flatnonzero(self.squares)
+        return [(square // 8, square % 8, PIECES[code - 1]) for square, code in zip(squares.tolist(), self.squares[squares].tolist())]
+
+    def rotated(self):
+        """180도 돌린 보드 (반대 시점)."""
+        return PackedBoard(self.squares[::-1])
+
+    def counts(self):
+        return np.bincount(self.squares, minlength=NUM_CODES)
+
+    def problems(self):
+        return problem_names(validate_boards(self.squares)[0])
+
+    def __eq__(self, other):
+        return isinstance(other, PackedBoard) and bool((self.squares == other.squares).all())
+
+    def __hash__(self):
+        return hash(self.squares.tobytes())
+
+    def __repr__(self):
+        return f"PackedBoard({self.placement!r})"
@@ -0,0 +1,310 @@
+"""
+recognize-fen.py 에서 쓰는 결과 캐시.
+
+- 메모리 LRU + TTL 만료
+- 선택적으로 SQLite 파일에 영구 저장 (여러 worker 프로세스가 같은 파일을 공유 가능)
+- 값은 JSON 직렬화 가능한 dict
+- AnalysisCache: 정규화한 FEN별 엔진 분석 결과 (더 깊은 결과가 더 얕은 요청을 만족)
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import xxhash
+except ImportError:  # 선택 의존성
+    xxhash = None
+
+
+def content_hash(*parts):
+    """
+    bytes-like 조각들의 빠른 콘텐츠 해시 (hex).
+    xxhash가 설치되어 있으면 xxh3_128, 없으면 blake2b(128bit)를 사용합니다.
+    """
+    h = xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    LRU + TTL 캐시. db_path가 주어지면 SQLite 테이블을 2차 저장소로 사용합니다.
+    SQLite 오류는 무시하고 메모리 캐시로만 동작합니다.
+    """
+
+    PRUNE_EVERY = 256
+
+    def __init__(self, max_entries=256, ttl=600.0, db_path=None, table="results"):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = float(ttl) if ttl else 0.0
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._puts = 0
+        if db_path:
+            self._db = self._open_db(db_path)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @property
+    def backend(self):
+        return "sqlite" if self._db is not None else "memory"
+
+    def _open_db(self, db_path):
+        try:
+            db = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            db.commit()
+            return db
+        except sqlite3.Error:
+            return None
+
+    def _expired(self, created, now):
+        return self.ttl > 0 and now - created > self.ttl
+
+    def get(self, key):
+        return self._read(key, count=True)
+
+    def peek(self, key):
+        """get과 같지만 hits/misses 통계를 바꾸지 않습니다 (다른 캐시가 내부 저장소로 쓸 때)."""
+        return self._read(key, count=False)
+
+    def _read(self, key, count):
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            value = self._lookup(key, now)
+            if count:
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return value
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None:
+            created, value = entry
+            if not self._expired(created, now):
+                self._entries.move_to_end(key)
+                return value
+            del self._entries[key]
+
+        value = self._db_get(key, now)
+        if value is not None:
+            self._remember(key, value[0], value[1])
+            return value[1]
+        return None
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            self._db_put(key, now, value)
+
+    def _remember(self, key, created, value):
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _db_get(self, key, now):
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None or self._expired(row[1], now):
+            return None
+        try:
+            return row[1], json.loads(row[0])
+        except ValueError:
+            return None
+
+    def _db_put(self, key, created, value):
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created) VALUES (?, ?, ?)",
+                (key, json.dumps(value), created),
+            )
+            self._puts += 1
+            if self._puts % self.PRUNE_EVERY == 0:
+                self._db_prune(created)
+            self._db.commit()
+        except sqlite3.Error:
+            pass
+
+    def _db_prune(self, now):
+        # TTL 만료분 삭제 후, 가장 오래된 항목부터 max_entries의 16배까지만 보관
+        if self.ttl > 0:
+            self._db.execute(f"DELETE FROM {self.table} WHERE created < ?", (now - self.ttl,))
+        self._db.execute(
+            f"DELETE FROM {self.table} WHERE key NOT IN "
+            f"(SELECT key FROM {self.table} ORDER BY created DESC LIMIT ?)",
+            (self.max_entries * 16,),
+        )
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "backend": self.backend,
+        }
+
+
+PIECE_CHARS = frozenset("PNBRQKpnbrqk")
+# 캐슬링 권리별로 제자리에 있어야 하는 (행, 열, 기물) - 행 0 = rank 8
+CASTLING_SQUARES = {
+    "K": ((7, 4, "K"), (7, 7, "R")),
+    "Q": ((7, 4, "K"), (7, 0, "R")),
+    "k": ((0, 4, "k"), (0, 7, "r")),
+    "q": ((0, 4, "k"), (0, 0, "r")),
+}
+
+
+def normalize_fen(fen):
+    """
+    분석 캐시 키용 FEN 정규화: 배치, 차례, 캐슬링, 앙파상만 남기고 수 카운터는 버립니다.
+    캐슬링은 킹/룩이 제자리에 있는 권리만 KQkq 순서로, 앙파상은 잡을 수 있는 폰이 있을 때만 남깁니다.
+    (같은 위치가 FEN 생성기마다 다르게 적혀도 같은 키가 되도록) 잘못된 FEN은 ValueError.
+    """
+    fields = fen.split()
+    if not fields:
+        raise ValueError("empty FEN")
+    rows = fields[0].split("/")
+    if len(rows) != 8:
+        raise ValueError(f"FEN placement must have 8 ranks: {fields[0]}")
+    board = []
+    for row in rows:
+        cells = []
+        for char in row:
+            if char.isdigit():
+                cells.extend([""] * int(char))
+            elif char in PIECE_CHARS:
+                cells.append(char)
+            else:
+                raise ValueError(f"invalid FEN character: {char}")
+        if len(cells) != 8:
+            raise ValueError(f"FEN rank must have 8 squares: {row}")
+        board.append(cells)
+
+    side = fields[1] if len(fields) > 1 else "w"
+    if side not in ("w", "b"):
+        raise ValueError(f"invalid side to move: {side}")
+    rights = fields[2] if len(fields) > 2 else "-"
+    castling = "".join(
+        flag for flag, squares in CASTLING_SQUARES.items()
+        if flag in rights and all(board[r][f] == p for r, f, p in squares)
+    ) or "-"
+    en_passant = fields[3] if len(fields) > 3 else "-"
+    if en_passant != "-":
+        file = "abcdefgh".find(en_passant[:1])
+        # 백 차례면 rank 6 칸을 rank 5(행 3)의 백 폰이, 흑 차례면 rank 3 칸을 rank 4(행 4)의 흑 폰이 잡습니다
+        rank, row, pawn = ("6", 3, "P") if side == "w" else ("3", 4, "p")
+        if file < 0 or en_passant[1:] != rank or not any(
+            0 <= f < 8 and board[row][f] == pawn for f in (file - 1, file + 1)
+        ):
+            en_passant = "-"
+
+    placement = []
+    for cells in board:
+        text, empty = "", 0
+        for piece in cells:
+            if not piece:
+                empty += 1
+                continue
+            if empty:
+                text += str(empty)
+                empty = 0
+            text += piece
+        placement.append(text + (str(empty) if empty else ""))
+    return f"{'/'.join(placement)} {side} {castling} {en_passant}"
+
+
+class AnalysisCache:
+    """
+    엔진 분석 결과 캐시. 키는 normalize_fen, 저장은 ResultCache(메모리 LRU + 선택적 SQLite "analysis" 테이블).
+    위치마다 가장 깊은 depth 결과와 가장 긴 movetime 결과를 하나씩 두며,
+    depth ≥ 요청 depth (movetime 요청이면 movetime ≥ 요청 movetime) 인 결과가 있으면 적중입니다.
+    call_stockfish_online 과 로컬 엔진 풀이 같은 캐시를 씁니다.
+    """
+
+    def __init__(self, max_entries=1024, ttl=0.0, db_path=None):
+        self._store = ResultCache(max_entries=max_entries, ttl=ttl, db_path=db_path, table="analysis")
+        self.hits = 0
+        self.misses = 0
+        # put의 읽기-병합-쓰기와 통계를 한 번에 갱신 (analyse 스레드와 요청 스레드가 함께 씀)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self._store.enabled
+
+    @property
+    def backend(self):
+        return self._store.backend
+
+    @staticmethod
+    def _slot(depth, movetime):
+        return ("depth", depth) if depth else ("movetime", movetime)
+
+    def get(self, fen, depth=None, movetime=None):
+        """
+        Returns: {"bestMove", "evaluation", "depth" | "movetime"} 또는 None (없음/얕음/잘못된 FEN)
+        """
+        if not self.enabled:
+            return None
+        try:
+            key = normalize_fen(fen)
+        except ValueError:
+            return None
+        slot, limit = self._slot(depth, movetime)
+        with self._lock:
+            result = (self._store.peek(key) or {}).get(slot)
+            if result is not None and limit and result.get(slot, 0) >= limit:
+                self.hits += 1
+                return result
+            self.misses += 1
+            return None
+
+    def put(self, fen, best_move, evaluation, depth=None, movetime=None):
+        """결과를 저장합니다. 같은 위치에 이미 더 깊은(긴) 결과가 있으면 그대로 둡니다."""
+        if not self.enabled or not (depth or movetime):
+            return
+        try:
+            key = normalize_fen(fen)
+        except ValueError:
+            return
+        slot, limit = self._slot(depth, movetime)
+        with self._lock:
+            entry = dict(self._store.peek(key) or {})
+            current = entry.get(slot)
+            if current is not None and current.get(slot, 0) > limit:
+                return
+            entry[slot] = {"bestMove": best_move, "evaluation": evaluation, slot: limit}
+            self._store.put(key, entry)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": self._store.stats()["size"], "backend": self.backend}
@@ -0,0 +1,170 @@
+"""
+recognize-fen.py 의 내장 기물 분류기 (CPU 전용, NumPy + OpenCV만 사용).
+
+- 정사각형으로 편 보드(extract_board 결과)를 64칸으로 나눠 한 번에 특징을 뽑습니다.
+  특징 = HOG(칸당 4x4 셀 × 9방향, 2x2 블록 정규화) + 칸 모서리 대비 밝기(4x4, 양/음 분리)
+- 13클래스 softmax 선형 모델: 빈칸 + 6종 × 2색 (CLASSES)
+- 가중치는 .npz 하나 (train-piece-classifier.py 로 합성 보드에서 학습)
+"""
+import cv2
+import numpy as np
+
+CLASSES = ("",) + tuple("PNBRQKpnbrqk")
+
+# 특징 추출 해상도: 칸 하나를 CELL_PX × CELL_PX로 줄여서 계산합니다
+CELL_PX = 32
+HOG_CELL = 8
+HOG_BINS = 9
+
+
+def square_grays(board_img):
+    """
+    정사각형 보드 BGR 배열 → (64, CELL_PX, CELL_PX) float32 그레이 (0..1).
+    칸 순서는 rank 8(위)부터 행 우선입니다.
+    """
+    size = CELL_PX * 8
+    if board_img.shape[0] != size or board_img.shape[1] != size:
+        board_img = cv2.resize(board_img, (size, size), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(board_img, cv2.COLOR_BGR2GRAY).astype(np.float32) * (1.0 / 255.0)
+    return gray.reshape(8, CELL_PX, 8, CELL_PX).transpose(0, 2, 1, 3).reshape(64, CELL_PX, CELL_PX)
+
+
+def hog_features(cells):
+    """(n, h, w) 그레이 배치 → (n, blocks * 4 * HOG_BINS) HOG. 칸 루프 없이 한 번에 계산합니다."""
+    n, h, w = cells.shape
+    gx = np.zeros_like(cells)
+    gy = np.zeros_like(cells)
+    gx[:, :, 1:-1] = cells[:, :, 2:] - cells[:, :, :-2]
+    gy[:, 1:-1, :] = cells[:, 2:, :] - cells[:, :-2, :]
+    # cartToPolar는 arctan2보다 훨씬 빠릅니다 (방향 부호 무시: 0..pi)
+    magnitude, angle = cv2.cartToPolar(gx.reshape(n * h, w), gy.reshape(n * h, w))
+    bins = np.minimum((angle % np.pi * (HOG_BINS / np.pi)).astype(np.int32), HOG_BINS - 1)
+    ch, cw = h // HOG_CELL, w // HOG_CELL
+    # (칸, 셀, 방향) 평탄 인덱스 하나로 bincount 한 번에 히스토그램을 만듭니다
+    cell_index = (np.arange(h)[:, None] // HOG_CELL) * cw + (np.arange(w)[None, :] // HOG_CELL)
+    flat = (np.arange(n)[:, None, None] * (ch * cw) + cell_index) * HOG_BINS + bins.reshape(n, h, w)
+    hist = np.bincount(flat.ravel(), weights=magnitude.ravel(), minlength=n * ch * cw * HOG_BINS)
+    hist = hist.astype(np.float32).reshape(n, ch, cw, HOG_BINS)
+    # 2x2 셀 블록, L2-Hys 정규화
+    blocks = np.concatenate(
+        [hist[:, :-1, :-1], hist[:, :-1, 1:], hist[:, 1:, :-1], hist[:, 1:, 1:]], axis=-1
+    ).reshape(n, (ch - 1) * (cw - 1), 4 * HOG_BINS)
+    blocks = blocks / np.sqrt((blocks * blocks).sum(axis=-1, keepdims=True) + 1e-6)
+    blocks = np.minimum(blocks, 0.2)
+    blocks = blocks / np.sqrt((blocks * blocks).sum(axis=-1, keepdims=True) + 1e-6)
+    return blocks.reshape(n, -1)
+
+
+def tone_features(cells):
+    """
+    칸 모서리(배경) 평균 대비 4x4 영역 밝기 차이. 기물 색(흰/검)은 HOG로 구분되지 않으므로
+    양수/음수 부분을 따로 두어 선형 모델이 '배경보다 밝음/어두움'을 쓸 수 있게 합니다.
+    """
+    n, h, w = cells.shape
+    k = max(2, h // 8)
+    border = np.concatenate(
+        [cells[:, :k, :k], cells[:, :k, -k:], cells[:, -k:, :k], cells[:, -k:, -k:]], axis=1
+    ).reshape(n, -1).mean(axis=1)
+    pooled = cells.reshape(n, 4, h // 4, 4, w // 4).mean(axis=(2, 4)).reshape(n, 16)
+    diff = pooled - border[:, None]
+    return np.concatenate([np.maximum(diff, 0), np.maximum(-diff, 0), border[:, None]], axis=1)
+
+
+def square_features(board_img, squares=None):
+    """
+    정사각형 보드 → (64, D) float32 특징.
+    squares(0..63 인덱스 배열)를 주면 그 칸들만 (len(squares), D) 로 계산합니다 (sequence 모드의 부분 재분류).
+    """
+    cells = square_grays(board_img)
+    if squares is not None:
+        cells = cells[np.asarray(squares, dtype=np.int64)]
+    return np.concatenate([hog_features(cells), tone_features(cells)], axis=1).astype(np.float32)
+
+
+def boards_features(board_imgs):
+    """정사각형 보드 여러 장 → (64 × 장수, D) 특징. 모든 칸을 한 배치로 계산합니다 (여러 보드 인식)."""
+    cells = np.concatenate([square_grays(board_img) for board_img in board_imgs])
+    return np.concatenate([hog_features(cells), tone_features(cells)], axis=1).astype(np.float32)
+
+
+def softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class PieceClassifier:
+    """표준화 + softmax 선형 모델. predict_proba는 (n, len(CLASSES)) 확률을 돌려줍니다."""
+
+    __slots__ = ("mean", "scale", "weights", "bias", "meta")
+
+    def __init__(self, mean, scale, weights, bias, meta=None):
+        self.mean = mean.astype(np.float32)
+        self.scale = scale.astype(np.float32)
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        self.meta = meta or {}
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = {k[5:]: data[k].item() for k in data.files if k.startswith("meta_")}
+            return cls(data["mean"], data["scale"], data["weights"], data["bias"], meta)
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            mean=self.mean,
+            scale=self.scale,
+            weights=self.weights,
+            bias=self.bias,
+            **{f"meta_{k}": np.asarray(v) for k, v in self.meta.items()},
+        )
+
+    def predict_proba(self, features):
+        return softmax(((features - self.mean) / self.scale) @ self.weights + self.bias)
+
+    def classify(self, board_img):
+        """
+        정사각형 보드의 64칸을 한 배치로 분류합니다.
+
+        Returns: (labels, probs) - labels는 8x8 list ('' 또는 FEN 기물 문자), probs는 (8, 8, 13)
+        """
+        probs = self.predict_proba(square_features(board_img)).reshape(8, 8, len(CLASSES))
+        labels = np.array(CLASSES, dtype=object)[probs.argmax(axis=-1)]
+        return labels.tolist(), probs
+
+
+def train_softmax(features, labels, epochs=400, lr=0.05, l2=1e-4, log=None):
+    """
+    특징 (n, D), 정수 레이블 (n,) 로 softmax 선형 모델을 전체 배치 Adam으로 학습합니다.
+    클래스 빈도 차이(빈칸이 절반 이상)는 역빈도 가중치로 보정합니다.
+    """
+    n, dim = features.shape
+    k = len(CLASSES)
+    mean = features.mean(axis=0)
+    scale = features.std(axis=0) + 1e-3
+    x = (features - mean) / scale
+    onehot = np.eye(k, dtype=np.float32)[labels]
+    counts = np.bincount(labels, minlength=k).astype(np.float32)
+    class_weight = np.where(counts > 0, n / (k * np.maximum(counts, 1)), 0.0).astype(np.float32)
+    sample_weight = class_weight[labels][:, None] / n
+
+    weights = np.zeros((dim, k), np.float32)
+    bias = np.zeros(k, np.float32)
+    params = [weights, bias]
+    moments = [[np.zeros_like(p), np.zeros_like(p)] for p in params]
+    beta1, beta2 = 0.9, 0.999
+    for epoch in range(1, epochs + 1):
+        probs = softmax(x @ weights + bias)
+        delta = (probs - onehot) * sample_weight
+        grads = [x.T @ delta + l2 * weights, delta.sum(axis=0)]
+        for p, g, m in zip(params, grads, moments):
+            m[0] = beta1 * m[0] + (1 - beta1) * g
+            m[1] = beta2 * m[1] + (1 - beta2) * g * g
+            p -= lr * (m[0] / (1 - beta1 ** epoch)) / (np.sqrt(m[1] / (1 - beta2 ** epoch)) + 1e-8)
+        if log and (epoch % 50 == 0 or epoch == epochs):
+            loss = -(np.log(np.maximum((probs * onehot).sum(axis=1), 1e-9)) * sample_weight[:, 0]).sum()
+            accuracy = float((probs.argmax(axis=1) == labels).mean())
+            log(f"epoch {epoch}: loss {loss:.4f} accuracy {accuracy:.4f}")
+    return PieceClassifier(mean, scale, weights, bias)
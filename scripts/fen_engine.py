@@ -0,0 +1,264 @@
+"""
+recognize-fen.py 의 로컬 UCI 엔진(Stockfish 등) 분석 백엔드.
+
+- 엔진은 상주 subprocess로 띄워 두고 요청마다 `isready` 핸드셰이크 후 position / go 를 보냅니다.
+- 요청마다 depth 또는 movetime(ms) 제한을 줄 수 있습니다 (둘 다 주면 먼저 닿는 쪽에서 끝남).
+- EnginePool은 최대 size개의 엔진을 재사용하며, 응답이 없거나 죽은 엔진은 버리고 새로 띄웁니다.
+- 결과는 call_stockfish_online 과 같은 (best_move, evaluation, error) 계약을 따릅니다.
+  evaluation은 백 기준 폰 단위 float, 메이트는 "#N" / "#-N" 문자열입니다.
+"""
+import queue
+import shlex
+import subprocess
+import threading
+import time
+
+# isready / uci 응답을 기다리는 기본 시간 (초)
+HANDSHAKE_TIMEOUT = 10.0
+# movetime 요청에서 bestmove를 기다릴 여유 시간 (초)
+MOVETIME_GRACE = 2.0
+
+
+class EngineError(RuntimeError):
+    """엔진이 응답하지 않거나 종료되었을 때."""
+
+
+class EngineTimeout(EngineError):
+    """제한 시간 안에 기다리던 응답이 오지 않았을 때."""
+
+
+def parse_info(line):
+    """
+    'info depth 12 ... score cp 35 ... pv e2e4 e7e5' → {"depth", "cp" 또는 "mate", "pv"}.
+    점수가 없는 info 줄(currmove 등)이나 lowerbound/upperbound 점수는 None.
+    """
+    tokens = line.split()
+    info = {}
+    i = 1
+    while i < len(tokens):
+        token = tokens[i]
+        if token == "depth" and i + 1 < len(tokens):
+            info["depth"] = int(tokens[i + 1])
+            i += 2
+        elif token == "score" and i + 2 < len(tokens):
+            info[tokens[i + 1]] = int(tokens[i + 2])
+            if i + 3 < len(tokens) and tokens[i + 3] in ("lowerbound", "upperbound"):
+                return None
+            i += 3
+        elif token == "pv":
+            info["pv"] = tokens[i + 1:]
+            break
+        else:
+            i += 1
+    if "cp" not in info and "mate" not in info:
+        return None
+    return info
+
+
+def white_evaluation(info, white_to_move):
+    """UCI 점수(둘 차례 기준) → 백 기준 평가. cp는 폰 단위 float, 메이트는 "#N" / "#-N"."""
+    sign = 1 if white_to_move else -1
+    if "mate" in info:
+        return f"#{info['mate'] * sign}"
+    return round(info["cp"] * sign / 100.0, 2)
+
+
+class UciEngine:
+    """UCI 엔진 프로세스 하나. stdout은 별도 스레드가 줄 단위 큐로 옮기므로 시간 제한을 두고 읽을 수 있습니다."""
+
+    def __init__(self, command, options=None, timeout=HANDSHAKE_TIMEOUT):
+        self.command = shlex.split(command) if isinstance(command, str) else list(command)
+        self.name = None
+        self._lines = queue.Queue()
+        try:
+            self.process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                bufsize=1,
+            )
+        except OSError as e:
+            raise EngineError(f"Could not start engine {self.command[0]}: {e}") from e
+        threading.Thread(target=self._read, name="uci-reader", daemon=True).start()
+
+        deadline = time.monotonic() + timeout
+        self.send("uci")
+        while True:
+            line = self._next(deadline)
+            if line.startswith("id name "):
+                self.name = line[8:]
+            elif line == "uciok":
+                break
+        for name, value in (options or {}).items():
+            self.send(f"setoption name {name} value {value}")
+        self.ready(timeout)
+
+    def _read(self):
+        for line in self.process.stdout:
+            self._lines.put(line.strip())
+        self._lines.put(None)
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def send(self, command):
+        try:
+            self.process.stdin.write(command + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError, ValueError) as e:
+            raise EngineError(f"engine exited: {e}") from e
+
+    def _next(self, deadline):
+        try:
+            line = self._lines.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            raise EngineTimeout("engine timed out") from None
+        if line is None:
+            raise EngineError(f"engine exited (code {self.process.poll()})")
+        return line
+
+    def ready(self, timeout=HANDSHAKE_TIMEOUT):
+        """isready → readyok 핸드셰이크 (이전 출력은 버립니다)."""
+        deadline = time.monotonic() + timeout
+        self.send("isready")
+        while self._next(deadline) != "readyok":
+            pass
+
+    def analyse(self, fen, depth=None, movetime=None, timeout=None):
+        """
+        fen 위치를 depth 또는 movetime(ms)으로 분석합니다.
+        timeout(초) 안에 bestmove가 없으면 stop을 보내고, 그래도 없으면 EngineError.
+
+        Returns: {"bestMove", "evaluation", "depth", "pv"}
+        """
+        if not depth and not movetime:
+            depth = 15
+        self.ready()
+        self.send(f"position fen {fen}")
+        limits = (f" depth {int(depth)}" if depth else "") + (f" movetime {int(movetime)}" if movetime else "")
+        self.send("go" + limits)
+        if timeout is None:
+            timeout = movetime / 1000.0 + MOVETIME_GRACE if movetime else 30.0
+        deadline = time.monotonic() + timeout
+
+        white_to_move = fen.split()[1:2] != ["b"]
+        last = None
+        stopped = False
+        while True:
+            try:
+                line = self._next(deadline)
+            except EngineTimeout:
+                if stopped:
+                    raise
+                # 시간 초과: 지금까지의 최선 수를 받도록 stop
+                self.send("stop")
+                deadline = time.monotonic() + MOVETIME_GRACE
+                stopped = True
+                continue
+            if line.startswith("info "):
+                info = parse_info(line)
+                if info is not None:
+                    last = info
+            elif line.startswith("bestmove"):
+                parts = line.split()
+                best = parts[1] if len(parts) > 1 and parts[1] != "(none)" else None
+                return {
+                    "bestMove": best,
+                    "evaluation": white_evaluation(last, white_to_move) if last else None,
+                    "depth": last.get("depth") if last else None,
+                    "pv": last.get("pv", []) if last else [],
+                }
+
+    def close(self):
+        if self.alive:
+            try:
+                self.send("quit")
+                self.process.wait(timeout=1.0)
+            except (EngineError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+
+
+class EnginePool:
+    """
+    최대 size개의 UciEngine을 필요할 때 띄워 재사용하는 풀 (스레드 안전).
+    엔진 오류가 나면 그 엔진은 닫고 다음 요청에서 새로 띄웁니다.
+    """
+
+    def __init__(self, command, size=1, options=None, timeout=30.0):
+        self.command = command
+        self.size = max(1, int(size))
+        self.options = dict(options or {})
+        self.timeout = float(timeout)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self.started = 0
+        self.failures = 0
+        self.requests = 0
+
+    def _acquire_engine(self):
+        while True:
+            try:
+                engine = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if engine.alive:
+                return engine
+            engine.close()
+        engine = UciEngine(self.command, self.options)
+        with self._lock:
+            self.started += 1
+        return engine
+
+    def search(self, fen, depth=None, movetime=None):
+        """
+        Returns: (result, error) - result는 UciEngine.analyse 의 dict (실패하면 None)
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            return None, "engine pool busy"
+        engine = None
+        try:
+            with self._lock:
+                self.requests += 1
+            engine = self._acquire_engine()
+            return engine.analyse(fen, depth=depth, movetime=movetime, timeout=self.timeout), None
+        except EngineError as e:
+            with self._lock:
+                self.failures += 1
+            if engine is not None:
+                engine.close()
+                engine = None
+            return None, str(e)
+        finally:
+            if engine is not None:
+                self._idle.put(engine)
+            self._slots.release()
+
+    def analyse(self, fen, depth=None, movetime=None):
+        """
+        Returns: (best_move, evaluation, error) - call_stockfish_online 과 같은 계약
+        """
+        result, error = self.search(fen, depth=depth, movetime=movetime)
+        if result is None:
+            return None, None, error
+        return result["bestMove"], result["evaluation"], None
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "started": self.started,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
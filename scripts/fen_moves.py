@@ -0,0 +1,340 @@
+"""
+연속된 보드 인식 결과에서 둔 수를 추론하고 PGN을 만듭니다 (recognize-fen.py sequence 모드).
+
+보드는 백 시점 8x8 list (0번 행 = rank 8, '' 는 빈칸) 입니다.
+합법 수 생성 대신 기물별 이동 규칙(pseudo-legal)만 확인하므로 핀이나 체크메이트(#)는 판단하지 않습니다.
+"""
+FILES = "abcdefgh"
+STANDARD_START = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR"
+
+KNIGHT_STEPS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_STEPS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+ROOK_RAYS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_RAYS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def square_name(square):
+    rank, file = square
+    return f"{FILES[file]}{8 - rank}"
+
+
+def is_white(piece):
+    return piece.isupper()
+
+
+def board_to_placement(board):
+    rows = []
+    for row in board:
+        text, empty = "", 0
+        for piece in row:
+            if not piece:
+                empty += 1
+                continue
+            if empty:
+                text += str(empty)
+                empty = 0
+            text += piece
+        rows.append(text + (str(empty) if empty else ""))
+    return "/".join(rows)
+
+
+def placement_to_board(placement):
+    board = []
+    for row in placement.split()[0].split("/"):
+        cells = []
+        for char in row:
+            cells.extend([""] * int(char) if char.isdigit() else [char])
+        board.append(cells)
+    return board
+
+
+def attacks(board, square):
+    """square의 기물이 공격하는 칸들 (폰은 대각선 두 칸)."""
+    rank, file = square
+    piece = board[rank][file]
+    if not piece:
+        return []
+    kind = piece.lower()
+    result = []
+    if kind == "p":
+        forward = -1 if is_white(piece) else 1
+        for df in (-1, 1):
+            r, f = rank + forward, file + df
+            if 0 <= r < 8 and 0 <= f < 8:
+                result.append((r, f))
+        return result
+    if kind in "nk":
+        for dr, df in KNIGHT_STEPS if kind == "n" else KING_STEPS:
+            r, f = rank + dr, file + df
+            if 0 <= r < 8 and 0 <= f < 8:
+                result.append((r, f))
+        return result
+    rays = ROOK_RAYS if kind == "r" else BISHOP_RAYS if kind == "b" else ROOK_RAYS + BISHOP_RAYS
+    for dr, df in rays:
+        r, f = rank + dr, file + df
+        while 0 <= r < 8 and 0 <= f < 8:
+            result.append((r, f))
+            if board[r][f]:
+                break
+            r, f = r + dr, f + df
+    return result
+
+
+def is_attacked(board, square, by_white):
+    for rank in range(8):
+        for file in range(8):
+            piece = board[rank][file]
+            if piece and is_white(piece) == by_white and square in attacks(board, (rank, file)):
+                return True
+    return False
+
+
+def find_king(board, white):
+    king = "K" if white else "k"
+    for rank in range(8):
+        for file in range(8):
+            if board[rank][file] == king:
+                return rank, file
+    return None
+
+
+class Move:
+    __slots__ = ("origin", "target", "piece", "captured", "promotion", "castle", "en_passant", "white")
+
+    def __init__(self, origin, target, piece, captured="", promotion="", castle="", en_passant=False):
+        self.origin = origin
+        self.target = target
+        self.piece = piece
+        self.captured = captured
+        self.promotion = promotion
+        self.castle = castle  # "", "O-O", "O-O-O"
+        self.en_passant = en_passant
+        self.white = is_white(piece)
+
+    def uci(self):
+        return square_name(self.origin) + square_name(self.target) + self.promotion.lower()
+
+
+def _pawn_can_move(board, move):
+    (r0, f0), (r1, f1) = move.origin, move.target
+    forward = -1 if move.white else 1
+    start_rank = 6 if move.white else 1
+    if f0 == f1:
+        if move.captured:
+            return False
+        if r1 == r0 + forward:
+            return True
+        return r0 == start_rank and r1 == r0 + 2 * forward and not board[r0 + forward][f0]
+    return abs(f1 - f0) == 1 and r1 == r0 + forward and bool(move.captured)
+
+
+def infer_move(before, after, white_to_move):
+    """
+    두 보드의 차이를 mover 한 수로 설명할 수 있으면 Move, 아니면 None.
+    일반 이동/잡기, 프로모션, 캐슬링, 앙파상을 처리합니다.
+    """
+    own = str.isupper if white_to_move else str.islower
+    changed = [(r, f) for r in range(8) for f in range(8) if before[r][f] != after[r][f]]
+    vanished = [s for s in changed if before[s[0]][s[1]] and own(before[s[0]][s[1]])]
+    appeared = [s for s in changed if after[s[0]][s[1]] and own(after[s[0]][s[1]])]
+    king = "K" if white_to_move else "k"
+    rook = "R" if white_to_move else "r"
+
+    # 캐슬링: 킹과 룩이 같은 랭크에서 함께 이동
+    if len(changed) == 4 and len(vanished) == 2 and len(appeared) == 2:
+        k0 = [s for s in vanished if before[s[0]][s[1]] == king]
+        k1 = [s for s in appeared if after[s[0]][s[1]] == king]
+        r0 = [s for s in vanished if before[s[0]][s[1]] == rook]
+        r1 = [s for s in appeared if after[s[0]][s[1]] == rook]
+        if k0 and k1 and r0 and r1 and k0[0][0] == k1[0][0] and abs(k1[0][1] - k0[0][1]) == 2:
+            side = "O-O" if k1[0][1] > k0[0][1] else "O-O-O"
+            return Move(k0[0], k1[0], king, castle=side)
+        return None
+
+    if len(vanished) != 1 or len(appeared) != 1:
+        return None
+    origin, target = vanished[0], appeared[0]
+    piece = before[origin[0]][origin[1]]
+    landed = after[target[0]][target[1]]
+    captured = before[target[0]][target[1]]
+    if captured and own(captured):
+        return None
+    move = Move(origin, target, piece, captured=captured)
+    extra = [s for s in changed if s not in (origin, target)]
+
+    if piece.lower() == "p":
+        last_rank = 0 if white_to_move else 7
+        if landed != piece:
+            if target[0] != last_rank or landed.lower() in "pk":
+                return None
+            move.promotion = landed
+        # 앙파상: 빈 칸으로 대각선 이동 + 옆 칸의 상대 폰이 사라짐
+        if not captured and origin[1] != target[1] and len(extra) == 1:
+            side = (origin[0], target[1])
+            victim = before[side[0]][side[1]]
+            if extra[0] == side and victim.lower() == "p" and not own(victim) and not after[side[0]][side[1]]:
+                move.captured, move.en_passant = victim, True
+                extra = []
+        if extra or not _pawn_can_move(before, move):
+            return None
+        return move
+
+    if landed != piece or extra or target not in attacks(before, origin):
+        return None
+    return move
+
+
+def san(before, after, move):
+    """move의 SAN 표기. before는 수를 두기 전, after는 둔 뒤의 보드입니다."""
+    if move.castle:
+        text = move.castle
+    else:
+        kind = move.piece.upper()
+        target = square_name(move.target)
+        if kind == "P":
+            text = (FILES[move.origin[1]] + "x" if move.captured else "") + target
+            if move.promotion:
+                text += "=" + move.promotion.upper()
+        else:
+            # 같은 종류의 다른 기물이 같은 칸으로 갈 수 있으면 파일 → 랭크 → 둘 다 순서로 구분
+            rivals = [
+                (r, f) for r in range(8) for f in range(8)
+                if (r, f) != move.origin and before[r][f] == move.piece and move.target in attacks(before, (r, f))
+            ]
+            hint = ""
+            if rivals:
+                if all(f != move.origin[1] for _, f in rivals):
+                    hint = FILES[move.origin[1]]
+                elif all(r != move.origin[0] for r, _ in rivals):
+                    hint = str(8 - move.origin[0])
+                else:
+                    hint = square_name(move.origin)
+            text = kind + hint + ("x" if move.captured else "") + target
+    king = find_king(after, not move.white)
+    if king is not None and is_attacked(after, king, move.white):
+        text += "+"
+    return text
+
+
+class GameRecord:
+    """
+    인식된 위치를 차례로 받아 수를 추론하고 PGN으로 기록합니다.
+    설명할 수 없는 위치 변화(놓친 수, 다른 게임)가 나오면 그 위치에서 새 게임을 시작합니다.
+    """
+
+    def __init__(self, headers=None):
+        self.headers = dict(headers or {})
+        self.games = []  # [{"start": fen, "moves": [san, ...]}]
+        self.board = None
+        self.white_to_move = True
+        self.castling = ""
+        self.en_passant = "-"
+        self.fullmove = 1
+
+    def fen(self):
+        side = "w" if self.white_to_move else "b"
+        return f"{board_to_placement(self.board)} {side} {self.castling or '-'} {self.en_passant} 0 {self.fullmove}"
+
+    def _start(self, board, white_to_move=True):
+        self.board = [list(row) for row in board]
+        self.white_to_move = white_to_move
+        self.castling = "".join(
+            flag for flag, squares in (
+                ("K", ((7, 4, "K"), (7, 7, "R"))), ("Q", ((7, 4, "K"), (7, 0, "R"))),
+                ("k", ((0, 4, "k"), (0, 7, "r"))), ("q", ((0, 4, "k"), (0, 0, "r"))),
+            )
+            if all(board[r][f] == p for r, f, p in squares)
+        )
+        self.en_passant = "-"
+        self.fullmove = 1
+        self.games.append({"start": self.fen(), "moves": []})
+
+    def explains(self, board):
+        """board가 첫 위치이거나 현재 위치에서 한 수로 설명되면 True (상태는 바꾸지 않습니다)."""
+        if self.board is None:
+            return True
+        if infer_move(self.board, board, self.white_to_move) is not None:
+            return True
+        return not self.games[-1]["moves"] and infer_move(self.board, board, not self.white_to_move) is not None
+
+    def push(self, board):
+        """
+        새로 확정된 위치를 추가합니다.
+        Returns: dict(move=Move|None, san=str|None, newGame=bool)
+        """
+        if self.board is None:
+            self._start(board)
+            return {"move": None, "san": None, "newGame": True}
+        move = infer_move(self.board, board, self.white_to_move)
+        game = self.games[-1]
+        if move is None and not game["moves"]:
+            # 첫 수가 흑의 수일 수 있습니다 (흑 차례 위치에서 녹화를 시작한 경우)
+            move = infer_move(self.board, board, not self.white_to_move)
+            if move is not None:
+                self.white_to_move = not self.white_to_move
+                game["start"] = self.fen()
+        if move is None:
+            self._start(board)
+            return {"move": None, "san": None, "newGame": True}
+
+        text = san(self.board, board, move)
+        game["moves"].append(text)
+        self._update_rights(move)
+        self.board = [list(row) for row in board]
+        if not self.white_to_move:
+            self.fullmove += 1
+        self.white_to_move = not self.white_to_move
+        return {"move": move, "san": text, "newGame": False}
+
+    def _update_rights(self, move):
+        lost = set()
+        if move.piece in "Kk":
+            lost |= set("KQ") if move.white else set("kq")
+        for square in (move.origin, move.target):
+            lost |= {(7, 7): {"K"}, (7, 0): {"Q"}, (0, 7): {"k"}, (0, 0): {"q"}}.get(square, set())
+        self.castling = "".join(c for c in self.castling if c not in lost)
+        self.en_passant = "-"
+        if move.piece in "Pp" and abs(move.target[0] - move.origin[0]) == 2:
+            self.en_passant = square_name(((move.origin[0] + move.target[0]) // 2, move.origin[1]))
+
+    def pgn(self):
+        """기록된 게임(들)을 PGN 텍스트로. 수가 없는 게임은 생략합니다."""
+        chunks = []
+        for game in self.games:
+            if not game["moves"]:
+                continue
+            headers = {
+                "Event": "Digitized game", "Site": "?", "Date": "????.??.??", "Round": "?",
+                "White": "?", "Black": "?", "Result": "*", **self.headers,
+            }
+            placement, side, _, _, _, number = game["start"].split()
+            if placement != STANDARD_START or side != "w":
+                headers["SetUp"] = "1"
+                headers["FEN"] = game["start"]
+            lines = [f'[{key} "{value}"]' for key, value in headers.items()]
+            tokens = []
+            number = int(number)
+            white = side == "w"
+            for index, text in enumerate(game["moves"]):
+                if white:
+                    tokens.append(f"{number}. {text}")
+                else:
+                    tokens.append(f"{number}... {text}" if index == 0 else text)
+                    number += 1
+                white = not white
+            tokens.append(headers["Result"])
+            chunks.append("\n".join(lines) + "\n\n" + _wrap(" ".join(tokens)) + "\n")
+        return "\n".join(chunks)
+
+
+def _wrap(text, width=79):
+    lines, line = [], ""
+    for word in text.split(" "):
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return "\n".join(lines)
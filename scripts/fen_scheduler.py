@@ -0,0 +1,229 @@
+"""
+recognize-fen.py 의 보드 감지 방식 스케줄러.
+
+- 방식별 비용(ms)과 성공률(신뢰도 기준 통과 비율)을 지수 이동 평균으로 학습하고,
+  "성공 한 번에 드는 기대 비용"(비용 / 성공률)이 낮은 방식부터 시도합니다. 아직 실행된 적 없는 방식은
+  정의 순서대로 먼저 시도합니다. fallback 방식(결과가 덜 정확함)은 항상 마지막이며 경쟁에서 이기지 못하고,
+  다른 방식이 모두 실패한 뒤에만 시작합니다. 단 deadline이 있으면 마감 - 예상 시간에는 다른 방식이 돌고 있어도
+  시작하므로, 다른 방식이 마감 안에 끝나지 못해도 fallback 결과는 남습니다.
+- run()은 스레드 풀에서 최대 parallel개 방식을 겹쳐 돌립니다(cv2 / numpy 연산은 GIL을 놓음).
+  다음 방식은 앞 방식이 실패했거나, 학습된 비용 × hedge (처음 보는 방식이면 cold_hedge초) 만큼 지나도
+  끝나지 않았을 때 시작하므로 보통은 가장 싼 유력 방식 하나만 돌고, 느려지는 경우에만 경쟁이 됩니다.
+- 기준을 통과한 첫 결과가 나오면 돌아옵니다. 실행 중인 나머지는 기다리지 않으며(취소할 수 없으므로 무시),
+  끝나면 비용/성공률에만 반영됩니다. 시작 전인 방식은 시작하지 않습니다.
+- deadline(time.perf_counter 기준)이 지나면 그때까지 끝난 결과만으로 돌아옵니다.
+- 스레드 풀 스레드는 인터프리터 종료 때 join 되므로, 한 번 쓰고 끝나는 프로세스는 응답을 쓴 뒤
+  shutdown()으로 무시된 방식이 남았는지 확인하고 남았으면 os._exit로 기다리지 않고 끝냅니다.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class MethodStats:
+    """방식 하나의 비용(초)/성공률 이동 평균."""
+
+    __slots__ = ("runs", "successes", "cost", "success_rate")
+
+    def __init__(self):
+        self.runs = 0
+        self.successes = 0
+        self.cost = 0.0
+        self.success_rate = 0.0
+
+    def update(self, seconds, success, alpha):
+        self.runs += 1
+        self.successes += bool(success)
+        if self.runs == 1:
+            self.cost = seconds
+            self.success_rate = 1.0 if success else 0.0
+        else:
+            self.cost += alpha * (seconds - self.cost)
+            self.success_rate += alpha * ((1.0 if success else 0.0) - self.success_rate)
+
+    def expected_cost(self, min_success):
+        return self.cost / max(self.success_rate, min_success)
+
+    def to_json(self, min_success):
+        return {
+            "runs": self.runs,
+            "successes": self.successes,
+            "costMs": round(self.cost * 1000.0, 3),
+            "successRate": round(self.success_rate, 4),
+            "expectedCostMs": round(self.expected_cost(min_success) * 1000.0, 3),
+        }
+
+
+class DetectorScheduler:
+    """
+    이름 → 감지 함수들을 학습된 순서로 (동시에) 실행합니다 (스레드 안전).
+    parallel이 1이고 deadline이 없으면 스레드 없이 호출한 스레드에서 순서대로 실행합니다.
+    """
+
+    def __init__(
+        self, names, parallel=1, max_workers=None, fallback=(), hedge=1.5, cold_hedge=0.02, alpha=0.2, min_success=0.05
+    ):
+        self.names = list(names)
+        self.fallback = frozenset(fallback)
+        self.parallel = max(1, int(parallel))
+        self.hedge = max(0.0, float(hedge))
+        self.cold_hedge = max(0.0, float(cold_hedge))
+        # deadline이 있으면 fallback은 parallel 제한 밖에서도 시작하므로 그만큼 스레드를 더 둡니다
+        self.max_workers = max(self.parallel + len(self.fallback), int(max_workers or self.parallel))
+        self.alpha = float(alpha)
+        self.min_success = float(min_success)
+        self._stats = {name: MethodStats() for name in self.names}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._running = 0
+        self.races = 0
+        self.deadline_misses = 0
+
+    def record(self, name, seconds, success):
+        with self._lock:
+            self._stats.setdefault(name, MethodStats()).update(seconds, success, self.alpha)
+
+    def order(self):
+        """시도 순서: 실행된 적 없는 방식(정의 순서) → 기대 비용이 낮은 순, fallback 방식은 그 뒤."""
+        with self._lock:
+            index = {name: i for i, name in enumerate(self.names)}
+            return sorted(
+                self.names,
+                key=lambda name: (
+                    name in self.fallback,
+                    (0, index[name], 0.0)
+                    if self._stats[name].runs == 0
+                    else (1, self._stats[name].expected_cost(self.min_success), index[name]),
+                ),
+            )
+
+    def _hedge_delay(self, name):
+        """name을 시작한 뒤 다음 방식을 겹쳐 시작하기까지 기다릴 시간(초). 처음 보는 방식이면 cold_hedge."""
+        with self._lock:
+            stats = self._stats[name]
+            return stats.cost * self.hedge if stats.runs else self.cold_hedge
+
+    def _timed(self, name, task, accept):
+        started = time.perf_counter()
+        result = error = None
+        try:
+            result = task()
+        except Exception as e:
+            error = e
+        seconds = time.perf_counter() - started
+        self.record(name, seconds, error is None and accept(result))
+        return result, seconds, error
+
+    def _pooled(self, name, task, accept):
+        try:
+            return self._timed(name, task, accept)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def run(self, tasks, accept, deadline=None):
+        """
+        tasks: 이름 → 인자 없는 callable, accept(result) → 기준 통과 여부.
+
+        Returns: (winner, finished, timed_out, order)
+          winner는 기준을 통과한 첫 방식 이름(없으면 None, fallback 방식은 winner가 되지 않음),
+          finished는 이름 → (result, seconds, error) - 이 호출 안에서 끝난 방식들 (끝난 순서)
+        """
+        order = [name for name in self.order() if name in tasks]
+        finished = {}
+        winner = None
+        timed_out = False
+        with self._lock:
+            self.races += 1
+
+        if self.parallel == 1 and deadline is None:
+            for name in order:
+                finished[name] = outcome = self._timed(name, tasks[name], accept)
+                if name not in self.fallback and outcome[2] is None and accept(outcome[0]):
+                    winner = name
+                    break
+            return winner, finished, timed_out, order
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="detect")
+        waiting = list(order)
+        running = {}
+
+        def launch(name=None):
+            name = waiting.pop(0) if name is None else waiting.pop(waiting.index(name))
+            with self._lock:
+                self._running += 1
+            running[self._executor.submit(self._pooled, name, tasks[name], accept)] = name
+            return time.perf_counter() + self._hedge_delay(name)
+
+        def can_launch():
+            # fallback 방식은 다른 방식이 모두 끝난(실패한) 뒤에만 시작합니다
+            if not waiting or len(running) >= self.parallel:
+                return False
+            return waiting[0] not in self.fallback or all(name in self.fallback for name in running.values())
+
+        def rescue():
+            # 마감 안에 다른 방식이 끝나지 못할 때를 대비해, 마감 - fallback 예상 시간(hedge 지연과 같은 값)에는
+            # 다른 방식이 돌고 있어도 fallback을 시작합니다 (parallel 제한과 무관). Returns: (이름, 시작 시각) 또는 None
+            if deadline is None:
+                return None
+            name = next((name for name in waiting if name in self.fallback), None)
+            return None if name is None else (name, deadline - self._hedge_delay(name))
+
+        hedge_at = launch()
+        while running:
+            now = time.perf_counter()
+            while can_launch() and hedge_at <= now:
+                hedge_at = launch()
+            fallback = rescue()
+            while fallback is not None and fallback[1] <= now:
+                launch(fallback[0])
+                fallback = rescue()
+            wake = [
+                t for t in (deadline, hedge_at if can_launch() else None, fallback and fallback[1]) if t is not None
+            ]
+            timeout = max(0.0, min(wake) - now) if wake else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    timed_out = True
+                    break
+                continue
+            for future in done:
+                name = running.pop(future)
+                finished[name] = outcome = future.result()
+                if winner is None and name not in self.fallback and outcome[2] is None and accept(outcome[0]):
+                    winner = name
+            if winner is not None:
+                break
+            # 실패했으면 다음 방식을 기다리지 않고 시작
+            if waiting and not running:
+                hedge_at = launch()
+            else:
+                hedge_at = min(hedge_at, time.perf_counter())
+        if timed_out:
+            with self._lock:
+                self.deadline_misses += 1
+        return winner, finished, timed_out, order
+
+    def shutdown(self):
+        """
+        시작 전인 방식을 취소하고 스레드 풀을 기다리지 않고 닫습니다.
+        Returns: 아직 실행 중인(무시된) 방식이 있으면 True - 호출한 쪽이 os._exit로 끝낼지 정합니다.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+            running = self._running
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return running > 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "parallel": self.parallel,
+                "races": self.races,
+                "deadlineMisses": self.deadline_misses,
+                "methods": {name: s.to_json(self.min_success) for name, s in self._stats.items()},
+            }
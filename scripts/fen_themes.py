@@ -0,0 +1,193 @@
+"""
+recognize-fen.py 의 보드 테마 보정 프로파일.
+
+- 알려진 배치(기본: 시작 위치) 한 장에서 밝은 칸/어두운 칸 배경색과
+  (칸 색 × 빈칸/흰 기물/검은 기물) 6개 클래스의 칸 중앙 색 통계를 학습합니다.
+- 프로파일은 이름별 JSON 파일로 CHESS_THEME_DIR 에 저장됩니다.
+- 인식할 때는 칸 모서리 색의 중앙값으로 가장 가까운 프로파일을 고르고,
+  64칸을 가장 가까운 클래스 중심(표준편차로 정규화한 거리)으로 한 번에 분류합니다.
+"""
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+PROFILE_VERSION = 1
+OCCUPANTS = ("empty", "white", "black")
+LABELS = ("", "w", "b")
+# 클래스 통계의 최소 표준편차 (칸이 너무 균일해 거리가 폭주하지 않도록)
+MIN_STD = 2.0
+
+
+def square_stats(board_img):
+    """
+    정사각형 보드 BGR → 칸별 (모서리 Lab 평균 (8, 8, 3), 특징 (8, 8, 5)).
+    특징 = 중앙 코어 Lab 평균 3 + 코어 L 표준편차 + (코어 L - 모서리 L).
+    has_piece와 같은 비율(코어 35% margin, 모서리 15%)을 씁니다.
+    """
+    h, w = board_img.shape[:2]
+    cell = min(h, w) // 8
+    crop = np.ascontiguousarray(board_img[:cell * 8, :cell * 8])
+    lab = cv2.cvtColor(cv2.GaussianBlur(crop, (5, 5), 0), cv2.COLOR_BGR2LAB).astype(np.float32)
+    cells = lab.reshape(8, cell, 8, cell, 3).transpose(0, 2, 1, 3, 4)
+    inner = int(cell * 0.35)
+    k = max(2, int(cell * 0.15))
+    core = cells[:, :, inner:cell - inner, inner:cell - inner]
+    corners = np.concatenate(
+        [
+            cells[:, :, :k, :k].reshape(8, 8, -1, 3),
+            cells[:, :, :k, -k:].reshape(8, 8, -1, 3),
+            cells[:, :, -k:, :k].reshape(8, 8, -1, 3),
+            cells[:, :, -k:, -k:].reshape(8, 8, -1, 3),
+        ],
+        axis=2,
+    ).mean(axis=2)
+    core_mean = core.mean(axis=(2, 3))
+    core_std = core[..., 0].std(axis=(2, 3))
+    features = np.concatenate(
+        [core_mean, core_std[..., None], (core_mean[..., 0] - corners[..., 0])[..., None]], axis=-1
+    )
+    return corners, features
+
+
+def light_parity():
+    """화면 기준 (rank + file) 짝수 칸이 밝은 칸 (a8, h1 모두 밝은 칸이므로 방향과 무관)."""
+    return (np.add.outer(np.arange(8), np.arange(8)) % 2) == 0
+
+
+def background_signature(corners):
+    """밝은 칸/어두운 칸 모서리 색의 중앙값 (6,) - 기물이 있는 칸이 섞여도 안정적입니다."""
+    light = light_parity()
+    return np.concatenate([np.median(corners[light], axis=0), np.median(corners[~light], axis=0)])
+
+
+class ThemeProfile:
+    """한 보드 스타일의 배경색과 6개 클래스(칸 색 × 점유 상태)의 특징 평균/표준편차."""
+
+    __slots__ = ("name", "background", "means", "stds", "meta")
+
+    def __init__(self, name, background, means, stds, meta=None):
+        self.name = name
+        self.background = np.asarray(background, np.float32)  # (6,)
+        self.means = np.asarray(means, np.float32)  # (2, 3, D) - [밝은/어두운 칸][빈칸/흰/검]
+        self.stds = np.maximum(np.asarray(stds, np.float32), MIN_STD)
+        self.meta = meta or {}
+
+    @classmethod
+    def calibrate(cls, name, board_img, grid):
+        """
+        화면 기준 8x8 기물 격자(grid, '' 는 빈칸)가 알려진 보드 한 장에서 프로파일을 학습합니다.
+        어떤 칸 색 위에 특정 점유 상태가 없으면 반대 칸 색의 통계로 채웁니다.
+        """
+        corners, features = square_stats(board_img)
+        light = light_parity()
+        occupant = np.array([[0 if not p else 1 if p.isupper() else 2 for p in row] for row in grid])
+        dim = features.shape[-1]
+        means = np.full((2, 3, dim), np.nan, np.float32)
+        stds = np.full((2, 3, dim), np.nan, np.float32)
+        for parity, mask in enumerate((light, ~light)):
+            for index in range(3):
+                selected = features[mask & (occupant == index)]
+                if len(selected):
+                    means[parity, index] = selected.mean(axis=0)
+                    stds[parity, index] = selected.std(axis=0)
+        for index, name_ in enumerate(OCCUPANTS):
+            for parity in range(2):
+                if np.isnan(means[parity, index, 0]):
+                    means[parity, index] = means[1 - parity, index]
+                    stds[parity, index] = stds[1 - parity, index]
+            if np.isnan(means[0, index, 0]):
+                raise ValueError(f"calibration position has no {name_} squares")
+        meta = {"created": time.time(), "squares": {o: int((occupant == i).sum()) for i, o in enumerate(OCCUPANTS)}}
+        return cls(name, background_signature(corners), means, stds, meta)
+
+    def classify(self, board_img, stats=None):
+        """64칸을 가장 가까운 클래스 중심으로 분류합니다. Returns: 8x8 list - 'w' / 'b' / ''"""
+        _, features = stats if stats is not None else square_stats(board_img)
+        parity = (~light_parity()).astype(np.int64)  # 0 = 밝은 칸
+        means = self.means[parity]  # (8, 8, 3, D)
+        stds = self.stds[parity]
+        distance = (((features[:, :, None, :] - means) / stds) ** 2).sum(axis=-1)
+        return np.array(LABELS, dtype=object)[distance.argmin(axis=-1)].tolist()
+
+    def to_json(self):
+        return {
+            "version": PROFILE_VERSION,
+            "name": self.name,
+            "background": self.background.round(3).tolist(),
+            "means": self.means.round(3).tolist(),
+            "stds": self.stds.round(3).tolist(),
+            "meta": self.meta,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        if data.get("version") != PROFILE_VERSION:
+            raise ValueError(f"unsupported theme profile version: {data.get('version')}")
+        return cls(data["name"], data["background"], data["means"], data["stds"], data.get("meta"))
+
+
+class ProfileStore:
+    """
+    디렉터리의 *.json 프로파일 모음. 디렉터리 mtime이 바뀌면(새 보정 저장) 다시 읽으므로
+    worker 프로세스도 재시작 없이 새 프로파일을 씁니다. save는 임시 파일을 쓴 뒤 os.replace로 바꿔 넣으므로
+    같은 이름을 다시 저장해도 디렉터리 mtime이 바뀌고, 읽는 쪽이 쓰다 만 파일을 보지 않습니다.
+    """
+
+    def __init__(self, directory, max_distance=12.0):
+        self.directory = directory
+        self.max_distance = float(max_distance)
+        self._profiles = []
+        self._mtime = None
+
+    def profiles(self):
+        try:
+            mtime = os.stat(self.directory).st_mtime
+        except OSError:
+            self._profiles, self._mtime = [], None
+            return self._profiles
+        if mtime != self._mtime:
+            profiles = []
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                        profiles.append(ThemeProfile.from_json(json.load(f)))
+                except (OSError, ValueError, KeyError):
+                    continue
+            self._profiles, self._mtime = profiles, mtime
+        return self._profiles
+
+    def save(self, profile):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{profile.name}.json")
+        # *.json이 아닌 이름이라 profiles()가 쓰는 중인 임시 파일을 읽지 않습니다
+        temp = os.path.join(self.directory, f".{profile.name}.{os.getpid()}.tmp")
+        try:
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump(profile.to_json(), f, indent=2)
+            os.replace(temp, path)
+        except BaseException:
+            if os.path.exists(temp):
+                os.unlink(temp)
+            raise
+        self._mtime = None
+        return path
+
+    def select(self, stats):
+        """
+        square_stats 결과의 배경색과 가장 가까운 프로파일.
+        Returns: (profile, distance) - max_distance 안에 없으면 profile은 None
+        """
+        profiles = self.profiles()
+        if not profiles:
+            return None, None
+        signature = background_signature(stats[0])
+        distances = [float(np.linalg.norm(p.background - signature)) for p in profiles]
+        best = int(np.argmin(distances))
+        if distances[best] > self.max_distance:
+            return None, distances[best]
+        return profiles[best], distances[best]
@@ -0,0 +1,164 @@
+"""
+recognize-fen.py 의 단계별 타이머.
+
+- span(name): 현재 요청의 Tracer에 구간을 기록하는 context manager (Tracer가 없으면 no-op)
+- Tracer.timings(): 이름별 누적 시간(ms) → debugInfo.timings
+- CHESS_FEN_PROFILE=cprofile | trace 이면 요청마다 pstats 또는 Chrome trace JSON을
+  CHESS_FEN_PROFILE_DIR 에 남깁니다. (trace 파일은 chrome://tracing, Perfetto에서 열 수 있음)
+"""
+import contextvars
+import os
+import time
+
+PROFILE_MODE = os.environ.get("CHESS_FEN_PROFILE", "").lower()
+PROFILE_DIR = os.environ.get("CHESS_FEN_PROFILE_DIR", "/tmp/chess-fen-profile")
+
+_current = contextvars.ContextVar("fen_tracer", default=None)
+
+
+class _Span:
+    """Tracer.span()의 context manager. 시작 시 프로세스 import 비용을 줄이려고 contextlib 대신 씁니다."""
+
+    __slots__ = ("tracer", "name", "started", "depth")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        tracer = self.tracer
+        if tracer is not None:
+            self.depth = tracer._depth
+            tracer._depth += 1
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        tracer = self.tracer
+        if tracer is not None:
+            ended = time.perf_counter()
+            tracer._depth = self.depth
+            tracer.spans.append((self.name, self.started - tracer.origin, ended - self.started, self.depth))
+        return False
+
+
+class Tracer:
+    """요청 하나의 구간 기록. 같은 이름이 여러 번 열리면 timings()에서 합산합니다."""
+
+    __slots__ = ("origin", "spans", "_depth")
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans = []  # (name, start, duration, depth) - 초 단위, origin 기준
+        self._depth = 0
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def add(self, name, duration):
+        """이미 측정된 구간(초)을 현재 시점에 끝난 것으로 기록합니다."""
+        end = time.perf_counter() - self.origin
+        self.spans.append((name, end - duration, duration, self._depth))
+
+    def total(self):
+        return time.perf_counter() - self.origin
+
+    def timings(self):
+        result = {}
+        for name, _, duration, _ in self.spans:
+            result[name] = result.get(name, 0.0) + duration * 1000.0
+        result["total"] = self.total() * 1000.0
+        return {name: round(ms, 3) for name, ms in result.items()}
+
+    def chrome_trace(self):
+        import threading
+
+        pid = os.getpid()
+        tid = threading.get_ident()
+        events = [
+            {
+                "name": name,
+                "cat": "recognize",
+                "ph": "X",
+                "ts": round(start * 1e6, 1),
+                "dur": round(duration * 1e6, 1),
+                "pid": pid,
+                "tid": tid,
+                "args": {"depth": depth},
+            }
+            for name, start, duration, depth in sorted(self.spans, key=lambda s: (s[1], s[3]))
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def span(name):
+    """현재 요청의 Tracer에 name 구간을 기록합니다. Tracer가 없으면 아무것도 하지 않습니다."""
+    return _Span(_current.get(), name)
+
+
+class activate:
+    """with 블록 동안 tracer를 현재 요청의 Tracer로 둡니다."""
+
+    __slots__ = ("tracer", "_token")
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    def __enter__(self):
+        self._token = _current.set(self.tracer)
+        return self.tracer
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        return False
+
+
+def current():
+    return _current.get()
+
+
+class RequestProfiler:
+    """
+    CHESS_FEN_PROFILE 모드에 따라 요청 하나를 프로파일링하고 파일로 남깁니다.
+    모드가 꺼져 있으면 아무 일도 하지 않습니다.
+    """
+
+    _counter = 0
+
+    def __init__(self, tracer, mode=PROFILE_MODE):
+        self.tracer = tracer
+        self.mode = mode if mode in ("cprofile", "trace") else ""
+        self.path = None
+        self._profile = None
+
+    def __enter__(self):
+        if self.mode == "cprofile":
+            import cProfile
+
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.mode:
+            return False
+        if self._profile is not None:
+            self._profile.disable()
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            RequestProfiler._counter += 1
+            stem = os.path.join(
+                PROFILE_DIR, f"recognize-{os.getpid()}-{int(time.time() * 1000)}-{RequestProfiler._counter}"
+            )
+            if self._profile is not None:
+                self.path = stem + ".pstats"
+                self._profile.dump_stats(self.path)
+            else:
+                import json
+
+                self.path = stem + ".trace.json"
+                with open(self.path, "w", encoding="utf-8") as f:
+                    json.dump(self.tracer.chrome_trace(), f)
+        except OSError:
+            self.path = None
+        return False
@@ -5,8 +5,54 @@ import os
 import struct
 import sys
 
-# Input: JSON via stdin with keys: boardArea, imageBase64
+from fen_trace import RequestProfiler, Tracer, activate, current as current_tracer, span
+
+# Input: JSON via stdin with keys: boardArea, imageBase64, debug (none | info | path | image),
+#        boardAreaHint (이전 응답의 boardArea, 이미지 좌표), multiBoard (true면 이미지의 모든 보드를 인식),
+#        deadlineMs (요청 시간 예산; 감지는 예산 안에 끝난 결과만 쓰고, 넘기면 board_to_fen을 부르지 않음)
 # Output: JSON with key "fen" and detected board position
+#         multiBoard 요청은 "boards": [{"boardArea", "fen"}] (읽는 순서)를 함께 돌려줍니다.
+#         "cascade": {"path", "mlCalled", "boardConfidence", "uncertainSquares", "squareSources"} - 칸별로
+#         로컬 분류기('l')와 board_to_fen('m') 중 어느 쪽 결과인지 (rank 8부터 8개 문자열)
+#
+# Worker mode (`recognize-fen.py --worker`):
+#   무거운 모듈을 한 번만 로드한 뒤 stdin에서 줄 단위(NDJSON) 요청을 계속 처리합니다.
+#   Request:  {"id": 1, "type": "recognize", "payload": {...}} | {"id": 2, "type": "ping"} | {"id": 4, "type": "stats"}
+#             | {"id": 3, "type": "analyse", "payload": {"fen": "...", "depth": 15, "movetime": 500}}
+#   Response: {"id": 1, "result": {...}} | {"id": 1, "error": "..."} | {"id": 2, "pong": true}
+#   CHESS_WORKER_THREADS가 2 이상이면 recognize 요청을 동시에 처리하고(응답 순서는 id로 맞춤),
+#   내장 분류기 추론을 요청 간 마이크로 배치로 묶습니다. stats는 배치별 크기/대기/실행 시간을 돌려줍니다.
+#   analyse는 로컬 UCI 엔진 풀(CHESS_ENGINE_PATH / PATH의 stockfish)을, 없으면 stockfish.online을 씁니다.
+#
+# Binary frame (one-shot stdin, worker 요청 모두 가능):
+#   b"FEN1" | uint32 BE meta 길이 | uint32 BE 이미지 길이 | meta JSON | 원본 이미지 bytes
+#   meta는 위의 JSON 요청(one-shot에서는 payload)과 같고 imageBase64 대신 뒤따르는 이미지를 씁니다.
+#
+# Fork-server mode (`recognize-fen.py --fork-server [socket]`):
+#   모듈을 미리 import 한 프로세스가 unix socket 연결마다 fork 하여 one-shot 요청 하나를 처리합니다.
+#   클라이언트는 one-shot stdin과 같은 내용을 쓰고 write 방향을 닫은 뒤 JSON 응답 한 줄을 읽습니다.
+#
+# Batch mode (`recognize-fen.py batch <dir|zip> --out results.jsonl --workers N`):
+#   디렉터리/zip 안의 이미지를 프로세스 풀로 인식하여 JSONL로 기록합니다.
+#   킹 수 / 끝 줄의 폰 / 기물 수 검사에 걸린 결과에는 "problems"가 붙습니다 (fen_board.validate_boards).
+#
+# Validate mode (`recognize-fen.py validate <fens.txt|-> --out problems.jsonl`):
+#   한 줄에 FEN 하나인 파일을 묶음 단위로 한 번에 디코딩 / 검사하여 문제가 있는 줄만 기록합니다.
+#
+# Sequence mode (`recognize-fen.py sequence <video|dir|zip> --out moves.jsonl --pgn game.pgn`):
+#   동영상(cv2.VideoCapture) 또는 연속 프레임 이미지를 decode → warp → classify → emit 스레드 파이프라인으로
+#   처리합니다. 칸별 서명이 바뀐 칸만 다시 분류하고, 확정된 위치마다 둔 수를 추론하여
+#   NDJSON으로 바로 기록한 뒤 마지막에 PGN을 냅니다.
+#
+# Calibrate (`recognize-fen.py calibrate <image> --name NAME [--fen PLACEMENT] [--flipped]`):
+#   알려진 배치의 스크린샷 한 장에서 테마 프로파일을 학습하여 CHESS_THEME_DIR/NAME.json 에 저장합니다.
+#
+# Timings: 단계별 소요 시간(ms)이 debugInfo.timings 에 담깁니다 (worker 응답에는 항상 "timings").
+#   CHESS_FEN_PROFILE=cprofile | trace 이면 요청마다 pstats / Chrome trace JSON을
+#   CHESS_FEN_PROFILE_DIR(기본 /tmp/chess-fen-profile)에 남깁니다.
+
+FRAME_MAGIC = b"FEN1"
+FRAME_HEADER = struct.Struct(">4sII")
 
 DEFAULT_FEN = os.environ.get(
     "CHESS_FEN_STATIC",
@@ -15,32 +61,375 @@ DEFAULT_FEN = os.environ.get(
 BOARD_AREA = os.environ.get("CHESS_BOARD_AREA", "")
 DEBUG_OUTPUT = os.environ.get("CHESS_DEBUG_OUTPUT", "")
 
+# 디버그 출력 단계
+# - none:  fen/boardArea만 반환
+# - info:  debugInfo 포함
+# - path:  + 오버레이 이미지를 파일로 저장
+# - image: + 축소한 오버레이 PNG를 debugImageBase64로 반환 (기존 동작)
+DEBUG_LEVELS = ("none", "info", "path", "image")
+DEFAULT_DEBUG_LEVEL = os.environ.get("CHESS_DEBUG_LEVEL", "image").lower()
+
+# boardAreaHint 재사용 조건: 상대 대비 (1 - 어두운칸/밝은칸 평균) 와 절대 대비 하한
+HINT_MIN_RELATIVE_CONTRAST = float(os.environ.get("CHESS_HINT_MIN_RELATIVE_CONTRAST", "0.1"))
+HINT_MIN_CONTRAST = float(os.environ.get("CHESS_HINT_MIN_CONTRAST", "8"))
+
+# 인식 결과 캐시 (디코딩된 이미지 해시 → fen/boardArea/method). 크기 0이면 비활성화
+RESULT_CACHE_SIZE = int(os.environ.get("CHESS_FEN_CACHE_SIZE", "256"))
+RESULT_CACHE_TTL = float(os.environ.get("CHESS_FEN_CACHE_TTL", "600"))
+RESULT_CACHE_DB = os.environ.get("CHESS_FEN_CACHE_DB", "")
+
+# worker 모드에서 동시에 처리할 recognize 요청 수 (스레드, 응답 순서는 요청 순서와 다를 수 있음).
+# 2 이상이면 내장 분류기 추론을 요청 간 마이크로 배치(fen_batcher)로 묶습니다: 첫 입력부터 최대 WAIT_MS 동안
+# 또는 BATCH_ROWS 칸(보드당 64)까지 모아 한 번에 추론하고, 대기열은 QUEUE_SIZE 요청까지. BATCH_ROWS 0이면 끔
+WORKER_THREADS = max(1, int(os.environ.get("CHESS_WORKER_THREADS", "1")))
+INFERENCE_BATCH_ROWS = int(os.environ.get("CHESS_INFERENCE_BATCH_ROWS", "512"))
+INFERENCE_BATCH_WAIT_MS = float(os.environ.get("CHESS_INFERENCE_BATCH_WAIT_MS", "3"))
+INFERENCE_QUEUE_SIZE = max(1, int(os.environ.get("CHESS_INFERENCE_QUEUE_SIZE", "32")))
+
+# --fork-server 기본 socket 경로
+FORK_SERVER_SOCKET = os.environ.get("CHESS_FEN_FORK_SOCKET", "/tmp/chess-fen.sock")
+
 # ChessVision.ai API 사용 여부 (환경변수로 비활성화 가능)
 # board_to_fen 라이브러리 사용 여부 (환경변수로 비활성화 가능)
 USE_BOARD_TO_FEN = os.environ.get("USE_BOARD_TO_FEN", "true").lower() == "true"
+# 단계적 인식(cascade): 로컬 분류기가 칸마다 신뢰도(최고 클래스 확률)를 내고, board_to_fen은 필요할 때만 부릅니다
+#   squares: 신뢰도가 SQUARE_CONFIDENCE 미만인 칸이 있으면 ML을 부르고 그 칸만 ML 결과로 바꿈
+#   board:   보드 신뢰도(칸 신뢰도 평균)가 BOARD_CONFIDENCE 미만이면 보드 전체를 ML 결과로 바꿈
+#   always:  보드마다 ML을 부르고 ML 결과를 우선 (기본값, 이전 동작)
+# 분류기가 없어 신뢰도를 모르면(색상 규칙) 모든 모드에서 ML 결과를 우선합니다.
+# 칸 신뢰도는 보정하지 않은 softmax 최댓값이고 분류기는 board_synth 보드로만 학습했으므로, 다른 기물 스타일에서는
+# 틀린 칸도 신뢰도가 높게 나옵니다. 실제 스크린샷으로 임계값을 검증하기 전까지는 기본값을 always로 둡니다
+CASCADE_MODE = os.environ.get("CHESS_CASCADE_MODE", "always").lower()
+CASCADE_SQUARE_CONFIDENCE = float(os.environ.get("CHESS_CASCADE_SQUARE_CONFIDENCE", "0.6"))
+CASCADE_BOARD_CONFIDENCE = float(os.environ.get("CHESS_CASCADE_BOARD_CONFIDENCE", "0.9"))
+# 로컬 인식 전에 보드를 펴서 맞추는 정사각형 크기 (8의 배수, 칸 = size / 8 px)
+CANONICAL_BOARD_SIZE = max(160, int(os.environ.get("CHESS_CANONICAL_BOARD_SIZE", "512")) // 8 * 8)
+# 테마 보정 프로파일 디렉터리 (calibrate 서브커맨드로 생성). 배경색 거리(Lab)가 MAX_DISTANCE 이하인
+# 프로파일이 있으면 색상 규칙(classify_cells) 대신 프로파일 기준 분류를 씁니다
+THEME_DIR = os.environ.get(
+    "CHESS_THEME_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "themes"),
+)
+THEME_MAX_DISTANCE = float(os.environ.get("CHESS_THEME_MAX_DISTANCE", "12"))
+# 내장 기물 분류기 가중치 (train-piece-classifier.py). "none"이면 색상 규칙 + 위치 추정만 사용
+PIECE_MODEL_PATH = os.environ.get(
+    "CHESS_PIECE_MODEL",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "piece_classifier.npz"),
+)
+
+# 로컬 UCI 엔진 분석 (fen_engine). 명령이 없으면 PATH의 stockfish를 쓰고,
+# 그것도 없거나 "none"이면 stockfish.online API로 분석합니다
+ENGINE_COMMAND = os.environ.get("CHESS_ENGINE_PATH", "")
+ENGINE_POOL_SIZE = max(1, int(os.environ.get("CHESS_ENGINE_POOL", "1")))
+ENGINE_THREADS = max(1, int(os.environ.get("CHESS_ENGINE_THREADS", "1")))
+ENGINE_HASH_MB = max(1, int(os.environ.get("CHESS_ENGINE_HASH", "64")))
+ENGINE_TIMEOUT = float(os.environ.get("CHESS_ENGINE_TIMEOUT", "30"))
+# 분석 결과 캐시 (정규화 FEN → 가장 깊은 결과). TTL 0 = 만료 없음, DB 기본값은 결과 캐시와 같은 파일
+ANALYSIS_CACHE_SIZE = int(os.environ.get("CHESS_ANALYSIS_CACHE_SIZE", "1024"))
+ANALYSIS_CACHE_TTL = float(os.environ.get("CHESS_ANALYSIS_CACHE_TTL", "0"))
+ANALYSIS_CACHE_DB = os.environ.get("CHESS_ANALYSIS_CACHE_DB", RESULT_CACHE_DB)
+
+# 감지용 그레이스케일 피라미드: 후보는 짧은 변이 MIN_SIDE 이상인 가장 작은 레벨에서 찾고,
+# 긴 변이 MAX_SIDE 이하인 가장 큰 레벨까지 후보 주변만 다시 맞춥니다
+PYRAMID_MIN_SIDE = max(64, int(os.environ.get("CHESS_PYRAMID_MIN_SIDE", "256")))
+PYRAMID_MAX_SIDE = max(256, int(os.environ.get("CHESS_PYRAMID_MAX_SIDE", "2048")))
+# 이 신뢰도(0..1) 이상인 후보가 나오면 남은 감지 방식은 건너뜁니다
+DETECT_MIN_CONFIDENCE = float(os.environ.get("CHESS_DETECT_MIN_CONFIDENCE", "0.25"))
+# 감지 방식 경쟁: 최대 DETECT_PARALLEL개 방식을 스레드 풀에서 겹쳐 돌려 위 기준을 넘는 첫 결과를 씁니다
+# (1이면 한 스레드에서 순서대로). 순서는 방식별 비용/성공률 학습값(fen_scheduler)으로 정하고, 다음 방식은
+# 앞 방식이 실패했거나 학습된 비용 × DETECT_HEDGE 만큼 지나도 끝나지 않았을 때만 겹쳐 시작합니다
+DETECT_PARALLEL = max(1, int(os.environ.get("CHESS_DETECT_PARALLEL", "3")))
+DETECT_HEDGE = max(0.0, float(os.environ.get("CHESS_DETECT_HEDGE", "1.5")))
+# 아직 비용을 모르는 방식(새 프로세스의 첫 요청)은 이 시간(ms)이 지나도 끝나지 않을 때만 다음 방식을 겹쳐 시작합니다
+DETECT_COLD_HEDGE_MS = max(0.0, float(os.environ.get("CHESS_DETECT_COLD_HEDGE_MS", "20")))
+# 요청에 deadlineMs가 없을 때의 기본 시간 예산 (ms, 0 = 제한 없음). 감지는 예산 안에 끝난 결과만 쓰고,
+# 예산을 넘긴 요청은 board_to_fen을 부르지 않습니다
+REQUEST_DEADLINE_MS = float(os.environ.get("CHESS_DEADLINE_MS", "0"))
+# 여러 보드 감지(payload.multiBoard): 짧은 변이 SCAN_SIDE 이상인 가장 작은 피라미드 레벨에서 모든 칸 크기의
+# 체커보드 후보를 한 번씩 채점하고, 칸 픽셀당 대비가 MIN_CONTRAST 이상인 후보를 겹침 억제(NMS)로 최대 MAX개 고릅니다
+MULTI_BOARD_SCAN_SIDE = max(128, int(os.environ.get("CHESS_MULTI_BOARD_SCAN_SIDE", "480")))
+MULTI_BOARD_MAX = max(1, int(os.environ.get("CHESS_MULTI_BOARD_MAX", "16")))
+MULTI_BOARD_MIN_CONTRAST = float(os.environ.get("CHESS_MULTI_BOARD_MIN_CONTRAST", "12"))
+# 후보 칸 크기의 등비 간격 (사이 크기는 다듬는 단계에서 채웁니다)
+MULTI_BOARD_CELL_RATIO = 1.12
+# sequence 모드: 칸 서명은 칸당 SIGNATURE_CELL px 로 편 작은 보드이고, 서명의 칸별 평균 절대 차이가
+# DIFF_THRESHOLD(0..255)를 넘는 칸만 다시 분류합니다. REDETECT_SQUARES 칸 이상이 바뀌면 보드를 다시 찾고,
+# 새 위치는 STABLE_FRAMES 프레임 연속으로 같아야 확정합니다 (기물 이동 애니메이션 중간 프레임 무시)
+SEQUENCE_SIGNATURE_CELL = max(2, int(os.environ.get("CHESS_SEQUENCE_SIGNATURE_CELL", "8")))
+SEQUENCE_DIFF_THRESHOLD = float(os.environ.get("CHESS_SEQUENCE_DIFF_THRESHOLD", "6"))
+SEQUENCE_REDETECT_SQUARES = int(os.environ.get("CHESS_SEQUENCE_REDETECT_SQUARES", "24"))
+SEQUENCE_STABLE_FRAMES = max(1, int(os.environ.get("CHESS_SEQUENCE_STABLE_FRAMES", "2")))
+# 한 수로 설명되지 않는 위치(기물을 드는 중, 놓친 수, 다른 게임)는 이만큼 유지되어야 새 게임으로 확정합니다
+SEQUENCE_RESYNC_FRAMES = max(1, int(os.environ.get("CHESS_SEQUENCE_RESYNC_FRAMES", "30")))
+# sequence 파이프라인 단계 사이 큐 크기 (프레임 수). 메모리 상한 ≈ 3 × QUEUE_SIZE 프레임
+SEQUENCE_QUEUE_SIZE = max(1, int(os.environ.get("CHESS_SEQUENCE_QUEUE_SIZE", "8")))
+
+
+_cv2 = None
+_np = None
+
+
+def load_cv():
+    """
+    cv2, numpy를 처음 필요한 시점에 한 번만 import 합니다 (없으면 ImportError).
+    이미지가 없는 요청은 이 비용을 전혀 치르지 않습니다.
+    """
+    global _cv2, _np
+    if _cv2 is None:
+        with span("import_cv2"):
+            import numpy as np
+            import cv2
+        _np, _cv2 = np, cv2
+    return _cv2, _np
+
+
+class DecodedFrame:
+    """
+    요청 이미지 한 장. base64 decode와 cv2.imdecode를 각각 최대 한 번만 수행하고,
+    이후 단계(감지, 로컬 인식, board_to_fen, 디버그 오버레이)는 같은 BGR 배열을 공유합니다.
+    """
+
+    __slots__ = ("data", "_bgr", "_decoded")
+
+    def __init__(self, data):
+        self.data = data
+        self._bgr = None
+        self._decoded = False
+
+    @classmethod
+    def from_base64(cls, image_b64):
+        if not image_b64:
+            return None
+        try:
+            with span("base64_decode"):
+                data = base64.b64decode(image_b64)
+        except Exception:
+            return None
+        return cls(data) if data else None
+
+    @property
+    def bgr(self):
+        """디코딩된 BGR ndarray (실패 시 None). numpy/cv2가 없으면 ImportError."""
+        if not self._decoded:
+            cv2, np = load_cv()
+            try:
+                with span("decode"):
+                    self._bgr = cv2.imdecode(np.frombuffer(self.data, np.uint8), cv2.IMREAD_COLOR)
+            except cv2.error:
+                self._bgr = None
+            self._decoded = True
+        return self._bgr
+
+    @property
+    def rgb(self):
+        """BGR 배열의 채널 순서만 뒤집은 zero-copy view."""
+        bgr = self.bgr
+        return None if bgr is None else bgr[:, :, ::-1]
+
+    @property
+    def shape(self):
+        """디코딩된 크기. cv2 없이도 PNG 헤더에서 읽을 수 있으면 반환합니다."""
+        if self._decoded and self._bgr is not None:
+            return self._bgr.shape
+        try:
+            bgr = self.bgr
+            if bgr is not None:
+                return bgr.shape
+        except ImportError:
+            pass
+        try:
+            if self.data[:8] == b"\x89PNG\r\n\x1a\n":
+                width, height = struct.unpack(">II", self.data[16:24])
+                return (height, width, 3)
+        except Exception:
+            pass
+        return None
+
+    def decodable(self):
+        """cv2로 디코딩에 실패한 경우에만 False. cv2가 없으면 판단을 뒤로 미룹니다(True)."""
+        try:
+            return self.bgr is not None
+        except ImportError:
+            return True
+
+    def cache_key(self):
+        """디코딩된 픽셀의 콘텐츠 해시. 디코딩할 수 없으면 원본 bytes로 계산합니다."""
+        from fen_cache import content_hash
+
+        try:
+            bgr = self.bgr
+        except ImportError:
+            bgr = None
+        if bgr is not None:
+            return content_hash(str(bgr.shape).encode(), bgr.data)
+        return content_hash(self.data)
+
+    def to_pil(self):
+        """board_to_fen용 RGB PIL 이미지. cv2가 없을 때만 PIL로 직접 디코딩합니다."""
+        from PIL import Image
+
+        try:
+            rgb = self.rgb
+        except ImportError:
+            rgb = None
+        if rgb is not None:
+            return Image.fromarray(rgb, "RGB")
+
+        import io
+
+        img = Image.open(io.BytesIO(self.data))
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        return img
+
+
+_result_cache = None
+
+
+def get_result_cache():
+    """프로세스 단위 결과 캐시 (worker 모드에서는 요청 간에 유지됩니다)."""
+    global _result_cache
+    if _result_cache is None:
+        from fen_cache import ResultCache
+
+        _result_cache = ResultCache(
+            max_entries=RESULT_CACHE_SIZE,
+            ttl=RESULT_CACHE_TTL,
+            db_path=RESULT_CACHE_DB or None,
+            table="recognition",
+        )
+    return _result_cache
+
+
+_piece_classifier = None
+_piece_classifier_loaded = False
+
+
+_engine_pool = None
+_engine_pool_loaded = False
+
+# worker가 요청 스레드를 여러 개 쓸 때만 만들어지는 추론 마이크로 배치 스케줄러 (run_worker)
+_inference_batcher = None
 
+_detect_scheduler = None
 
-def recognize_with_board_to_fen(image_bytes):
+
+def get_detect_scheduler():
+    """감지 방식 스케줄러 (프로세스 단위라 worker에서는 요청 간에 비용/성공률을 계속 학습합니다)."""
+    global _detect_scheduler
+    if _detect_scheduler is None:
+        from fen_scheduler import DetectorScheduler
+
+        _detect_scheduler = DetectorScheduler(
+            [method for method, _, _ in DETECTION_METHODS],
+            parallel=DETECT_PARALLEL,
+            fallback=DETECT_FALLBACK_METHODS,
+            hedge=DETECT_HEDGE,
+            cold_hedge=DETECT_COLD_HEDGE_MS / 1000.0,
+            # worker 요청 스레드마다 한 번의 경쟁 + 무시된 채 아직 도는 방식들의 여유
+            max_workers=DETECT_PARALLEL * (WORKER_THREADS + 1),
+        )
+    return _detect_scheduler
+
+
+def request_deadline(payload):
+    """payload.deadlineMs (없으면 CHESS_DEADLINE_MS) → time.perf_counter 기준 마감 시각. 0 이하면 None."""
+    import time
+
+    try:
+        budget = float(payload.get("deadlineMs") or REQUEST_DEADLINE_MS)
+    except (TypeError, ValueError):
+        budget = REQUEST_DEADLINE_MS
+    return time.perf_counter() + budget / 1000.0 if budget > 0 else None
+
+
+def deadline_passed(deadline):
+    import time
+
+    return deadline is not None and time.perf_counter() >= deadline
+
+
+_analysis_cache = None
+
+
+def get_analysis_cache():
+    """엔진/API 분석 결과 캐시 (정규화 FEN 키, 로컬 엔진과 stockfish.online 공용)."""
+    global _analysis_cache
+    if _analysis_cache is None:
+        from fen_cache import AnalysisCache
+
+        _analysis_cache = AnalysisCache(
+            max_entries=ANALYSIS_CACHE_SIZE,
+            ttl=ANALYSIS_CACHE_TTL,
+            db_path=ANALYSIS_CACHE_DB or None,
+        )
+    return _analysis_cache
+
+
+_theme_store = None
+
+
+def get_theme_store():
+    """테마 프로파일 저장소 (디렉터리가 바뀌면 알아서 다시 읽습니다)."""
+    global _theme_store
+    if _theme_store is None:
+        from fen_themes import ProfileStore
+
+        _theme_store = ProfileStore(THEME_DIR, max_distance=THEME_MAX_DISTANCE)
+    return _theme_store
+
+
+def predict_squares(classifier, features):
+    """
+    칸 특징 (n, D) → 확률 (n, 13). worker가 마이크로 배치 스케줄러를 켰으면
+    동시에 처리 중인 다른 요청의 칸과 함께 한 번의 forward pass로 추론합니다.
+    """
+    batcher = _inference_batcher
+    if batcher is None:
+        return classifier.predict_proba(features)
+    with span("classify.batch"):
+        return batcher.submit(features)
+
+
+def get_piece_classifier():
+    """내장 기물 분류기 (가중치가 없거나 읽을 수 없으면 None). 프로세스당 한 번만 로드합니다."""
+    global _piece_classifier, _piece_classifier_loaded
+    if not _piece_classifier_loaded:
+        _piece_classifier_loaded = True
+        if PIECE_MODEL_PATH and PIECE_MODEL_PATH.lower() != "none" and os.path.exists(PIECE_MODEL_PATH):
+            try:
+                with span("piece_classifier.load"):
+                    from fen_classifier import PieceClassifier
+
+                    _piece_classifier = PieceClassifier.load(PIECE_MODEL_PATH)
+            except Exception as e:
+                print(f"[recognize-fen] piece classifier unavailable: {e}", file=sys.stderr)
+    return _piece_classifier
+
+
+def recognize_with_board_to_fen(frame, board_img=None):
     """
     board_to_fen 라이브러리를 사용하여 이미지에서 FEN을 추출합니다.
-    딥러닝 기반으로 정확도가 높습니다.
+    딥러닝 기반으로 정확도가 높습니다. board_img(펴진 보드 BGR)가 있으면 프레임 전체 대신 보드만 넘깁니다.
     
     Returns: (fen, error) - FEN 문자열 또는 None, 에러 메시지 또는 None
     """
     try:
-        from PIL import Image
-        from board_to_fen.predict import get_fen_from_image
-        import io
+        with span("board_to_fen.import"):
+            from board_to_fen.predict import get_fen_from_image
         
-        # bytes를 PIL Image로 변환
-        img = Image.open(io.BytesIO(image_bytes))
-        
-        # RGB로 변환 (RGBA인 경우)
-        if img.mode == 'RGBA':
-            img = img.convert('RGB')
+        # 이미 디코딩된 프레임을 PIL Image로 (재디코딩 없음)
+        with span("board_to_fen.to_pil"):
+            if board_img is not None:
+                from PIL import Image
+                
+                img = Image.fromarray(board_img[:, :, ::-1].copy())
+            else:
+                img = frame.to_pil()
         
         # FEN 추출
-        fen = get_fen_from_image(img)
+        with span("board_to_fen.predict"):
+            fen = get_fen_from_image(img)
         
         if fen:
             return fen, None
@@ -85,9 +474,100 @@ def call_stockfish_online(fen, depth=15):
         return None, None, str(e)
 
 
+def get_engine_pool():
+    """로컬 UCI 엔진 풀 (엔진 명령이 없으면 None). 엔진 프로세스는 첫 분석 때 띄웁니다."""
+    global _engine_pool, _engine_pool_loaded
+    if not _engine_pool_loaded:
+        _engine_pool_loaded = True
+        command = ENGINE_COMMAND
+        if not command:
+            import shutil
+
+            command = shutil.which("stockfish") or ""
+        if command and command.lower() != "none":
+            from fen_engine import EnginePool
+
+            _engine_pool = EnginePool(
+                command,
+                size=ENGINE_POOL_SIZE,
+                options={"Threads": ENGINE_THREADS, "Hash": ENGINE_HASH_MB},
+                timeout=ENGINE_TIMEOUT,
+            )
+    return _engine_pool
+
+
+def analyse_position(fen, depth=15, movetime=None):
+    """
+    로컬 엔진 풀이 있으면 엔진으로, 없으면 stockfish.online API로 분석합니다.
+    movetime(ms)은 로컬 엔진에서만 쓰입니다. 같은 위치를 같거나 더 깊게 분석한 결과가
+    분석 캐시에 있으면 엔진/API를 부르지 않습니다.
+    
+    Returns: (best_move, evaluation, error)
+    """
+    best_move, evaluation, error, _ = _analyse(fen, depth, movetime)
+    return best_move, evaluation, error
+
+
+def _analyse(fen, depth, movetime):
+    """analyse_position 본문. Returns: (best_move, evaluation, error, meta) - meta = {"source", "cached"}"""
+    pool = get_engine_pool()
+    meta = {"source": "engine" if pool is not None else "stockfish.online", "cached": False}
+    if pool is None:
+        depth, movetime = depth or 15, None
+    
+    cache = get_analysis_cache()
+    with span("analyse.cache"):
+        cached = cache.get(fen, depth=depth, movetime=movetime)
+    if cached is not None:
+        meta["cached"] = True
+        return cached["bestMove"], cached["evaluation"], None, meta
+    
+    if pool is not None:
+        with span("analyse.engine"):
+            result, error = pool.search(fen, depth=depth, movetime=movetime)
+        if result is None:
+            return None, None, error, meta
+        best_move, evaluation = result["bestMove"], result["evaluation"]
+        # 시간 초과로 stop된 탐색은 실제로 도달한 depth로 저장합니다
+        reached = result["depth"] if depth and result["depth"] else depth
+    else:
+        with span("analyse.online"):
+            best_move, evaluation, error = call_stockfish_online(fen, depth)
+        if error:
+            return None, None, error, meta
+        reached = depth
+    cache.put(fen, best_move, evaluation, depth=reached, movetime=None if depth else movetime)
+    return best_move, evaluation, None, meta
+
+
+def handle_analyse(payload):
+    """worker "analyse" 요청 / analyse 서브커맨드: {"fen", "depth", "movetime"} → 분석 결과 dict."""
+    fen = str(payload.get("fen") or "").strip()
+    if not fen:
+        return {"bestMove": None, "evaluation": None, "error": "fen is required"}
+    if len(fen.split()) == 1:
+        fen += " w - - 0 1"
+    depth = payload.get("depth")
+    movetime = payload.get("movetime")
+    if not movetime and not depth:
+        depth = 15
+    best_move, evaluation, error, meta = _analyse(
+        fen, int(depth) if depth else None, int(movetime) if movetime else None
+    )
+    return {
+        "fen": fen,
+        "bestMove": best_move,
+        "evaluation": evaluation,
+        "error": error,
+        **meta,
+        "cache": get_analysis_cache().stats(),
+    }
+
+
 def has_piece(cell_img, cv2, np):
     """
     체스판 한 칸에 기물이 있는지, 있다면 흰색/검은색인지 판단합니다.
+    (분류기 가중치가 없을 때 recognize_board는 같은 규칙의 배치 버전인 classify_cells를 사용합니다.)
     
     핵심 아이디어: 기물은 **중앙에 집중된 불규칙한 형태**를 가짐.
     빈 칸은 **균일한 색상** (밝은 베이지 또는 어두운 녹색).
@@ -177,6 +657,14 @@ def has_piece(cell_img, cv2, np):
     inner_std = np.std(gray_inner)
     center_std = np.std(gray_center)
     
+    # 기물 코어가 균일한 단색이면서 배경(모서리)과 밝기 차이가 분명하면 평면 스타일 기물
+    # (빈칸은 위의 is_empty에서 이미 걸러지고, 반투명 이동 표시 점은 어둡기 차이가 작음)
+    if inner_std < 12:
+        if center_s < 40 and center_v > bg_v + 8:
+            return 'w'
+        if center_v < bg_v - 45:
+            return 'b'
+    
     # 빈칸은 균일함 (std < 15)
     if inner_std < 12 and center_std < 15:
         return ''
@@ -192,275 +680,847 @@ def has_piece(cell_img, cv2, np):
     return ''
 
 
-def recognize_board(img, board_area, cv2, np):
+def classify_cells(board_img, cv2, np):
     """
-    체스판 이미지에서 기물 배치를 인식합니다 (로컬 폴백).
-    자동으로 보드 방향(백/흑 시점)을 감지합니다.
+    has_piece를 64칸 전체에 대해 한 번에 수행하는 배치 버전입니다.
+    
+    보드 크롭을 (8, 8, cell_h, cell_w, 3) 으로 나눈 뒤 각 칸을 reflect 패딩한
+    모자이크로 만들어 GaussianBlur/cvtColor를 한 번만 호출합니다.
+    (칸별 블러와 동일한 경계 처리를 유지하므로 has_piece와 결과가 같습니다.)
+    
+    Returns: 8x8 list - 'w' / 'b' / ''
+    """
+    h, w = board_img.shape[:2]
+    cell_h = h // 8
+    cell_w = w // 8
+    if cell_h < 20 or cell_w < 20:
+        return [[''] * 8 for _ in range(8)]
+    
+    # === 1. 칸 단위 view + reflect 패딩 모자이크 ===
+    pad = 7  # (15, 15) 커널 반경
+    crop = np.ascontiguousarray(board_img[:cell_h * 8, :cell_w * 8])
+    cells = crop.reshape(8, cell_h, 8, cell_w, 3).transpose(0, 2, 1, 3, 4)
+    padded = np.pad(cells, ((0, 0), (0, 0), (pad, pad), (pad, pad), (0, 0)), mode="reflect")
+    ph, pw = cell_h + 2 * pad, cell_w + 2 * pad
+    mosaic = np.ascontiguousarray(padded.transpose(0, 2, 1, 3, 4)).reshape(8 * ph, 8 * pw, 3)
+    
+    # === 2. 블러 + 색공간 변환 한 번 ===
+    blurred = cv2.GaussianBlur(mosaic, (15, 15), 0)
+    hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
+    gray = cv2.cvtColor(blurred, cv2.COLOR_BGR2GRAY)
+    hsv = hsv.reshape(8, ph, 8, pw, 3).transpose(0, 2, 1, 3, 4)[:, :, pad:pad + cell_h, pad:pad + cell_w]
+    gray = gray.reshape(8, ph, 8, pw).transpose(0, 2, 1, 3)[:, :, pad:pad + cell_h, pad:pad + cell_w]
+    
+    # === 3. 영역별 통계 (has_piece와 같은 margin 규칙) ===
+    size = min(cell_h, cell_w)
+    margin = int(size * 0.2)
+    inner_margin = int(size * 0.35)
+    corner_size = max(8, int(size * 0.15))
+    
+    hsv_inner = hsv[:, :, inner_margin:cell_h - inner_margin, inner_margin:cell_w - inner_margin]
+    gray_inner = gray[:, :, inner_margin:cell_h - inner_margin, inner_margin:cell_w - inner_margin]
+    gray_center = gray[:, :, margin:cell_h - margin, margin:cell_w - margin]
+    corners = [
+        hsv[:, :, :corner_size, :corner_size],
+        hsv[:, :, :corner_size, cell_w - corner_size:],
+        hsv[:, :, cell_h - corner_size:, :corner_size],
+        hsv[:, :, cell_h - corner_size:, cell_w - corner_size:],
+    ]
+    bg = np.stack([c.mean(axis=(2, 3)) for c in corners]).mean(axis=0)  # (8, 8, 3)
+    center = hsv_inner.mean(axis=(2, 3))
+    bg_h, bg_s, bg_v = bg[..., 0], bg[..., 1], bg[..., 2]
+    center_h, center_s, center_v = center[..., 0], center[..., 1], center[..., 2]
+    
+    def std(region):
+        region = region.astype(np.float64)
+        mean = region.mean(axis=(2, 3), keepdims=True)
+        return np.sqrt(((region - mean) ** 2).mean(axis=(2, 3)))
+    
+    inner_std = std(gray_inner)
+    center_std = std(gray_center)
+    inner_mean = gray_inner.mean(axis=(2, 3))
+    
+    # === 4. has_piece의 판단 순서를 그대로 np.select로 ===
+    is_empty = (
+        (np.abs(center_h - bg_h) < 15)
+        & (np.abs(center_s - bg_s) < 30)
+        & (np.abs(center_v - bg_v) < 40)
+    )
+    is_white_piece = (center_s < 25) & (center_v > 220) & (center_v > bg_v + 30)
+    is_black_piece = (center_v < 70) & (center_v < bg_v - 30)
+    is_gray_piece = (center_s < 40) & (center_v < 120) & (center_v < bg_v - 20)
+    is_flat_core = inner_std < 12
+    is_flat_white = is_flat_core & (center_s < 40) & (center_v > bg_v + 8)
+    is_flat_black = is_flat_core & (center_v < bg_v - 45)
+    is_uniform = is_flat_core & (center_std < 15)
+    
+    labels = np.select(
+        [
+            is_empty,
+            is_white_piece,
+            is_black_piece | is_gray_piece,
+            is_flat_white,
+            is_flat_black,
+            is_uniform,
+            (inner_std > 20) & (inner_mean > 200),
+            (inner_std > 15) & (inner_mean < 100),
+        ],
+        ['', 'w', 'b', 'w', 'b', '', 'w', 'b'],
+        default='',
+    )
+    return labels.tolist()
+
+
+def order_corners(points, np):
+    """임의 순서의 네 점을 (좌상, 우상, 우하, 좌하) 순서의 float32 (4, 2) 배열로 정렬합니다."""
+    pts = np.asarray(points, dtype=np.float32).reshape(4, 2)
+    sums = pts.sum(axis=1)
+    diffs = pts[:, 1] - pts[:, 0]
+    return np.array(
+        [pts[np.argmin(sums)], pts[np.argmin(diffs)], pts[np.argmax(sums)], pts[np.argmax(diffs)]],
+        dtype=np.float32,
+    )
+
+
+def corners_to_json(corners):
+    return [{"x": round(float(x), 1), "y": round(float(y), 1)} for x, y in corners]
+
+
+def board_corners(board_area, np):
+    """
+    boardArea의 네 모서리 (좌상, 우상, 우하, 좌하). corners가 있으면 그대로,
+    없으면 topLeft/bottomRight 사각형의 모서리를 씁니다.
     """
+    corners = board_area.get("corners") if isinstance(board_area, dict) else None
+    if isinstance(corners, list) and len(corners) == 4:
+        try:
+            return order_corners([(float(c["x"]), float(c["y"])) for c in corners], np)
+        except (KeyError, TypeError, ValueError):
+            pass
     tl = board_area["topLeft"]
     br = board_area["bottomRight"]
+    x1, y1, x2, y2 = tl["x"], tl["y"], br["x"], br["y"]
+    return np.array([(x1, y1), (x2, y1), (x2, y2), (x1, y2)], dtype=np.float32)
+
+
+def extract_board(img, board_area, cv2, np, size=None):
+    """
+    보드 영역을 warpPerspective 한 번으로 size×size 정사각형(칸 = size/8 px)에 펴서 맞춥니다.
+    입력 해상도나 원근 왜곡과 관계없이 이후 칸 단위 처리는 같은 크기의 배열에서 이뤄집니다.
+    """
+    size = size or CANONICAL_BOARD_SIZE
+    src = board_corners(board_area, np)
+    # 보드를 둘러싼 영역만 잘라 변환 (전체 프레임을 resize/warp 하지 않도록)
+    h, w = img.shape[:2]
+    x0, y0 = np.clip(np.floor(src.min(axis=0)).astype(int), 0, (w - 1, h - 1))
+    x1, y1 = np.clip(np.ceil(src.max(axis=0)).astype(int) + 1, 1, (w, h))
+    region = img[y0:y1, x0:x1]
+    src = src - np.array([x0, y0], dtype=np.float32)
+    # 크게 축소할 때는 warpPerspective(INTER_LINEAR)의 aliasing을 피하려고 pyrDown으로 먼저 절반씩 줄입니다
+    # (임의 배율 INTER_AREA보다 훨씬 빨라 4K/5K 보드도 1080p와 비슷한 비용)
+    side = min(np.linalg.norm(src[1] - src[0]), np.linalg.norm(src[3] - src[0]))
+    while side > size * 2:
+        region = cv2.pyrDown(region)
+        src = src * 0.5
+        side *= 0.5
+    dst = np.array([(0, 0), (size, 0), (size, size), (0, size)], dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(src, dst)
+    return cv2.warpPerspective(region, matrix, (size, size), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def recognize_board(img, board_area, cv2, np, board_img=None):
+    """
+    체스판 이미지에서 기물 배치를 인식합니다 (로컬 1차 인식).
+    자동으로 보드 방향(백/흑 시점)을 감지합니다.
     
-    board_img = img[tl["y"]:br["y"], tl["x"]:br["x"]]
-    h, w = board_img.shape[:2]
+    내장 분류기가 있으면 64칸을 한 배치로 13클래스 분류하고,
+    없으면 색상 규칙(classify_cells) + 위치 기반 기물 추정을 씁니다.
+    board_img가 있으면 다시 펴지 않고 그대로 씁니다.
     
-    cell_w = w // 8
-    cell_h = h // 8
+    Returns: (placement, is_flipped, source, confidence, forced_kings)
+      source는 "classifier" / "theme:NAME" / "color_rules",
+      confidence는 FEN 방향(rank 8부터) (8, 8) 칸별 최고 클래스 확률 (분류기가 없으면 None),
+      forced_kings는 분류기가 킹을 못 찾아 같은 색 기물을 킹으로 바꾼 칸 이름 목록
+    """
+    if board_img is None:
+        with span("recognize.warp"):
+            board_img = extract_board(img, board_area, cv2, np)
     
-    # === 1단계: 기물 색상만 먼저 감지 ===
-    color_board = []
-    for rank in range(8):
-        row = []
-        for file in range(8):
-            x1 = file * cell_w
-            y1 = rank * cell_h
-            x2 = x1 + cell_w
-            y2 = y1 + cell_h
+    classifier = get_piece_classifier()
+    if classifier is not None:
+        with span("recognize.classify"):
+            from fen_classifier import CLASSES, square_features
             
-            cell_img = board_img[y1:y2, x1:x2]
-            piece_color = has_piece(cell_img, cv2, np)
-            row.append(piece_color)
-        color_board.append(row)
-    
-    # === 2단계: 보드 방향 감지 ===
-    # 흰 기물이 아래쪽(rank 6-7)에 많으면 백 시점
-    # 흰 기물이 위쪽(rank 0-1)에 많으면 흑 시점 (뒤집힘)
+            probs = predict_squares(classifier, square_features(board_img)).reshape(8, 8, len(CLASSES))
+        with span("recognize.assemble"):
+            placement, is_flipped, forced = placement_from_pieces(probs)
+            oriented = probs[::-1, ::-1] if is_flipped else probs
+            confidence = oriented.max(axis=-1)
+            if forced.any():
+                # 킹으로 바꾼 칸은 원래 기물의 확률이 아니라 킹 클래스 확률을 신뢰도로 씁니다 (보통 낮아서 ML이 다시 봄)
+                from fen_board import decode_placements
+
+                codes = decode_placements([placement])[0][0].reshape(8, 8, 1).astype(np.intp)
+                confidence[forced] = np.take_along_axis(oriented, codes, axis=-1)[..., 0][forced]
+        from fen_board import square_names
+
+        return placement, is_flipped, "classifier", confidence, square_names(forced)
+    
+    # === 1단계: 기물 색상만 먼저 감지 (64칸 배치) ===
+    with span("recognize.classify"):
+        color_board, profile_name = classify_colors(board_img, cv2, np)
+    with span("recognize.assemble"):
+        placement, is_flipped = placement_from_colors(color_board, np)
+    return placement, is_flipped, f"theme:{profile_name}" if profile_name else "color_rules", None, []
+
+
+def cascade_plan(confidence, np):
+    """
+    로컬 칸 신뢰도로 board_to_fen 호출 여부와 ML 결과로 바꿀 칸을 정합니다 (CASCADE_MODE).
+    
+    Returns: (board_confidence, ml_mask) - ml_mask는 (8, 8) bool, ML이 필요 없으면 None
+    """
+    if confidence is None:
+        return None, np.ones((8, 8), bool)
+    board_confidence = float(confidence.mean())
+    if CASCADE_MODE == "always":
+        return board_confidence, np.ones((8, 8), bool)
+    if CASCADE_MODE == "board":
+        if board_confidence < CASCADE_BOARD_CONFIDENCE:
+            return board_confidence, np.ones((8, 8), bool)
+        return board_confidence, None
+    uncertain = confidence < CASCADE_SQUARE_CONFIDENCE
+    return board_confidence, uncertain if uncertain.any() else None
+
+
+def merge_ml_squares(local_placement, ml_placement, ml_mask, np):
+    """
+    ML 배치에서 ml_mask 칸만 로컬 배치에 덮어씁니다.
+    board_to_fen은 뒤집힌 보드를 화면 방향 그대로 읽을 수 있으므로, ML 보드와 180도 돌린 보드 중
+    로컬 결과를 그대로 쓰는 칸과 더 많이 일치하는 쪽을 씁니다.
+    
+    Returns: (placement, sources) - sources는 rank 8부터 8개 문자열 ('l' 로컬 / 'm' ML). 어느 배치든 8x8이 아니면 None
+    """
+    from fen_board import decode_placements, encode_placements
+
+    (local, ml), valid = decode_placements([local_placement, ml_placement])
+    if not valid.all():
+        return None
+    mask = ml_mask.reshape(64)
+    keep = ~mask
+    if keep.any() and (ml[::-1][keep] == local[keep]).sum() > (ml[keep] == local[keep]).sum():
+        ml = ml[::-1]
+    merged = np.where(mask, ml, local)
+    sources = ["".join("m" if m else "l" for m in row) for row in ml_mask]
+    return encode_placements(merged)[0], sources
+
+
+def recognize_boards(img, board_areas, cv2, np):
+    """
+    여러 보드를 각각 편 뒤 내장 분류기 한 번(64 × 보드 수 칸)으로 분류합니다.
+    분류기가 없으면 보드마다 색상 경로(classify_colors)를 씁니다.
+    
+    Returns: [(placement, is_flipped, source, forced_kings)] - board_areas 순서
+    """
+    with span("recognize.warp"):
+        boards = [extract_board(img, area, cv2, np) for area in board_areas]
+    
+    classifier = get_piece_classifier()
+    if classifier is not None:
+        from fen_board import assemble_boards, encode_placements, square_names
+        from fen_classifier import CLASSES, boards_features
+        
+        with span("recognize.classify"):
+            probs = predict_squares(classifier, boards_features(boards)).reshape(len(boards), 64, len(CLASSES))
+        with span("recognize.assemble"):
+            packed, flipped, forced = assemble_boards(probs)
+            placements = encode_placements(packed)
+        return [
+            (placement, bool(is_flipped), "classifier", square_names(mask))
+            for placement, is_flipped, mask in zip(placements, flipped, forced)
+        ]
+    
+    results = []
+    for board_img in boards:
+        with span("recognize.classify"):
+            color_board, profile_name = classify_colors(board_img, cv2, np)
+        placement, is_flipped = placement_from_colors(color_board, np)
+        results.append((placement, is_flipped, f"theme:{profile_name}" if profile_name else "color_rules", []))
+    return results
+
+
+def classify_colors(board_img, cv2, np):
+    """
+    64칸의 기물 색('w'/'b'/'')을 판정합니다. 배경색이 가까운 테마 프로파일이 있으면
+    프로파일 클래스 중심과의 거리로, 없으면 Green 테마 기준 규칙(classify_cells)으로 판정합니다.
+    
+    Returns: (color_board, profile_name) - 프로파일을 쓰지 않았으면 profile_name은 None
+    """
+    store = get_theme_store()
+    if store.profiles():
+        from fen_themes import square_stats
+
+        stats = square_stats(board_img)
+        profile, _ = store.select(stats)
+        if profile is not None:
+            return profile.classify(board_img, stats), profile.name
+    return classify_cells(board_img, cv2, np), None
+
+
+def board_is_flipped(color_board):
+    """
+    흰 기물이 아래쪽(rank 6-7)에 많으면 백 시점,
+    흰 기물이 위쪽(rank 0-1)에 많으면 흑 시점 (뒤집힘)
+    """
     white_bottom = sum(1 for r in range(6, 8) for c in range(8) if color_board[r][c] == 'w')
     white_top = sum(1 for r in range(0, 2) for c in range(8) if color_board[r][c] == 'w')
     black_bottom = sum(1 for r in range(6, 8) for c in range(8) if color_board[r][c] == 'b')
     black_top = sum(1 for r in range(0, 2) for c in range(8) if color_board[r][c] == 'b')
+    return (white_top + black_bottom) > (white_bottom + black_top)
+
+
+def placement_from_pieces(probs):
+    """
+    분류기 확률 (8, 8, 13) (화면 기준)에서 보드 방향을 판단하고 FEN 배치 문자열을 만듭니다.
+    킹이 없으면 같은 색 기물 중 킹 확률이 가장 높은 칸을 킹으로 바꿉니다 (fen_board.assemble_boards).
+    그 색 기물이 하나도 없으면 킹 없이 둡니다 (빈칸에 킹을 만들지 않음).
+    
+    Returns: (placement, is_flipped, forced) - forced는 킹으로 바꾼 칸 (8, 8) bool (FEN 방향)
+    """
+    from fen_board import assemble_boards, encode_placements
+
+    packed, flipped, forced = assemble_boards(probs)
+    return encode_placements(packed)[0], bool(flipped[0]), forced[0].reshape(8, 8)
+
+
+def placement_from_colors(color_board, np):
+    """
+    8x8 색상 격자('w'/'b'/'')에서 보드 방향을 판단하고 기물을 추론하여
+    FEN 배치 문자열을 만듭니다.
     
-    # 흑 시점이면 보드 뒤집기
-    is_flipped = (white_top + black_bottom) > (white_bottom + black_top)
+    Returns: (placement, is_flipped)
+    """
+    from fen_board import (
+        BLACK_KING, BLACK_PAWN, BLACK_QUEEN, BLACK_ROOK, EMPTY,
+        WHITE_KING, WHITE_PAWN, WHITE_QUEEN, WHITE_ROOK, encode_placements,
+    )
+
+    colors = np.array(color_board, dtype="<U1").reshape(8, 8)
+    white, black = colors == "w", colors == "b"
     
+    # === 2단계: 보드 방향 감지 (board_is_flipped와 같은 기준) ===
+    is_flipped = bool(white[:2].sum() + black[6:].sum() > white[6:].sum() + black[:2].sum())
     if is_flipped:
         # 보드를 180도 회전 (상하좌우 반전)
-        color_board = [row[::-1] for row in color_board[::-1]]
+        white, black = white[::-1, ::-1], black[::-1, ::-1]
     
     # === 3단계: 기물 종류 추론 ===
-    # 게임 중간이므로 위치 기반 추론 대신 단순화
-    board = []
-    for rank in range(8):
-        row = []
-        for file in range(8):
-            color = color_board[rank][file]
-            
-            if color == '':
-                row.append('')
-            elif color == 'w':
-                # 흰 기물: rank 0-1에 있으면 승격 기물 가능
-                if rank == 0:
-                    row.append('Q')  # 8열 도달 = 승격 (퀸 가정)
-                elif rank == 1:
-                    row.append('P')  # 7열 = 폰
-                elif rank == 7:
-                    # 1열: 킹이나 룩일 가능성
-                    if file == 4:
-                        row.append('K')
-                    elif file == 0 or file == 7:
-                        row.append('R')
-                    else:
-                        row.append('P')
-                else:
-                    row.append('P')  # 기본적으로 폰
-            else:  # 'b'
-                if rank == 7:
-                    row.append('q')  # 1열 도달 = 승격 (퀸 가정)
-                elif rank == 6:
-                    row.append('p')  # 2열 = 폰
-                elif rank == 0:
-                    # 8열: 킹이나 룩일 가능성
-                    if file == 4:
-                        row.append('k')
-                    elif file == 0 or file == 7:
-                        row.append('r')
-                    else:
-                        row.append('p')
-                else:
-                    row.append('p')  # 기본적으로 폰
-        board.append(row)
+    # 게임 중간이므로 위치 기반 추론 대신 단순화: 상대 끝 줄 = 승격(퀸), 자기 끝 줄의 e파일 = 킹,
+    # 모서리 = 룩, 나머지는 폰
+    rank, file = np.indices((8, 8))
+    corner = (file == 0) | (file == 7)
+    white_guess = np.select(
+        [rank == 0, rank == 1, (rank == 7) & (file == 4), (rank == 7) & corner],
+        [WHITE_QUEEN, WHITE_PAWN, WHITE_KING, WHITE_ROOK],
+        WHITE_PAWN,
+    )
+    black_guess = np.select(
+        [rank == 7, rank == 6, (rank == 0) & (file == 4), (rank == 0) & corner],
+        [BLACK_QUEEN, BLACK_PAWN, BLACK_KING, BLACK_ROOK],
+        BLACK_PAWN,
+    )
+    board = np.where(white, white_guess, np.where(black, black_guess, EMPTY)).astype(np.uint8)
     
     # === 4단계: 킹 보장 ===
-    has_white_king = any('K' in row for row in board)
-    has_black_king = any('k' in row for row in board)
-    
-    # 킹이 없으면 가장 적합한 위치에 추가
-    if not has_white_king:
-        # 흰 기물 중 하나를 킹으로 변경
-        for rank in range(7, -1, -1):
-            for file in range(8):
-                if board[rank][file] in ['P', 'Q', 'R']:
-                    board[rank][file] = 'K'
-                    has_white_king = True
-                    break
-            if has_white_king:
-                break
-        if not has_white_king:
-            board[7][4] = 'K'
-    
-    if not has_black_king:
-        for rank in range(8):
-            for file in range(8):
-                if board[rank][file] in ['p', 'q', 'r']:
-                    board[rank][file] = 'k'
-                    has_black_king = True
-                    break
-            if has_black_king:
-                break
-        if not has_black_king:
-            board[0][4] = 'k'
+    # 킹이 없으면 자기 끝 줄부터 찾은 첫 폰/퀸/룩을 킹으로, 그것도 없으면 e1 / e8에 둡니다
+    for king, pieces, ranks, home in (
+        (WHITE_KING, (WHITE_PAWN, WHITE_QUEEN, WHITE_ROOK), slice(None, None, -1), (7, 4)),
+        (BLACK_KING, (BLACK_PAWN, BLACK_QUEEN, BLACK_ROOK), slice(None), (0, 4)),
+    ):
+        if (board == king).any():
+            continue
+        candidates = np.isin(board[ranks], pieces).ravel()
+        if candidates.any():
+            r, f = divmod(int(candidates.argmax()), 8)
+            board[ranks][r, f] = king
+        else:
+            board[home] = king
     
     # === 5단계: FEN 생성 ===
-    fen_rows = []
-    for row in board:
-        fen_row = ""
-        empty_count = 0
-        for piece in row:
-            if piece == '':
-                empty_count += 1
-            else:
-                if empty_count > 0:
-                    fen_row += str(empty_count)
-                    empty_count = 0
-                fen_row += piece
-        if empty_count > 0:
-            fen_row += str(empty_count)
-        fen_rows.append(fen_row)
-    
-    return "/".join(fen_rows), is_flipped
+    return encode_placements(board)[0], is_flipped
 
 
-def detect_board_area(img, cv2, np):
+def checkerboard_scores(integral, ys, xs, cell, np):
     """
-    이미지에서 체스판 영역을 감지합니다.
+    후보 좌상단 (ys × xs) 전체에 대해 8x8 체커보드 점수를 한 번에 계산합니다.
+    각 칸의 합은 integral 테이블에서 네 모서리를 gather 하여 구합니다.
+
+    Returns: (scores, variances) - shape (len(ys), len(xs))
     """
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    edges = cv2.Canny(blurred, 50, 150)
+    offsets = np.arange(8) * cell
+    rows = ys[:, None] + offsets  # (ny, 8)
+    cols = xs[:, None] + offsets  # (nx, 8)
+    r1 = rows[:, :, None, None]
+    r2 = r1 + cell
+    c1 = cols[None, None, :, :]
+    c2 = c1 + cell
+    # (ny, 8, nx, 8): 후보별 64칸의 픽셀 합 (int32 overflow 방지를 위해 gather 후 int64로 계산)
+    cell_sums = (
+        integral[r2, c2].astype(np.int64)
+        - integral[r1, c2]
+        - integral[r2, c1]
+        + integral[r1, c1]
+    )
+
+    parity = (np.arange(8)[:, None] + np.arange(8)[None, :]) % 2 == 0
+    white_sum = np.einsum("aibj,ij->ab", cell_sums, parity.astype(np.int64))
+    black_sum = cell_sums.sum(axis=(1, 3)) - white_sum
+
+    white_avg = white_sum / 32.0
+    black_avg = black_sum / 32.0
+    contrast = np.abs(white_avg - black_avg)
+    variances = np.minimum(white_avg, black_avg) / np.maximum(np.maximum(white_avg, black_avg), 1)
+    scores = contrast * (1.0 + variances)
+    return scores, variances
+
+
+def checkerboard_score_grid(integral, cell, step, np):
+    """
+    좌상단이 (0, 0)부터 step 간격인 모든 후보의 8x8 체커보드 점수를 계산합니다.
+    checkerboard_scores와 같은 값이지만 후보별 gather 대신 c×c 창 합 지도를 한 번 만들고
+    가로 8칸 → 세로 8칸 순서로 strided slice를 더하므로 후보 수가 많아도 빠릅니다.
+
+    Returns: (scores, variances, ys, xs) - scores/variances는 shape (len(ys), len(xs))
+    """
+    ih, iw = integral.shape[0] - 1, integral.shape[1] - 1
+    size = cell * 8
+    ys = np.arange(0, ih - size, step)
+    xs = np.arange(0, iw - size, step)
+    if ys.size == 0 or xs.size == 0:
+        return None, None, ys, xs
+    # 부분합은 전체 합을 넘지 않으므로 integral(int32)이 넘치지 않았다면 int32로 충분합니다
+    # windows[y, x]: (y, x)에서 시작하는 cell×cell 창의 픽셀 합
+    windows = integral[cell:, cell:] - integral[:-cell, cell:] - integral[cell:, :-cell] + integral[:-cell, :-cell]
+    nx, ny = xs.size, ys.size
+    span_x = (nx - 1) * step + 1
+    span_y = (ny - 1) * step + 1
+    rows = [windows[:, j * cell:j * cell + span_x:step] for j in range(8)]
+    row_even = rows[0] + rows[2] + rows[4] + rows[6]
+    row_odd = rows[1] + rows[3] + rows[5] + rows[7]
+    white_sum = np.zeros((ny, nx), integral.dtype)
+    total = np.zeros((ny, nx), integral.dtype)
+    for i in range(8):
+        start = i * cell
+        even = row_even[start:start + span_y:step]
+        odd = row_odd[start:start + span_y:step]
+        white_sum += even if i % 2 == 0 else odd
+        total += even + odd
+    black_sum = total - white_sum
+
+    white_avg = white_sum / 32.0
+    black_avg = black_sum / 32.0
+    contrast = np.abs(white_avg - black_avg)
+    variances = np.minimum(white_avg, black_avg) / np.maximum(np.maximum(white_avg, black_avg), 1)
+    scores = contrast * (1.0 + variances)
+    return scores, variances, ys, xs
+
+
+def parse_board_area(value):
+    """{"topLeft", "bottomRight"} 형태를 (x1, y1, x2, y2) int 튜플로. 잘못된 값은 None."""
+    try:
+        tl = value["topLeft"]
+        br = value["bottomRight"]
+        x1, y1 = int(tl["x"]), int(tl["y"])
+        x2, y2 = int(br["x"]), int(br["y"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+
+def validate_board_hint(gray, hint, cv2, np):
+    """
+    이전 요청의 boardArea가 여전히 체스판인지 체커보드 대비 점수 한 번으로 확인합니다.
     
-    detected_area = None
-    method = None
-    details = {}
+    감지 방식마다 바깥 패딩이 조금씩 다르므로 힌트 안쪽의 8x8 보드 크기/오프셋 몇 개만
+    평가하고, 한 칸씩 밀린 창이 더 높은 점수를 내면(보드가 이동함) 실패로 봅니다.
     
-    # Try chessboard corner detection
-    found, corners = cv2.findChessboardCorners(
-        gray, (7, 7),
-        cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FAST_CHECK,
-    )
-    if found and corners is not None:
-        corners2 = cv2.cornerSubPix(
-            gray, corners, (11, 11), (-1, -1),
-            (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 0.001),
-        )
-        pts = corners2.reshape(-1, 2)
-        min_x, min_y = pts.min(axis=0)
-        max_x, max_y = pts.max(axis=0)
-        grid = corners2.reshape(7, 7, 2)
-        dx = np.median(np.diff(grid[0, :, 0]))
-        dy = np.median(np.diff(grid[:, 0, 1]))
-        square_size = (dx + dy) / 2.0
-        pad = int(square_size * 1.05)
-        detected_area = {
-            "topLeft": {"x": int(max(min_x - pad, 0)), "y": int(max(min_y - pad, 0))},
-            "bottomRight": {
-                "x": int(min(max_x + pad, img.shape[1] - 1)),
-                "y": int(min(max_y + pad, img.shape[0] - 1)),
-            },
-        }
-        method = "chessboard_corners"
-        details = {"pad": int(pad), "square_size": float(square_size)}
-        return detected_area, method, details
+    Returns: (ok, details)
+    """
+    box = parse_board_area(hint)
+    if box is None:
+        return False, {"reason": "invalid_hint"}
+    x1, y1, x2, y2 = box
+    img_h, img_w = gray.shape[:2]
+    if x1 < 0 or y1 < 0 or x2 >= img_w or y2 >= img_h:
+        return False, {"reason": "out_of_bounds"}
+    w, h = x2 - x1, y2 - y1
+    if min(w, h) < 64 or not 0.8 <= w / float(h) <= 1.25:
+        return False, {"reason": "bad_shape"}
     
-    # Try checkerboard score search
-    try:
-        h, w = gray.shape[:2]
-        target_w = 1280 if w > 1280 else w
-        scale = target_w / float(w) if w > target_w else 1.0
-        small = cv2.resize(gray, (int(w * scale), int(h * scale)))
-        sh, sw = small.shape[:2]
-        integral_small = cv2.integral(small)
-        min_dim = min(sw, sh)
-        min_size = int(min_dim * 0.35)
-        max_size = int(min_dim * 0.9)
-        best_score = 0
-        best_box = None
-        best_variance = 0
-        
-        for s in [0.35, 0.4, 0.45, 0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85]:
-            size = int(min_dim * s)
-            cell = max(8, size // 8)
-            size = cell * 8
-            if size < min_size or size > max_size:
-                continue
-            step = max(8, cell // 3)
-            for y in range(0, sh - size, step):
-                y2 = y + size
-                for x in range(0, sw - size, step):
-                    x2 = x + size
-                    white_sum = 0.0
-                    black_sum = 0.0
-                    white_count = 0
-                    black_count = 0
-                    for i in range(8):
-                        yy1 = y + i * cell
-                        yy2 = yy1 + cell
-                        for j in range(8):
-                            xx1 = x + j * cell
-                            xx2 = xx1 + cell
-                            cell_sum = (
-                                integral_small[yy2, xx2]
-                                - integral_small[yy1, xx2]
-                                - integral_small[yy2, xx1]
-                                + integral_small[yy1, xx1]
-                            )
-                            if (i + j) % 2 == 0:
-                                white_sum += cell_sum
-                                white_count += 1
-                            else:
-                                black_sum += cell_sum
-                                black_count += 1
-                    
-                    white_avg = white_sum / white_count if white_count > 0 else 0
-                    black_avg = black_sum / black_count if black_count > 0 else 0
-                    contrast = abs(white_avg - black_avg)
-                    variance = min(white_avg, black_avg) / max(white_avg, black_avg, 1)
-                    score = contrast * (1.0 + variance)
-                    
-                    if score > best_score:
-                        best_score = score
-                        best_box = (x, y, size, cell)
-                        best_variance = variance
-        
-        if best_box:
-            x, y, size, cell = best_box
-            inv = 1.0 / scale
-            pad = int(cell * 0.1 * inv)
-            x_full = int(x * inv)
-            y_full = int(y * inv)
-            size_full = int(size * inv)
-            detected_area = {
-                "topLeft": {"x": max(0, x_full - pad), "y": max(0, y_full - pad)},
-                "bottomRight": {
-                    "x": min(w - 1, x_full + size_full + pad),
-                    "y": min(h - 1, y_full + size_full + pad),
-                },
-            }
-            method = "checkerboard_score"
-            details = {"score": float(best_score), "variance": float(best_variance), "scale": float(scale)}
-            return detected_area, method, details
-    except Exception as e:
-        details["checkerboard_error"] = str(e)
+    side = min(w, h)
+    margin = side // 8 + 1
+    cx1, cy1 = max(0, x1 - margin), max(0, y1 - margin)
+    cx2, cy2 = min(img_w, x2 + margin), min(img_h, y2 + margin)
+    integral = cv2.integral(gray[cy1:cy2, cx1:cx2])
+    ox, oy = x1 - cx1, y1 - cy1
     
-    # Contour detection fallback
-    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     best = None
-    best_score = 0
-    min_side = int(min(img.shape[0], img.shape[1]) * 0.35)
-    max_side = int(min(img.shape[0], img.shape[1]) * 0.95)
-    h_img, w_img = img.shape[:2]
-    center_x, center_y = w_img / 2, h_img / 2
+    for cell in sorted({int(side / d) for d in (8.0, 8.1, 8.2, 8.3)}):
+        size = cell * 8
+        step = max(1, cell // 8)
+        ys = oy + np.arange(0, h - size + 1, step)
+        xs = ox + np.arange(0, w - size + 1, step)
+        if ys.size == 0 or xs.size == 0:
+            continue
+        scores, variances = checkerboard_scores(integral, ys, xs, cell, np)
+        iy, ix = divmod(int(np.argmax(scores)), xs.size)
+        if best is None or scores[iy, ix] > best[0]:
+            best = (float(scores[iy, ix]), float(variances[iy, ix]), int(xs[ix]), int(ys[iy]), cell)
+    if best is None:
+        return False, {"reason": "too_small"}
     
-    for cnt in contours:
-        peri = cv2.arcLength(cnt, True)
+    score, variance, bx, by, cell = best
+    # checkerboard_scores는 칸 픽셀 합 기준이므로 칸 면적으로 나눠 밝기 차이로 환산
+    contrast = score / (1.0 + variance) / float(cell * cell)
+    details = {"score": score, "contrast": contrast, "relativeContrast": 1.0 - variance}
+    if contrast < HINT_MIN_CONTRAST or 1.0 - variance < HINT_MIN_RELATIVE_CONTRAST:
+        details["reason"] = "low_contrast"
+        return False, details
+    
+    # 주변 위치(±1/4, ±1/2, ±1칸)보다 점수가 높아야 힌트가 보드에 정렬된 것으로 봅니다.
+    # 보드가 한 칸만큼 움직여도 체커 패턴은 유지되므로 ±1칸도 함께 확인합니다.
+    size = cell * 8
+    crop_h, crop_w = integral.shape[0] - 1, integral.shape[1] - 1
+    offsets = np.array([-cell, -cell // 2, -cell // 4, 0, cell // 4, cell // 2, cell])
+    ys = by + offsets
+    xs = bx + offsets
+    ys = ys[(ys >= 0) & (ys + size <= crop_h)]
+    xs = xs[(xs >= 0) & (xs + size <= crop_w)]
+    scores, _ = checkerboard_scores(integral, ys, xs, cell, np)
+    iy, ix = divmod(int(np.argmax(scores)), xs.size)
+    if scores[iy, ix] > score:
+        shift = max(abs(int(ys[iy]) - by), abs(int(xs[ix]) - bx))
+        details["reason"] = "board_moved" if shift == cell else "misaligned"
+        return False, details
+    return True, details
+
+
+class GrayPyramid:
+    """
+    감지 방식들이 공유하는 그레이스케일 피라미드. levels[i]는 원본의 1/2^i 크기입니다.
+    
+    - coarse: 짧은 변이 PYRAMID_MIN_SIDE 이상인 가장 작은 레벨 (후보 탐색)
+    - fine:   긴 변이 PYRAMID_MAX_SIDE 이하인 가장 큰 레벨 (후보 주변 보정의 마지막 단계)
+    4K/5K 입력도 두 레벨의 크기는 1080p와 비슷하므로 감지 비용이 해상도에 거의 비례하지 않습니다.
+    """
+
+    __slots__ = ("levels", "coarse", "fine")
+
+    def __init__(self, gray, cv2, min_side=None, max_side=None):
+        min_side = min_side or PYRAMID_MIN_SIDE
+        max_side = max_side or PYRAMID_MAX_SIDE
+        levels = [gray]
+        while min(levels[-1].shape[:2]) // 2 >= min_side:
+            levels.append(cv2.pyrDown(levels[-1]))
+        fine = 0
+        while fine < len(levels) - 1 and max(levels[fine].shape[:2]) > max_side:
+            fine += 1
+        self.levels = levels
+        self.coarse = len(levels) - 1
+        self.fine = fine
+
+    @property
+    def shape(self):
+        return self.levels[0].shape[:2]
+
+    @staticmethod
+    def scale(level):
+        """level 좌표 → 원본 좌표 배율."""
+        return float(1 << level)
+
+    def refine_levels(self):
+        """coarse 바로 위부터 fine까지, 보정에 쓰는 레벨 번호 (작아지는 순)."""
+        return range(self.coarse - 1, self.fine - 1, -1)
+
+    def describe(self):
+        return {
+            "levels": len(self.levels),
+            "coarse": self.coarse,
+            "fine": self.fine,
+            "coarseShape": list(self.levels[self.coarse].shape[:2]),
+        }
+
+
+def detect_by_chessboard_corners(pyramid, cv2, np):
+    """
+    coarse 레벨에서 cv2.findChessboardCorners로 7x7 내부 코너를 찾고,
+    fine 레벨까지 한 단계씩 좌표를 두 배로 올리며 cornerSubPix로 다시 맞춥니다.
+    
+    Returns: (detected_area, details) - 실패 시 detected_area는 None
+    """
+    gray = pyramid.levels[pyramid.coarse]
+    found, corners = cv2.findChessboardCorners(
+        gray, (7, 7),
+        cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FAST_CHECK,
+    )
+    if not found or corners is None:
+        return None, {}
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+    level = pyramid.coarse
+    while True:
+        grid = corners.reshape(7, 7, 2)
+        square = (np.median(np.diff(grid[0, :, 0])) + np.median(np.diff(grid[:, 0, 1]))) / 2.0
+        # 탐색 창은 칸의 1/4 정도로 (이웃 코너를 넘지 않도록)
+        win = int(np.clip(abs(square) * 0.25, 2, 11))
+        corners = cv2.cornerSubPix(pyramid.levels[level], corners, (win, win), (-1, -1), criteria)
+        if level == pyramid.fine:
+            break
+        level -= 1
+        corners = corners * 2.0
+    pts = corners.reshape(-1, 2) * pyramid.scale(pyramid.fine)
+    height, width = pyramid.shape
+    min_x, min_y = pts.min(axis=0)
+    max_x, max_y = pts.max(axis=0)
+    grid = pts.reshape(7, 7, 2)
+    # findChessboardCorners는 격자를 반대 방향(우하단부터)으로 돌려줄 수도 있으므로 절댓값으로
+    dx = abs(np.median(np.diff(grid[0, :, 0])))
+    dy = abs(np.median(np.diff(grid[:, 0, 1])))
+    square_size = (dx + dy) / 2.0
+    pad = int(square_size * 1.05)
+    # 내부 코너 격자(1..7칸)에서 보드 좌표 → 이미지 좌표 homography를 구해 바깥 모서리(0, 8칸)를 외삽
+    ideal = np.array([(j + 1, i + 1) for i in range(7) for j in range(7)], dtype=np.float32)
+    homography, _ = cv2.findHomography(ideal, pts.astype(np.float32))
+    detected_area = {
+        "topLeft": {"x": int(max(min_x - pad, 0)), "y": int(max(min_y - pad, 0))},
+        "bottomRight": {
+            "x": int(min(max_x + pad, width - 1)),
+            "y": int(min(max_y + pad, height - 1)),
+        },
+    }
+    if homography is not None:
+        outer = np.array([[(0, 0), (8, 0), (8, 8), (0, 8)]], dtype=np.float32)
+        detected_area["corners"] = corners_to_json(order_corners(cv2.perspectiveTransform(outer, homography), np))
+    # 7x7 코너 격자가 검증된 경우이므로 신뢰도는 최고값
+    return detected_area, {"pad": int(pad), "square_size": float(square_size), "confidence": 1.0}
+
+
+def refine_checkerboard(gray, x, y, cell, cv2, np, radius=2, spread=0):
+    """
+    (x, y) 좌상단, cell 크기 후보 주변(±radius px, cell-1..cell+2+spread)만 다시 채점합니다.
+    integral은 후보를 둘러싼 영역에서만 계산하고, 칸 크기가 다른 후보끼리는 픽셀당 점수로 비교합니다.
+    
+    Returns: (x, y, cell, score, variance) 또는 None
+    """
+    h, w = gray.shape[:2]
+    cells = [c for c in range(cell - 1, cell + 3 + spread) if c >= 4]
+    reach = cells[-1] * 8 + radius + 1
+    x0, y0 = max(0, x - radius), max(0, y - radius)
+    x1, y1 = min(w, x + reach), min(h, y + reach)
+    integral = cv2.integral(gray[y0:y1, x0:x1])
+    best = None
+    for c in cells:
+        size = c * 8
+        ys = np.arange(y - radius, y + radius + 1) - y0
+        xs = np.arange(x - radius, x + radius + 1) - x0
+        ys = ys[(ys >= 0) & (ys + size <= y1 - y0)]
+        xs = xs[(xs >= 0) & (xs + size <= x1 - x0)]
+        if ys.size == 0 or xs.size == 0:
+            continue
+        scores, variances = checkerboard_scores(integral, ys, xs, c, np)
+        iy, ix = divmod(int(np.argmax(scores)), xs.size)
+        per_pixel = float(scores[iy, ix]) / float(c * c)
+        if best is None or per_pixel > best[0]:
+            best = (per_pixel, int(xs[ix]) + x0, int(ys[iy]) + y0, c, float(scores[iy, ix]), float(variances[iy, ix]))
+    return None if best is None else best[1:]
+
+
+def settle_cell_shift(integral, x, y, cell, np):
+    """
+    체커보드 점수는 한 칸 밀린 창에서도 거의 같게 나옵니다(패턴이 창 밖 한 줄까지 이어지므로).
+    창 바깥 한 줄씩을 포함한 10x10칸 평균 밝기에서 열/행별 교차 강도를 구해,
+    교차가 가장 강한 연속 8열/8행으로 창을 옮깁니다. 이미지 밖의 줄은 교차 0으로 봅니다.
+    
+    Returns: (x, y)
+    """
+    ih, iw = integral.shape[0] - 1, integral.shape[1] - 1
+    for _ in range(2):
+        offsets = np.arange(-1, 9) * cell
+        rows = y + offsets
+        cols = x + offsets
+        valid = ((rows >= 0) & (rows + cell <= ih))[:, None] & ((cols >= 0) & (cols + cell <= iw))[None, :]
+        r1 = np.clip(rows, 0, ih - cell)[:, None]
+        c1 = np.clip(cols, 0, iw - cell)[None, :]
+        r2, c2 = r1 + cell, c1 + cell
+        sums = integral[r2, c2].astype(np.int64) - integral[r1, c2] - integral[r2, c1] + integral[r1, c1]
+        means = np.where(valid, sums / float(cell * cell), np.nan)
+        # 열 j의 세로 교차(창의 8행 안), 행 i의 가로 교차(창의 8열 안)
+        col_strength = np.nan_to_num(np.abs(np.diff(means[1:9, :], axis=0)).mean(axis=0))
+        row_strength = np.nan_to_num(np.abs(np.diff(means[:, 1:9], axis=1)).mean(axis=1))
+        shifts = []
+        for strength in (col_strength, row_strength):
+            # 동점이면 이동하지 않도록 0을 먼저 평가
+            totals = [strength[1:9].sum(), strength[0:8].sum(), strength[2:10].sum()]
+            shifts.append((0, -1, 1)[int(np.argmax(totals))])
+        dx, dy = shifts
+        if dx == 0 and dy == 0:
+            break
+        x, y = x + dx * cell, y + dy * cell
+    return x, y
+
+
+def detect_by_checkerboard_score(pyramid, cv2, np):
+    """
+    coarse 레벨에서 8x8 밝기 교차 패턴 점수가 가장 높은 정사각형을 찾고,
+    그 자리에서 1px 단위로 맞춘 뒤 fine 레벨까지 후보 주변만 다시 채점합니다.
+    
+    Returns: (detected_area, details) - 실패 시 detected_area는 None
+    """
+    small = pyramid.levels[pyramid.coarse]
+    sh, sw = small.shape[:2]
+    integral_small = cv2.integral(small)
+    min_dim = min(sw, sh)
+    min_size = int(min_dim * 0.35)
+    max_size = int(min_dim * 0.9)
+    best_score = 0
+    best_box = None
+    
+    for s in [0.35, 0.4, 0.45, 0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85]:
+        size = int(min_dim * s)
+        cell = max(8, size // 8)
+        size = cell * 8
+        if size < min_size or size > max_size:
+            continue
+        step = max(1, cell // 4)
+        scores, _, ys, xs = checkerboard_score_grid(integral_small, cell, step, np)
+        if scores is None:
+            continue
+        # argmax는 행 우선(y, x) 순서의 첫 최댓값
+        idx = int(np.argmax(scores))
+        iy, ix = divmod(idx, xs.size)
+        if scores[iy, ix] > best_score:
+            best_score = float(scores[iy, ix])
+            best_box = (int(xs[ix]), int(ys[iy]), cell, step)
+    
+    if not best_box:
+        return None, {}
+    
+    x, y, cell, step = best_box
+    return checkerboard_candidate_area(pyramid, pyramid.coarse, x, y, cell, step, cv2, np)
+
+
+def checkerboard_candidate_area(pyramid, level, x, y, cell, step, cv2, np, spread=0):
+    """
+    level 레벨의 체커보드 후보 (x, y, cell)를 다듬어 원본 좌표 boardArea로 만듭니다.
+    level 안에서 step 격자 사이를 1px 단위로(칸 크기는 cell-1..cell+2+spread) 맞추고 한 칸 밀림을 바로잡은 뒤,
+    fine 레벨까지 레벨마다 두 배 좌표 주변 ±2px만 다시 채점합니다.
+    
+    Returns: (detected_area, details) - 실패 시 detected_area는 None
+    """
+    gray = pyramid.levels[level]
+    refined = refine_checkerboard(gray, x, y, cell, cv2, np, radius=step, spread=spread)
+    if refined is None:
+        return None, {}
+    x, y, cell, best_score, best_variance = refined
+    sx, sy = settle_cell_shift(cv2.integral(gray), x, y, cell, np)
+    cell_shift = (sx - x) // cell, (sy - y) // cell
+    if cell_shift != (0, 0):
+        refined = refine_checkerboard(gray, sx, sy, cell, cv2, np)
+        if refined is not None:
+            x, y, cell, best_score, best_variance = refined
+    for finer in range(level - 1, pyramid.fine - 1, -1):
+        refined = refine_checkerboard(pyramid.levels[finer], x * 2, y * 2, cell * 2, cv2, np)
+        if refined is None:
+            break
+        x, y, cell, best_score, best_variance = refined
+    
+    fine_gray = pyramid.levels[pyramid.fine]
+    size = cell * 8
+    inv = pyramid.scale(pyramid.fine)
+    h, w = pyramid.shape
+    pad = int(cell * 0.1 * inv)
+    x_full = int(x * inv)
+    y_full = int(y * inv)
+    size_full = int(size * inv)
+    detected_area = {
+        "topLeft": {"x": max(0, x_full - pad), "y": max(0, y_full - pad)},
+        "bottomRight": {
+            "x": min(w - 1, x_full + size_full + pad),
+            "y": min(h - 1, y_full + size_full + pad),
+        },
+    }
+    corners = refine_board_corners(fine_gray, (x, y, x + size, y + size), cv2, np)
+    if corners is None:
+        corners = [
+            (x * inv, y * inv), ((x + size) * inv, y * inv),
+            ((x + size) * inv, (y + size) * inv), (x * inv, (y + size) * inv),
+        ]
+    else:
+        corners = corners * inv
+    detected_area["corners"] = corners_to_json(corners)
+    return detected_area, {
+        "score": float(best_score),
+        "variance": float(best_variance),
+        "scale": 1.0 / pyramid.scale(level),
+        "cornersFromContour": not isinstance(corners, list),
+        "cellShift": list(cell_shift),
+        "confidence": round(1.0 - float(best_variance), 4),
+    }
+
+
+def refine_board_corners(gray, box, cv2, np):
+    """
+    축 정렬 박스(x1, y1, x2, y2) 주변에서 보드 외곽의 사각형 윤곽을 찾아 실제 네 모서리를 구합니다.
+    사진처럼 원근이 있는 보드에서 checkerboard_score 박스를 보정하는 용도이며,
+    박스와 크기가 비슷한 볼록 사각형이 없으면 None을 반환합니다.
+    """
+    x1, y1, x2, y2 = box
+    side = max(x2 - x1, y2 - y1)
+    margin = int(side * 0.1)
+    h, w = gray.shape[:2]
+    rx1, ry1 = max(0, x1 - margin), max(0, y1 - margin)
+    rx2, ry2 = min(w, x2 + margin), min(h, y2 + margin)
+    region = gray[ry1:ry2, rx1:rx2]
+    if region.size == 0:
+        return None
+    edges = cv2.Canny(cv2.GaussianBlur(region, (5, 5), 0), 50, 150)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    box_area = float((x2 - x1) * (y2 - y1))
+    best = None
+    best_area = 0.0
+    for cnt in contours:
+        approx = cv2.approxPolyDP(cnt, 0.02 * cv2.arcLength(cnt, True), True)
+        if len(approx) != 4 or not cv2.isContourConvex(approx):
+            continue
+        area = cv2.contourArea(approx)
+        if area < box_area * 0.6 or area > box_area * 1.3 or area <= best_area:
+            continue
+        best, best_area = approx, area
+    if best is None:
+        return None
+    return order_corners(best.reshape(4, 2) + np.array([rx1, ry1]), np)
+
+
+def detect_by_contours(pyramid, cv2, np):
+    """
+    coarse 레벨의 Canny 에지 외곽선 중 화면 중앙에 가까운 큰 정사각형을 보드로 보고,
+    fine 레벨에서 그 주변의 외곽선으로 네 모서리를 다시 맞춥니다.
+    신뢰도는 후보 안쪽의 체커보드 대비로 매깁니다.
+    
+    Returns: (detected_area, details) - 실패 시 detected_area는 None
+    """
+    gray = pyramid.levels[pyramid.coarse]
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    edges = cv2.Canny(blurred, 50, 150)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    best = None
+    best_score = 0
+    h_img, w_img = gray.shape[:2]
+    min_side = int(min(h_img, w_img) * 0.35)
+    max_side = int(min(h_img, w_img) * 0.95)
+    center_x, center_y = w_img / 2, h_img / 2
+    
+    for cnt in contours:
+        peri = cv2.arcLength(cnt, True)
         approx = cv2.approxPolyDP(cnt, 0.02 * peri, True)
         if len(approx) != 4:
             continue
@@ -483,30 +1543,351 @@ def detect_board_area(img, cv2, np):
         
         if score > best_score:
             best_score = score
-            best = (x, y, w, h, area)
-
-    if best:
-        x, y, w, h, area = best
-        pad = int(min(w, h) * 0.02)
-        detected_area = {
-            "topLeft": {"x": max(0, int(x - pad)), "y": max(0, int(y - pad))},
-            "bottomRight": {"x": min(w_img - 1, int(x + w + pad)), "y": min(h_img - 1, int(y + h + pad))},
-        }
-        method = "contour_square"
-        details = {"area": int(area)}
-        return detected_area, method, details
+            best = (x, y, w, h, area, approx)
+
+    if not best:
+        return None, {}
+    x, y, w, h, area, approx = best
+    checker = refine_checkerboard(gray, x, y, max(4, min(w, h) // 8), cv2, np, radius=2)
+    confidence = 1.0 - checker[4] if checker else 0.0
     
-    return None, None, {}
+    to_fine = pyramid.scale(pyramid.coarse - pyramid.fine)
+    fx, fy, fw, fh = (int(v * to_fine) for v in (x, y, w, h))
+    corners = refine_board_corners(pyramid.levels[pyramid.fine], (fx, fy, fx + fw, fy + fh), cv2, np)
+    if corners is None:
+        corners = order_corners(approx, np) * to_fine
+    corners = corners * pyramid.scale(pyramid.fine)
+    height, width = pyramid.shape
+    x1, y1 = corners.min(axis=0)
+    x2, y2 = corners.max(axis=0)
+    pad = int(min(x2 - x1, y2 - y1) * 0.02)
+    detected_area = {
+        "topLeft": {"x": max(0, int(x1 - pad)), "y": max(0, int(y1 - pad))},
+        "bottomRight": {"x": min(width - 1, int(x2 + pad)), "y": min(height - 1, int(y2 + pad))},
+        "corners": corners_to_json(corners),
+    }
+    scale = pyramid.scale(pyramid.coarse)
+    return detected_area, {"area": int(area * scale * scale), "confidence": round(float(confidence), 4)}
 
 
-def main():
-    raw = sys.stdin.read()
-    try:
-        payload = json.loads(raw or "{}")
-    except Exception:
+# detect_board_area가 순서대로 시도하는 감지 방식 (이름, 함수, 에러 키)
+# 각 함수는 (GrayPyramid, cv2, np)를 받아 원본 좌표의 boardArea와 details["confidence"]를 돌려줍니다
+DETECTION_METHODS = (
+    ("chessboard_corners", detect_by_chessboard_corners, "chessboard_error"),
+    ("checkerboard_score", detect_by_checkerboard_score, "checkerboard_error"),
+    ("contour_square", detect_by_contours, "contour_error"),
+)
+# 싸지만 위치가 덜 정확한 방식: 학습된 비용과 상관없이 마지막에 시도하고, 다른 방식이 모두 실패했거나
+# deadline이 지났을 때만 씁니다
+DETECT_FALLBACK_METHODS = ("contour_square",)
+
+
+def detect_board_area(img, cv2, np, hint=None, deadline=None):
+    """
+    이미지에서 체스판 영역을 감지합니다.
+    hint(이전 boardArea)가 주어지고 검증을 통과하면 전체 탐색을 건너뛰고 그대로 반환합니다.
+    
+    감지 방식들은 같은 GrayPyramid를 공유하며 DetectorScheduler가 학습된 순서로 (동시에) 실행합니다.
+    DETECT_MIN_CONFIDENCE 이상인 후보가 나오면 남은 방식은 기다리지 않습니다 (DETECT_FALLBACK_METHODS 제외).
+    그런 후보가 없거나 deadline이 지나면 그때까지 끝난 후보 중 신뢰도가 가장 높은 것을 씁니다.
+    fallback 방식은 다른 방식이 모두 실패한 뒤에 돌지만, deadline이 있으면 마감 전에 끝나도록 미리 시작하므로
+    느린 방식 때문에 마감을 넘겨도 fallback 후보(lowConfidence일 수 있음)는 남습니다.
+    """
+    with span("detect.gray"):
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    details = {}
+    
+    if hint:
+        try:
+            with span("detect.board_hint"):
+                ok, hint_details = validate_board_hint(gray, hint, cv2, np)
+        except Exception as e:
+            ok, hint_details = False, {"reason": "error", "error": str(e)}
+        details["boardHint"] = {"provided": True, "reused": ok, **hint_details}
+        if ok:
+            x1, y1, x2, y2 = parse_board_area(hint)
+            detected_area = {"topLeft": {"x": x1, "y": y1}, "bottomRight": {"x": x2, "y": y2}}
+            if isinstance(hint, dict) and hint.get("corners"):
+                try:
+                    detected_area["corners"] = corners_to_json(board_corners(hint, np))
+                except (KeyError, TypeError, ValueError):
+                    pass
+            return detected_area, "board_hint", details
+    
+    with span("detect.pyramid"):
+        pyramid = GrayPyramid(gray, cv2)
+    details["pyramid"] = pyramid.describe()
+    
+    scheduler = get_detect_scheduler()
+    tasks = {method: (lambda detect=detect: detect(pyramid, cv2, np)) for method, detect, _ in DETECTION_METHODS}
+    
+    def accept(result):
+        return result[0] is not None and result[1].get("confidence", 0.0) >= DETECT_MIN_CONFIDENCE
+    
+    if scheduler.parallel == 1 and deadline is None:
+        winner, finished, timed_out, order = scheduler.run(tasks, accept)
+    else:
+        with span("detect.race"):
+            winner, finished, timed_out, order = scheduler.run(tasks, accept, deadline)
+    details["detectOrder"] = order
+    if timed_out:
+        details["deadlineExceeded"] = True
+    
+    tracer = current_tracer()
+    error_keys = {method: error_key for method, _, error_key in DETECTION_METHODS}
+    candidates = []
+    for method, (result, seconds, error) in finished.items():
+        if tracer is not None:
+            tracer.add(f"detect.{method}", seconds)
+        if error is not None:
+            details[error_keys[method]] = str(error)
+            continue
+        detected_area, method_details = result
+        if detected_area is not None:
+            candidates.append((method_details.get("confidence", 0.0), detected_area, method, method_details))
+    
+    if winner is not None:
+        best = next(c for c in candidates if c[2] == winner)
+    else:
+        best = max(candidates, key=lambda c: c[0], default=None)
+    if best is None:
+        return None, None, details
+    confidence, detected_area, method, method_details = best
+    details.update(method_details)
+    details["lowConfidence"] = confidence < DETECT_MIN_CONFIDENCE
+    return detected_area, method, details
+
+
+def scan_board_candidates(gray, cv2, np, min_cell=6):
+    """
+    한 레벨의 integral 하나로 min_cell px 부터 짧은 변/8 까지 (약 12%씩 커지는) 모든 칸 크기의
+    체커보드 점수를 계산하고, 격자 이웃 중 최대이면서 칸 픽셀당 대비가 MULTI_BOARD_MIN_CONTRAST 이상인 점을 모읍니다.
+    
+    Returns: (scores, boxes, cells, steps) - 점수는 칸 픽셀당 대비, boxes는 (N, 4) x1, y1, x2, y2
+    """
+    h, w = gray.shape[:2]
+    integral = cv2.integral(gray)
+    kernel = np.ones((3, 3), np.uint8)
+    scores, boxes, cells, steps = [], [], [], []
+    cell = min_cell
+    while cell * 8 < min(h, w):
+        step = max(1, cell // 4)
+        grid, _, ys, xs = checkerboard_score_grid(integral, cell, step, np)
+        if grid is not None:
+            per_pixel = (grid / float(cell * cell)).astype(np.float32)
+            peaks = (per_pixel >= cv2.dilate(per_pixel, kernel)) & (per_pixel >= MULTI_BOARD_MIN_CONTRAST)
+            iy, ix = np.nonzero(peaks)
+            if iy.size:
+                scores.append(per_pixel[iy, ix])
+                x1, y1 = xs[ix], ys[iy]
+                boxes.append(np.stack([x1, y1, x1 + cell * 8, y1 + cell * 8], axis=1))
+                cells.append(np.full(iy.size, cell))
+                steps.append(np.full(iy.size, step))
+        cell = max(cell + 1, int(cell * MULTI_BOARD_CELL_RATIO))
+    if not scores:
+        empty = np.zeros(0)
+        return empty, np.zeros((0, 4)), empty, empty
+    return np.concatenate(scores), np.concatenate(boxes), np.concatenate(cells), np.concatenate(steps)
+
+
+def suppress_overlaps(scores, boxes, np, limit, max_overlap=0.1):
+    """
+    점수 내림차순 non-maximum suppression. 이미 고른 박스와 (교집합 / 작은 쪽 넓이)가 max_overlap을 넘으면 버립니다
+    (한 칸 밀린 창이나 보드 안쪽의 작은 창도 같은 보드로 봅니다).
+    
+    Returns: 고른 인덱스 list (점수 순)
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    for index in np.argsort(-np.asarray(scores), kind="stable"):
+        if keep:
+            kept = boxes[keep]
+            iw = np.minimum(kept[:, 2], boxes[index, 2]) - np.maximum(kept[:, 0], boxes[index, 0])
+            ih = np.minimum(kept[:, 3], boxes[index, 3]) - np.maximum(kept[:, 1], boxes[index, 1])
+            inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+            if (inter / np.minimum(areas[keep], areas[index])).max() > max_overlap:
+                continue
+        keep.append(int(index))
+        if len(keep) >= limit:
+            break
+    return keep
+
+
+def reading_order(boxes):
+    """
+    박스들을 읽는 순서(위 → 아래 줄, 줄 안에서 왼쪽 → 오른쪽)로 정렬한 인덱스.
+    세로 중심이 현재 줄 첫 박스 높이의 절반 안이면 같은 줄로 봅니다.
+    """
+    order = sorted(range(len(boxes)), key=lambda i: (boxes[i][1] + boxes[i][3]) / 2)
+    rows = []
+    for i in order:
+        x1, y1, x2, y2 = boxes[i]
+        if rows:
+            top = boxes[rows[-1][0]]
+            if (y1 + y2) / 2 - (top[1] + top[3]) / 2 <= (top[3] - top[1]) / 2:
+                rows[-1].append(i)
+                continue
+        rows.append([i])
+    return [i for row in rows for i in sorted(row, key=lambda j: boxes[j][0])]
+
+
+def detect_boards(img, cv2, np, limit=None):
+    """
+    한 이미지에서 겹치지 않는 보드를 모두 찾습니다 (퍼즐 페이지, 대회 회보 스크린샷 등).
+    공유 피라미드의 한 레벨에서 모든 후보를 한 번씩 채점하고 NMS로 고른 뒤,
+    checkerboard_score와 같은 방식으로 각각 fine 레벨까지 다듬습니다.
+    
+    Returns: [(boardArea, details)] - 읽는 순서
+    """
+    limit = limit or MULTI_BOARD_MAX
+    with span("detect.gray"):
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    with span("detect.pyramid"):
+        pyramid = GrayPyramid(gray, cv2)
+    level = 0
+    while level + 1 < len(pyramid.levels) and min(pyramid.levels[level + 1].shape[:2]) >= MULTI_BOARD_SCAN_SIDE:
+        level += 1
+    level = max(level, pyramid.fine)
+    
+    with span("detect.multi_scan"):
+        scores, boxes, cells, steps = scan_board_candidates(pyramid.levels[level], cv2, np)
+        # 다듬는 동안 밀려나는 후보를 대비해 여유 있게 고릅니다
+        keep = suppress_overlaps(scores, boxes, np, limit * 2)
+    
+    found = []
+    with span("detect.multi_refine"):
+        for index in keep:
+            x1, y1 = int(boxes[index][0]), int(boxes[index][1])
+            area, details = checkerboard_candidate_area(
+                pyramid, level, x1, y1, int(cells[index]), int(steps[index]), cv2, np,
+                spread=int(cells[index] * MULTI_BOARD_CELL_RATIO) - int(cells[index]),
+            )
+            if area is None or details["confidence"] < DETECT_MIN_CONFIDENCE:
+                continue
+            corners = board_corners(area, np)
+            found.append((float(scores[index]), area, {**details, "scanScore": round(float(scores[index]), 2)}, corners))
+    if not found:
+        return []
+    
+    # 다듬은 뒤 같은 보드로 모인 후보를 다시 한 번 걸러냅니다
+    refined_boxes = [(*c.min(axis=0), *c.max(axis=0)) for _, _, _, c in found]
+    keep = suppress_overlaps([f[0] for f in found], refined_boxes, np, limit)
+    kept_boxes = [refined_boxes[i] for i in keep]
+    return [found[keep[i]][1:3] for i in reading_order(kept_boxes)]
+
+
+def draw_debug_overlay(debug_img, board_area, recognized_fen, api_fen, api_error, cv2):
+    """
+    감지된 보드 영역, 8x8 그리드, 인식된 기물을 debug_img 위에 직접 그립니다.
+    """
+    if board_area:
+        _, np = load_cv()
+        corners = board_corners(board_area, np)
+        # 보드 좌표(0..8칸) → 이미지 좌표. corners가 없으면 사각형이므로 기존 선형 격자와 같습니다
+        unit = np.array([(0, 0), (8, 0), (8, 8), (0, 8)], dtype=np.float32)
+        to_image_matrix = cv2.getPerspectiveTransform(unit, corners)
+
+        def to_image(points):
+            mapped = cv2.perspectiveTransform(np.array([points], dtype=np.float32), to_image_matrix)[0]
+            return [(int(round(x)), int(round(y))) for x, y in mapped]
+
+        outline = to_image([(0, 0), (8, 0), (8, 8), (0, 8)])
+        top_left, top_right, bottom_right, bottom_left = outline
+        
+        # Draw green outer quadrilateral
+        cv2.polylines(debug_img, [np.array(outline, np.int32)], True, (0, 255, 0), 8)
+        
+        # Draw yellow 8x8 grid
+        square_width = np.linalg.norm(corners[1] - corners[0]) / 8
+        for i in range(1, 8):
+            (x1, y1), (x2, y2) = to_image([(i, 0), (i, 8)])
+            cv2.line(debug_img, (x1, y1), (x2, y2), (0, 255, 255), 4)
+        
+        for i in range(1, 8):
+            (x1, y1), (x2, y2) = to_image([(0, i), (8, i)])
+            cv2.line(debug_img, (x1, y1), (x2, y2), (0, 255, 255), 4)
+        
+        # Draw corner labels
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        font_scale = 1.2
+        font_thickness = 3
+        labels = [
+            {"text": "a8", "x": top_left[0] + 10, "y": top_left[1] + 40},
+            {"text": "h8", "x": top_right[0] - 60, "y": top_right[1] + 40},
+            {"text": "a1", "x": bottom_left[0] + 10, "y": bottom_left[1] - 10},
+            {"text": "h1", "x": bottom_right[0] - 60, "y": bottom_right[1] - 10},
+        ]
+        
+        for label in labels:
+            text_size = cv2.getTextSize(label["text"], font, font_scale, font_thickness)[0]
+            cv2.rectangle(
+                debug_img,
+                (label["x"] - 5, label["y"] - text_size[1] - 5),
+                (label["x"] + text_size[0] + 5, label["y"] + 5),
+                (0, 0, 0),
+                -1,
+            )
+            cv2.putText(debug_img, label["text"], (label["x"], label["y"]), font, font_scale, (0, 0, 255), font_thickness)
+        
+        # API 사용 여부 표시
+        api_status = "ChessVision.ai API: " + ("Success" if api_fen else f"Failed ({api_error})" if api_error else "Disabled")
+        cv2.putText(debug_img, api_status, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0) if api_fen else (0, 0, 255), 2)
+        
+        # 인식된 기물 표시
+        if recognized_fen:
+            from fen_board import PackedBoard
+
+            try:
+                pieces = PackedBoard.from_placement(recognized_fen).pieces()
+            except ValueError:
+                pieces = []
+            for rank_idx, file_idx, char in pieces:
+                (cx, cy), = to_image([(file_idx + 0.5, rank_idx + 0.5)])
+                color = (255, 255, 255) if char.isupper() else (0, 0, 0)
+                cv2.circle(debug_img, (cx, cy), int(square_width * 0.3), color, -1)
+                cv2.circle(debug_img, (cx, cy), int(square_width * 0.3), (0, 255, 0), 2)
+                cv2.putText(
+                    debug_img, char, (cx - 15, cy + 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8,
+                    (0, 0, 255) if char.isupper() else (255, 0, 0), 2,
+                )
+
+
+def parse_debug_level(value):
+    """payload의 debug 값을 DEBUG_LEVELS 중 하나로 정규화합니다."""
+    if isinstance(value, bool):
+        return "image" if value else "none"
+    if isinstance(value, str) and value.lower() in DEBUG_LEVELS:
+        return value.lower()
+    return DEFAULT_DEBUG_LEVEL if DEFAULT_DEBUG_LEVEL in DEBUG_LEVELS else "image"
+
+
+def handle_request(payload, image_data=None, tracer=None):
+    """
+    요청 payload 하나를 처리하여 응답 dict를 반환합니다.
+    one-shot 모드와 worker 모드가 공유합니다.
+    image_data(bytes 또는 DecodedFrame)가 주어지면 imageBase64 대신 그대로 사용합니다.
+    tracer를 넘기면 호출자가 그 앞 단계(입력 읽기 등)까지 같은 Tracer에 기록할 수 있습니다.
+    """
+    tracer = tracer or Tracer()
+    with activate(tracer), RequestProfiler(tracer) as profiler:
+        result = _handle_request(payload, image_data)
+    debug_info = result["debugInfo"]
+    if debug_info is not None:
+        debug_info["timings"] = tracer.timings()
+        if profiler.path:
+            debug_info["profile"] = profiler.path
+    return result
+
+
+def _handle_request(payload, image_data):
+    if not isinstance(payload, dict):
         payload = {}
 
     image_b64 = payload.get("imageBase64")
+    debug_level = parse_debug_level(payload.get("debug"))
+    deadline = request_deadline(payload)
     detected_area = None
     recognized_fen = None
     debug_info = {"method": None, "details": {}, "attempts": []}
@@ -516,59 +1897,117 @@ def main():
     image_shape = None
     debug_image_b64 = None
     debug_image_path = None
-    img_bytes = None
     api_fen = None
     api_error = None
+    board_hint_reused = False
+    # 칸별로 어느 경로(로컬 분류기 / board_to_fen)가 결과를 냈는지
+    cascade = None
+    
+    # 요청 이미지는 여기서 한 번만 디코딩하여 모든 단계가 공유합니다
+    if isinstance(image_data, DecodedFrame):
+        frame = image_data
+    elif image_data:
+        frame = DecodedFrame(image_data)
+    else:
+        frame = DecodedFrame.from_base64(image_b64)
     
-    if image_b64:
+    if payload.get("multiBoard"):
+        return _handle_multi_board(frame, debug_level)
+    
+    # === 0. 같은 이미지의 이전 결과가 있으면 감지/ML 단계를 건너뜁니다 ===
+    cache = get_result_cache() if frame else None
+    cache_key = None
+    cached = None
+    if frame and cache.enabled:
         try:
-            img_bytes = base64.b64decode(image_b64)
-        except Exception:
-            img_bytes = None
-    
-    # === 1. board_to_fen 라이브러리로 딥러닝 기반 인식 ===
-    if USE_BOARD_TO_FEN and img_bytes:
-        api_fen, api_error = recognize_with_board_to_fen(img_bytes)
-        debug_info["details"]["board_to_fen"] = {
-            "attempted": True,
-            "success": api_fen is not None,
-            "error": api_error,
-        }
-        if api_fen:
-            recognized_fen = api_fen + " w KQkq - 0 1" if " " not in api_fen else api_fen
-            debug_info["method"] = "board_to_fen"
-            debug_info["details"]["ml_fen"] = api_fen
+            with span("cache_lookup"):
+                cache_key = frame.cache_key()
+                cached = cache.get(cache_key)
+        except Exception as e:
+            debug_info["details"]["cache_error"] = str(e)
+    if cached is not None:
+        recognized_fen = cached["fen"]
+        detected_area = cached.get("boardArea")
+        debug_info["method"] = cached.get("method")
+        if cached.get("cascade"):
+            cascade = {**cached["cascade"], "mlCalled": False, "cached": True}
     
-    # === 2. 이미지 처리 및 체스판 감지 ===
-    if image_b64 and img_bytes:
+    # === 1. 이미지 처리 및 체스판 감지 ===
+    img = None
+    if frame:
         try:
-            import numpy as np
-            import cv2
+            cv2, np = load_cv()
             has_numpy = True
             has_cv2 = True
 
-            np_arr = np.frombuffer(img_bytes, np.uint8)
-            img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-            if img is not None:
+            img = frame.bgr
+            if img is not None and cached is None:
                 image_shape = img.shape
                 
                 # 체스판 영역 감지
-                detected_area, detect_method, detect_details = detect_board_area(img, cv2, np)
+                with span("detect"):
+                    detected_area, detect_method, detect_details = detect_board_area(
+                        img, cv2, np, hint=payload.get("boardAreaHint"), deadline=deadline
+                    )
+                board_hint_reused = detect_method == "board_hint"
                 
                 if detect_method and debug_info["method"] is None:
                     debug_info["method"] = detect_method
                 debug_info["details"].update(detect_details)
                 
-                # === 3. API 실패 시 로컬 인식 폴백 ===
-                if recognized_fen is None and detected_area is not None:
+                # === 2. 로컬 분류기로 64칸과 칸별 신뢰도를 먼저 구합니다 ===
+                if detected_area is not None:
                     try:
-                        piece_placement, is_flipped = recognize_board(img, detected_area, cv2, np)
+                        with span("recognize"):
+                            with span("recognize.warp"):
+                                board_img = extract_board(img, detected_area, cv2, np)
+                            piece_placement, is_flipped, piece_source, confidence, forced_kings = recognize_board(
+                                img, detected_area, cv2, np, board_img=board_img
+                            )
                         recognized_fen = piece_placement + " w KQkq - 0 1"
-                        debug_info["details"]["piece_recognition"] = "local_fallback"
+                        debug_info["details"]["piece_recognition"] = "local"
+                        debug_info["details"]["piece_classifier"] = piece_source
                         debug_info["details"]["recognized_placement"] = piece_placement
                         debug_info["details"]["board_flipped"] = is_flipped
-                        if debug_info["method"] is None or debug_info["method"] == "chessvision_api":
+                        if forced_kings:
+                            debug_info["details"]["forced_kings"] = forced_kings
+                        if confidence is not None:
+                            debug_info["details"]["square_confidence"] = confidence.round(3).tolist()
+                        if debug_info["method"] is None:
                             debug_info["method"] = detect_method or "local_recognition"
+                        
+                        # === 3. 불확실한 보드/칸만 board_to_fen으로 다시 읽습니다 ===
+                        board_confidence, ml_mask = cascade_plan(confidence, np)
+                        cascade = {
+                            "path": "local",
+                            "mlCalled": False,
+                            "boardConfidence": None if board_confidence is None else round(board_confidence, 4),
+                            "uncertainSquares": 0 if ml_mask is None else int(ml_mask.sum()),
+                            "squareSources": ["l" * 8] * 8,
+                        }
+                        if ml_mask is not None and USE_BOARD_TO_FEN and deadline_passed(deadline):
+                            cascade["mlSkipped"] = "deadline"
+                        elif ml_mask is not None and USE_BOARD_TO_FEN:
+                            with span("board_to_fen"):
+                                api_fen, api_error = recognize_with_board_to_fen(frame, board_img)
+                            cascade["mlCalled"] = True
+                            debug_info["details"]["board_to_fen"] = {
+                                "attempted": True,
+                                "success": api_fen is not None,
+                                "error": api_error,
+                            }
+                            merged = merge_ml_squares(piece_placement, api_fen, ml_mask, np) if api_fen else None
+                            if merged is not None:
+                                placement, cascade["squareSources"] = merged
+                                recognized_fen = placement + " w KQkq - 0 1"
+                                debug_info["details"]["ml_fen"] = api_fen
+                                if ml_mask.all():
+                                    cascade["path"] = "ml_board"
+                                    debug_info["method"] = "board_to_fen"
+                                else:
+                                    cascade["path"] = "ml_squares"
+                            elif api_fen:
+                                debug_info["details"]["board_to_fen"]["error"] = "Invalid placement"
                     except Exception as e:
                         debug_info["details"]["piece_recognition_error"] = str(e)
 
@@ -578,13 +2017,62 @@ def main():
         except Exception as e:
             debug_info["details"]["cv_error"] = str(e)
             
-    if image_shape is None and img_bytes:
-        try:
-            if img_bytes[:8] == b"\x89PNG\r\n\x1a\n":
-                width, height = struct.unpack(">II", img_bytes[16:24])
-                image_shape = (height, width, 3)
-        except Exception:
-            pass
+    # === 4. 보드를 못 찾았거나 cv2가 없으면 프레임 전체를 board_to_fen으로 ===
+    # 프레임워크 import가 가장 무거운 단계이므로 디코딩 가능한 이미지가 있을 때만 시도합니다
+    if USE_BOARD_TO_FEN and frame and cached is None and recognized_fen is None:
+        if deadline_passed(deadline):
+            debug_info["details"]["board_to_fen"] = {
+                "attempted": False,
+                "success": False,
+                "error": "Deadline exceeded",
+            }
+        elif not frame.decodable():
+            debug_info["details"]["board_to_fen"] = {
+                "attempted": False,
+                "success": False,
+                "error": "Could not decode image",
+            }
+        else:
+            with span("board_to_fen"):
+                api_fen, api_error = recognize_with_board_to_fen(frame)
+            debug_info["details"]["board_to_fen"] = {
+                "attempted": True,
+                "success": api_fen is not None,
+                "error": api_error,
+            }
+            cascade = {
+                "path": "ml_frame" if api_fen else "none",
+                "mlCalled": True,
+                "boardConfidence": None,
+                "uncertainSquares": 64,
+                "squareSources": ["m" * 8] * 8 if api_fen else None,
+            }
+            if api_fen:
+                recognized_fen = api_fen + " w KQkq - 0 1" if " " not in api_fen else api_fen
+                debug_info["method"] = "board_to_fen"
+                debug_info["details"]["ml_fen"] = api_fen
+    
+    if image_shape is None and frame:
+        image_shape = frame.shape
+    
+    if cache_key is not None:
+        # 캐시 키는 픽셀뿐이므로 시간 예산 때문에 줄인 결과나 신뢰도가 낮은 감지 결과는 저장하지 않습니다.
+        # (저장하면 예산이 넉넉한 다음 요청도 같은 화면에서 그 결과를 받습니다)
+        degraded = (
+            debug_info["details"].get("deadlineExceeded")
+            or debug_info["details"].get("lowConfidence")
+            or (cascade or {}).get("mlSkipped")
+        )
+        store = cached is None and recognized_fen is not None and not degraded
+        if store:
+            with span("cache_store"):
+                cache.put(cache_key, {
+                    "fen": recognized_fen,
+                    "boardArea": detected_area,
+                    "method": debug_info["method"],
+                    "cascade": cascade,
+                })
+        debug_info["details"]["cache"] = {"hit": cached is not None, "stored": store, **cache.stats()}
             
     board_area = None
     if BOARD_AREA:
@@ -617,84 +2105,18 @@ def main():
     debug_info["details"]["hasNumpy"] = has_numpy
     debug_info["details"]["useBoardToFen"] = USE_BOARD_TO_FEN
 
-    # Draw debug overlay
-    if image_b64 and image_shape is not None and img_bytes and has_cv2:
+    # Draw debug overlay (path/image 단계에서만)
+    wants_overlay = debug_level in ("path", "image")
+    if wants_overlay and image_shape is not None and img is not None and has_cv2:
         try:
-            import numpy as np
-            import cv2
+            cv2, _ = load_cv()
 
-            np_arr = np.frombuffer(img_bytes, np.uint8)
-            img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-            if img is not None:
-                debug_img = img.copy()
-                if board_area:
-                    tl = board_area["topLeft"]
-                    br = board_area["bottomRight"]
-                    
-                    # Draw green outer rectangle
-                    cv2.rectangle(debug_img, (tl["x"], tl["y"]), (br["x"], br["y"]), (0, 255, 0), 8)
-                    
-                    # Draw yellow 8x8 grid
-                    width = br["x"] - tl["x"]
-                    height = br["y"] - tl["y"]
-                    square_width = width / 8
-                    square_height = height / 8
-                    
-                    for i in range(1, 8):
-                        x = int(tl["x"] + i * square_width)
-                        cv2.line(debug_img, (x, tl["y"]), (x, br["y"]), (0, 255, 255), 4)
-                    
-                    for i in range(1, 8):
-                        y = int(tl["y"] + i * square_height)
-                        cv2.line(debug_img, (tl["x"], y), (br["x"], y), (0, 255, 255), 4)
-                    
-                    # Draw corner labels
-                    font = cv2.FONT_HERSHEY_SIMPLEX
-                    font_scale = 1.2
-                    font_thickness = 3
-                    labels = [
-                        {"text": "a8", "x": tl["x"] + 10, "y": tl["y"] + 40},
-                        {"text": "h8", "x": br["x"] - 60, "y": tl["y"] + 40},
-                        {"text": "a1", "x": tl["x"] + 10, "y": br["y"] - 10},
-                        {"text": "h1", "x": br["x"] - 60, "y": br["y"] - 10},
-                    ]
-                    
-                    for label in labels:
-                        text_size = cv2.getTextSize(label["text"], font, font_scale, font_thickness)[0]
-                        cv2.rectangle(
-                            debug_img,
-                            (label["x"] - 5, label["y"] - text_size[1] - 5),
-                            (label["x"] + text_size[0] + 5, label["y"] + 5),
-                            (0, 0, 0),
-                            -1,
-                        )
-                        cv2.putText(debug_img, label["text"], (label["x"], label["y"]), font, font_scale, (0, 0, 255), font_thickness)
-                    
-                    # API 사용 여부 표시
-                    api_status = "ChessVision.ai API: " + ("Success" if api_fen else f"Failed ({api_error})" if api_error else "Disabled")
-                    cv2.putText(debug_img, api_status, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0) if api_fen else (0, 0, 255), 2)
-                    
-                    # 인식된 기물 표시
-                    if recognized_fen:
-                        rows = recognized_fen.split()[0].split("/")
-                        for rank_idx, row in enumerate(rows):
-                            file_idx = 0
-                            for char in row:
-                                if char.isdigit():
-                                    file_idx += int(char)
-                                else:
-                                    cx = int(tl["x"] + (file_idx + 0.5) * square_width)
-                                    cy = int(tl["y"] + (rank_idx + 0.5) * square_height)
-                                    color = (255, 255, 255) if char.isupper() else (0, 0, 0)
-                                    cv2.circle(debug_img, (cx, cy), int(square_width * 0.3), color, -1)
-                                    cv2.circle(debug_img, (cx, cy), int(square_width * 0.3), (0, 255, 0), 2)
-                                    cv2.putText(
-                                        debug_img, char, (cx - 15, cy + 10),
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.8,
-                                        (0, 0, 255) if char.isupper() else (255, 0, 0), 2,
-                                    )
-                                    file_idx += 1
-                
+            # 오버레이는 프레임의 마지막 소비자이므로 복사 없이 디코딩된 배열 위에 그립니다
+            debug_img = img
+            with span("debug_overlay"):
+                draw_debug_overlay(debug_img, board_area, recognized_fen, api_fen, api_error, cv2)
+            
+            with span("debug_write"):
                 if DEBUG_OUTPUT:
                     cv2.imwrite(DEBUG_OUTPUT, debug_img)
                     debug_image_path = DEBUG_OUTPUT
@@ -704,46 +2126,1067 @@ def main():
                         cv2.imwrite(debug_image_path, debug_img)
                     except Exception:
                         debug_image_path = None
-                
-                # Create debug base64
+            
+            # Create debug base64
+            if debug_level == "image":
                 try:
-                    target_w = 600
-                    h, w = debug_img.shape[:2]
-                    if w > target_w:
-                        scale = target_w / float(w)
-                        resized = cv2.resize(debug_img, (target_w, int(h * scale)))
-                    else:
-                        resized = debug_img
-                    ok, buf = cv2.imencode(".png", resized)
-                    if ok:
-                        debug_image_b64 = base64.b64encode(buf.tobytes()).decode("utf-8")
+                    with span("debug_encode"):
+                        target_w = 600
+                        h, w = debug_img.shape[:2]
+                        if w > target_w:
+                            scale = target_w / float(w)
+                            resized = cv2.resize(debug_img, (target_w, int(h * scale)))
+                        else:
+                            resized = debug_img
+                        ok, buf = cv2.imencode(".png", resized)
+                        if ok:
+                            debug_image_b64 = base64.b64encode(buf.tobytes()).decode("utf-8")
                 except Exception:
                     pass
         except Exception:
             pass
-    elif image_b64 and image_shape is not None and img_bytes and not has_cv2:
+    elif frame and image_shape is not None and not has_cv2:
         if debug_info["method"] is None:
             debug_info["method"] = "no_cv2"
             debug_info["details"] = {"hasCv2": False, "hasNumpy": has_numpy}
 
-    if debug_image_b64 is None:
+    # 인라인 이미지를 요청한 경우에만 원본을 대신 돌려줍니다 (클라이언트가 직접 오버레이)
+    if debug_image_b64 is None and debug_level == "image":
         debug_image_b64 = image_b64 if image_b64 else None
 
     # 최종 FEN 결정
     final_fen = recognized_fen if recognized_fen else DEFAULT_FEN
 
+    return {
+        "fen": final_fen,
+        "boardArea": board_area,
+        "boardHintReused": board_hint_reused,
+        "cascade": cascade,
+        "debugImageBase64": debug_image_b64,
+        "debugImagePath": debug_image_path,
+        "debugInfo": debug_info if debug_level != "none" else None,
+    }
+
+
+def _handle_multi_board(frame, debug_level):
+    """
+    payload.multiBoard: 한 이미지의 모든 보드를 감지해 읽는 순서로 [{boardArea, fen}]을 돌려줍니다.
+    보드 힌트는 쓰지 않으며, 분류는 recognize_boards 한 번으로 모든 보드를 함께 처리합니다.
+    fen / boardArea는 첫 보드(없으면 기본값)로 채워 단일 보드 응답과 호환됩니다.
+    """
+    debug_info = {"method": "multi_board", "details": {}}
+    boards = None
+    
+    cache = get_result_cache() if frame else None
+    cache_key = None
+    if frame and cache.enabled:
+        try:
+            with span("cache_lookup"):
+                cache_key = "boards:" + frame.cache_key()
+                cached = cache.get(cache_key)
+            if cached is not None:
+                boards = cached["boards"]
+            debug_info["details"]["cache"] = {"hit": cached is not None, **cache.stats()}
+        except Exception as e:
+            debug_info["details"]["cache_error"] = str(e)
+    
+    if boards is None and frame:
+        try:
+            cv2, np = load_cv()
+            img = frame.bgr
+            if img is None:
+                debug_info["details"]["error"] = "Could not decode image"
+            else:
+                with span("detect"):
+                    detected = detect_boards(img, cv2, np)
+                recognized = []
+                if detected:
+                    with span("recognize"):
+                        recognized = recognize_boards(img, [area for area, _ in detected], cv2, np)
+                boards = []
+                board_details = []
+                for (area, details), (placement, is_flipped, source, forced_kings) in zip(detected, recognized):
+                    boards.append({"boardArea": area, "fen": placement + " w KQkq - 0 1"})
+                    board_details.append({
+                        "confidence": details.get("confidence"),
+                        "board_flipped": is_flipped,
+                        "piece_classifier": source,
+                        "forced_kings": forced_kings,
+                    })
+                debug_info["details"]["boards"] = board_details
+                if cache_key is not None:
+                    with span("cache_store"):
+                        cache.put(cache_key, {"boards": boards})
+        except ImportError:
+            debug_info["method"] = "no_cv2"
+        except Exception as e:
+            debug_info["details"]["cv_error"] = str(e)
+    
+    boards = boards or []
+    return {
+        "fen": boards[0]["fen"] if boards else DEFAULT_FEN,
+        "boardArea": boards[0]["boardArea"] if boards else None,
+        "boards": boards,
+        "boardHintReused": False,
+        "debugImageBase64": None,
+        "debugImagePath": None,
+        "debugInfo": debug_info if debug_level != "none" else None,
+    }
+
+
+def preload_modules():
+    """
+    worker 시작 시 numpy, cv2, board_to_fen을 미리 import 합니다.
+    실패한 모듈은 요청 처리 시점의 기존 폴백 경로를 그대로 탑니다.
+    """
+    loaded = {}
+    for name in ("numpy", "cv2", "PIL.Image", "fen_cache", "fen_classifier", "fen_themes"):
+        try:
+            __import__(name)
+            loaded[name] = True
+        except ImportError:
+            loaded[name] = False
+    if loaded["fen_classifier"]:
+        loaded["piece_classifier"] = get_piece_classifier() is not None
+    if USE_BOARD_TO_FEN:
+        try:
+            from board_to_fen.predict import get_fen_from_image  # noqa: F401
+            loaded["board_to_fen"] = True
+        except Exception:
+            loaded["board_to_fen"] = False
+    return loaded
+
+
+def read_exact(stream, size):
+    """stream에서 정확히 size bytes를 미리 할당한 bytearray로 읽습니다 (중간 복사 없음)."""
+    buf = bytearray(size)
+    view = memoryview(buf)
+    pos = 0
+    while pos < size:
+        n = stream.readinto(view[pos:])
+        if not n:
+            raise EOFError("Unexpected end of frame")
+        pos += n
+    return buf
+
+
+def parse_frame(data):
+    """
+    메모리에 있는 binary frame을 (meta, image) 로 나눕니다.
+    image는 data를 가리키는 memoryview이므로 np.frombuffer까지 복사가 없습니다.
+    """
+    magic, meta_len, image_len = FRAME_HEADER.unpack_from(data)
+    if magic != FRAME_MAGIC:
+        raise ValueError("Invalid frame magic")
+    start = FRAME_HEADER.size
+    view = memoryview(data)
+    meta = json.loads(bytes(view[start:start + meta_len]) or b"{}")
+    image = view[start + meta_len:start + meta_len + image_len]
+    if len(image) != image_len:
+        raise ValueError("Truncated frame")
+    return meta, image
+
+
+def read_message(stream):
+    """
+    worker stdin에서 요청 하나를 읽습니다. JSON 한 줄 또는 binary frame.
+    Returns: (message, image_data) - EOF이면 (None, None)
+    """
+    while True:
+        first = stream.read(1)
+        if not first:
+            return None, None
+        if first.isspace():
+            continue
+        if first == FRAME_MAGIC[:1]:
+            header = first + bytes(read_exact(stream, FRAME_HEADER.size - 1))
+            magic, meta_len, image_len = FRAME_HEADER.unpack(header)
+            if magic != FRAME_MAGIC:
+                raise ValueError("Invalid frame magic")
+            meta = json.loads(bytes(read_exact(stream, meta_len)) or b"{}")
+            return meta, read_exact(stream, image_len)
+        return json.loads(first + stream.readline()), None
+
+
+def run_worker():
+    """
+    장시간 실행되는 worker 루프. 요청마다 한 줄의 JSON 응답을 씁니다.
+    라이브러리가 stdout에 출력하더라도 프로토콜이 깨지지 않도록
+    sys.stdout은 stderr로 돌려두고 원래 stdout에만 응답을 씁니다.
+    """
+    global _inference_batcher
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    
+    out = sys.stdout
+    sys.stdout = sys.stderr
+    stream = sys.stdin.buffer
+    write_lock = threading.Lock()
+
+    def send(message):
+        line = json.dumps(message) + "\n"
+        with write_lock:
+            out.write(line)
+            out.flush()
+
+    preloaded = preload_modules()
+    
+    # 요청 스레드가 여럿이면 recognize를 스레드 풀에서 처리하고, 분류기 추론은 요청 간에 묶습니다
+    executor = None
+    in_flight = [0]
+    in_flight_lock = threading.Lock()
+    if WORKER_THREADS > 1:
+        executor = ThreadPoolExecutor(WORKER_THREADS, thread_name_prefix="recognize")
+        classifier = get_piece_classifier()
+        if classifier is not None and INFERENCE_BATCH_ROWS > 0:
+            from fen_batcher import MicroBatcher
+            
+            _inference_batcher = MicroBatcher(
+                classifier.predict_proba,
+                max_rows=INFERENCE_BATCH_ROWS,
+                max_wait_ms=INFERENCE_BATCH_WAIT_MS,
+                max_queue=INFERENCE_QUEUE_SIZE,
+                # 스레드 풀 대기열에 있는 요청은 아직 추론 단계에 올 수 없으므로 실행 중인 요청까지만 기다립니다
+                expected=lambda: min(in_flight[0], WORKER_THREADS),
+            )
+    
+    # analyse는 엔진 탐색으로 수십 초까지 걸릴 수 있으므로 읽기 루프를 막지 않도록 전용 스레드 하나에서 순서대로 처리합니다
+    analyse_executor = ThreadPoolExecutor(1, thread_name_prefix="analyse")
+
+    def analyse(request_id, payload):
+        try:
+            tracer = Tracer()
+            with activate(tracer):
+                result = handle_analyse(payload)
+            send({"id": request_id, "result": result, "timings": tracer.timings()})
+        except Exception as e:
+            send({"id": request_id, "error": str(e)})
+
+    def recognize(request_id, payload, image_data):
+        try:
+            tracer = Tracer()
+            result = handle_request(payload, image_data=image_data, tracer=tracer)
+            send({"id": request_id, "result": result, "timings": tracer.timings()})
+        except Exception as e:
+            send({"id": request_id, "error": str(e)})
+        finally:
+            with in_flight_lock:
+                in_flight[0] -= 1
+
+    send({"type": "ready", "pid": os.getpid(), "preloaded": preloaded, "threads": WORKER_THREADS})
+
+    while True:
+        try:
+            message, image_data = read_message(stream)
+        except EOFError:
+            break
+        except Exception as e:
+            # frame 경계를 잃었을 수 있으므로 종료하고 상위에서 재시작하게 합니다
+            send({"id": None, "error": f"Invalid request: {e}"})
+            if not isinstance(e, json.JSONDecodeError):
+                break
+            continue
+        if message is None:
+            break
+        if not isinstance(message, dict):
+            send({"id": None, "error": "Request must be a JSON object"})
+            continue
+
+        request_id = message.get("id")
+        request_type = message.get("type", "recognize")
+        if request_type == "ping":
+            send({"id": request_id, "pong": True, "pid": os.getpid()})
+            continue
+        if request_type == "stats":
+            send({
+                "id": request_id,
+                "stats": {
+                    "threads": WORKER_THREADS,
+                    "inFlight": in_flight[0],
+                    "batcher": _inference_batcher.stats() if _inference_batcher is not None else None,
+                    "detect": _detect_scheduler.stats() if _detect_scheduler is not None else None,
+                },
+            })
+            continue
+        if request_type == "analyse":
+            analyse_executor.submit(analyse, request_id, message.get("payload") or {})
+            continue
+        if request_type != "recognize":
+            send({"id": request_id, "error": f"Unknown request type: {request_type}"})
+            continue
+
+        with in_flight_lock:
+            in_flight[0] += 1
+        if executor is None:
+            recognize(request_id, message.get("payload") or {}, image_data)
+        else:
+            executor.submit(recognize, request_id, message.get("payload") or {}, image_data)
+    
+    if executor is not None:
+        executor.shutdown(wait=True)
+    analyse_executor.shutdown(wait=True)
+    if _inference_batcher is not None:
+        _inference_batcher.close()
+        _inference_batcher = None
+
+
+def run_fork_server(path):
+    """
+    무거운 모듈을 미리 import 한 부모가 unix socket에서 대기하다가 연결마다 fork 합니다.
+    자식은 one-shot과 같은 요청(JSON 또는 binary frame)을 EOF까지 읽고 JSON 응답 한 개를 쓴 뒤 종료합니다.
+    fork 후 자식 간에는 메모리 캐시가 공유되지 않으므로 결과 캐시가 필요하면 CHESS_FEN_CACHE_DB를 씁니다.
+    """
+    import signal
+    import socket
+
+    if not hasattr(os, "fork") or not hasattr(socket, "AF_UNIX"):
+        raise SystemExit("--fork-server requires fork() and unix sockets")
+
+    preloaded = preload_modules()
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(64)
+    # 종료된 자식은 커널이 바로 회수하도록 (zombie 방지)
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(json.dumps({"type": "ready", "pid": os.getpid(), "socket": path, "preloaded": preloaded}), flush=True)
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            if os.fork() != 0:
+                conn.close()
+                continue
+            # 자식 프로세스
+            server.close()
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 0
+            try:
+                tracer = Tracer()
+                with conn, conn.makefile("rb") as stream:
+                    with tracer.span("read_input"):
+                        raw = stream.read()
+                    try:
+                        with tracer.span("parse_input"):
+                            if raw[:len(FRAME_MAGIC)] == FRAME_MAGIC:
+                                payload, image_data = parse_frame(raw)
+                            else:
+                                payload, image_data = json.loads(raw or b"{}"), None
+                    except Exception:
+                        payload, image_data = {}, None
+                    result = handle_request(payload, image_data=image_data, tracer=tracer)
+                    conn.sendall(json.dumps(result).encode("utf-8") + b"\n")
+            except Exception as e:
+                print(f"[fork-server] request failed: {e}", file=sys.stderr)
+                code = 1
+            finally:
+                os._exit(code)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+# worker 프로세스가 죽었을 때 같은 이미지를 처리해 볼 최대 횟수
+BATCH_MAX_ATTEMPTS = 2
+BATCH_IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp", ".tif", ".tiff")
+
+_batch_zip = None
+
+
+def iter_batch_sources(path):
+    """디렉터리(재귀) 또는 zip 안의 이미지를 정렬된 순서로 (kind, container, name) 으로 나열합니다."""
+    import zipfile
+
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(BATCH_IMAGE_EXTENSIONS):
+                    yield ("file", None, os.path.join(root, name))
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            names = sorted(n for n in archive.namelist() if n.lower().endswith(BATCH_IMAGE_EXTENSIONS))
+        for name in names:
+            yield ("zip", path, name)
+    else:
+        raise ValueError(f"Not a directory or zip archive: {path}")
+
+
+def _batch_init():
+    # 프로세스마다 한 번만 모델/모듈 로드. 프로세스 병렬이므로 cv2 내부 스레드는 1개로 제한
+    preload_modules()
+    try:
+        cv2, _ = load_cv()
+        cv2.setNumThreads(1)
+    except ImportError:
+        pass
+
+
+def _batch_read(source):
+    global _batch_zip
+    kind, container, name = source
+    if kind == "file":
+        with open(name, "rb") as f:
+            return f.read()
+    import zipfile
+
+    if _batch_zip is None or _batch_zip.filename != container:
+        _batch_zip = zipfile.ZipFile(container)
+    return _batch_zip.read(name)
+
+
+def _batch_recognize(task):
+    """프로세스 풀에서 이미지 한 장을 인식합니다. 실패해도 예외 대신 error 레코드를 돌려줍니다."""
+    import time
+
+    index, source = task
+    record = {"index": index, "source": source[2]}
+    started = time.perf_counter()
+    try:
+        frame = DecodedFrame(_batch_read(source))
+        if not frame.decodable():
+            raise ValueError("Could not decode image")
+        result = handle_request({"debug": "info"}, image_data=frame)
+        details = result["debugInfo"]["details"]
+        record.update({
+            "fen": result["fen"],
+            "boardArea": result["boardArea"],
+            "method": result["debugInfo"]["method"],
+            "flipped": details.get("board_flipped"),
+        })
+        from fen_board import PackedBoard
+
+        problems = PackedBoard.from_placement(result["fen"]).problems()
+        if problems:
+            record["problems"] = problems
+    except Exception as e:
+        record["error"] = str(e)
+    record["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return record
+
+
+def run_batch(argv):
+    """
+    batch 서브커맨드. 이미지를 제한된 개수만 미리 제출하며 스트리밍 처리하므로
+    입력 크기와 관계없이 메모리 사용량이 일정합니다.
+    worker 프로세스가 죽으면(OOM, cv2 segfault 등) 풀을 새로 만들고, 그때 처리 중이던 이미지는
+    BATCH_MAX_ATTEMPTS번까지 다시 시도한 뒤 error 레코드로 남깁니다.
+    """
+    import argparse
+    import time
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    from concurrent.futures.process import BrokenProcessPool
+
+    parser = argparse.ArgumentParser(prog="recognize-fen.py batch", description="Recognize FEN for many board images.")
+    parser.add_argument("source", help="directory (recursive) or .zip archive of board images")
+    parser.add_argument("--out", default="-", help="output JSONL path (default: stdout)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--order", choices=("input", "completion"), default="input",
+                        help="write results in input order or as they complete")
+    args = parser.parse_args(argv)
+
+    sources = enumerate(iter_batch_sources(args.source))
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    max_pending = max(1, args.workers) * 4
+    processed = errors = 0
+    next_index = 0
+    reorder = {}
+    started = time.perf_counter()
+
+    def emit(record):
+        nonlocal processed, errors
+        processed += 1
+        errors += "error" in record
+        out.write(json.dumps(record) + "\n")
+
+    def new_pool():
+        return ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=_batch_init)
+
+    def collect(record):
+        if args.order == "completion":
+            emit(record)
+        else:
+            reorder[record["index"]] = record
+
+    def lost(task, attempts):
+        # worker와 함께 사라진 작업: 횟수가 남았으면 다시 시도하고 아니면 error 레코드로 남깁니다
+        if attempts < BATCH_MAX_ATTEMPTS:
+            retry.append((task, attempts))
+        else:
+            index, source = task
+            collect({"index": index, "source": source[2], "error": "worker process died"})
+
+    pool = new_pool()
+    pending = {}  # future → (task, 시도 횟수)
+    retry = []
+    restarts = 0
+    try:
+        exhausted = False
+        while pending or retry or not exhausted:
+            if retry:
+                # 어느 이미지가 worker를 죽였는지 알 수 없으므로 재시도는 하나씩 따로 실행합니다
+                if not pending:
+                    task, attempts = retry.pop()
+                    pending[pool.submit(_batch_recognize, task)] = (task, attempts + 1)
+            else:
+                while not exhausted and len(pending) < max_pending:
+                    task = next(sources, None)
+                    if task is None:
+                        exhausted = True
+                        break
+                    pending[pool.submit(_batch_recognize, task)] = (task, 1)
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                task, attempts = pending.pop(future)
+                try:
+                    collect(future.result())
+                except BrokenProcessPool:
+                    broken = True
+                    lost(task, attempts)
+            if broken:
+                # 죽은 풀에 남은 future도 모두 BrokenProcessPool로 끝나므로 새 풀로 다시 제출합니다
+                for task, attempts in pending.values():
+                    lost(task, attempts)
+                pending.clear()
+                restarts += 1
+                print(f"[batch] worker process died, restarting pool ({restarts})", file=sys.stderr)
+                pool.shutdown(cancel_futures=True)
+                pool = new_pool()
+            while next_index in reorder:
+                emit(reorder.pop(next_index))
+                next_index += 1
+    finally:
+        pool.shutdown(cancel_futures=True)
+        # 중단되더라도 이미 끝난 결과는 순서와 관계없이 남깁니다
+        for index in sorted(reorder):
+            emit(reorder[index])
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    rate = processed / elapsed if elapsed > 0 else 0.0
     print(
-        json.dumps(
-            {
-                "fen": final_fen,
-                "boardArea": board_area,
-                "debugImageBase64": debug_image_b64,
-                "debugImagePath": debug_image_path,
-                "debugInfo": debug_info,
-            }
+        f"[batch] {processed} images ({errors} errors) in {elapsed:.2f}s - {rate:.1f} images/s",
+        file=sys.stderr,
+    )
+
+
+def run_validate(argv):
+    """
+    validate 서브커맨드. 한 줄에 FEN 하나인 파일을 chunk 줄씩 fen_board로 한 번에 디코딩 / 검사하여
+    문제가 있는 줄만 JSONL로 기록하고, 문제별 개수를 stderr에 요약합니다.
+    """
+    import argparse
+    import itertools
+    import time
+
+    import numpy as np
+    from fen_board import PROBLEMS, decode_placements, problem_names, validate_boards
+
+    parser = argparse.ArgumentParser(prog="recognize-fen.py validate", description="Sanity-check many FEN positions.")
+    parser.add_argument("source", help="text file with one FEN (or placement) per line, - for stdin")
+    parser.add_argument("--out", default="-", help="output JSONL path for problematic lines (default: stdout)")
+    parser.add_argument("--chunk", type=int, default=65536, help="lines decoded and checked per batch")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.source == "-" else open(args.source, encoding="utf-8", errors="replace")
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    totals = dict.fromkeys(["invalidPlacement"] + [name for _, name in PROBLEMS], 0)
+    processed = flagged = 0
+    started = time.perf_counter()
+    try:
+        while True:
+            lines = [line.strip() for line in itertools.islice(source, max(1, args.chunk))]
+            if not lines:
+                break
+            boards, valid = decode_placements(lines)
+            problems = validate_boards(boards)
+            for bit, name in PROBLEMS:
+                totals[name] += int(np.count_nonzero(((problems & bit) != 0) & valid))
+            totals["invalidPlacement"] += int(np.count_nonzero(~valid))
+            for i in np.flatnonzero(~valid | (problems != 0)).tolist():
+                names = problem_names(problems[i]) if valid[i] else ["invalidPlacement"]
+                out.write(json.dumps({"line": processed + i + 1, "fen": lines[i], "problems": names}) + "\n")
+            flagged += int(np.count_nonzero(~valid | (problems != 0)))
+            processed += len(lines)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"[validate] {processed} positions ({flagged} flagged) in {elapsed:.2f}s - {rate:.0f} positions/s", file=sys.stderr)
+    print(json.dumps({name: count for name, count in totals.items() if count}), file=sys.stderr)
+
+
+def board_area_arg(value):
+    """CLI 인자 "x1,y1,x2,y2" → boardArea dict."""
+    x1, y1, x2, y2 = [int(v) for v in value.split(",")]
+    return {"topLeft": {"x": x1, "y": y1}, "bottomRight": {"x": x2, "y": y2}}
+
+
+def run_calibrate(argv):
+    """
+    calibrate 서브커맨드. 알려진 배치의 스크린샷에서 보드를 찾아(또는 --board-area) 펴고,
+    테마 프로파일을 학습하여 THEME_DIR에 이름으로 저장합니다.
+    """
+    import argparse
+
+    from fen_board import PackedBoard
+    from fen_themes import ThemeProfile
+
+    parser = argparse.ArgumentParser(prog="recognize-fen.py calibrate", description="Learn a board theme profile.")
+    parser.add_argument("image", help="screenshot of a board showing a known position")
+    parser.add_argument("--name", required=True, help="profile name (saved as <name>.json)")
+    parser.add_argument("--fen", default=DEFAULT_FEN, help="placement shown in the image (default: start position)")
+    parser.add_argument("--flipped", action="store_true", help="the board is shown from black's side")
+    parser.add_argument("--board-area", help="x1,y1,x2,y2 instead of automatic detection")
+    args = parser.parse_args(argv)
+
+    cv2, np = load_cv()
+    img = cv2.imread(args.image, cv2.IMREAD_COLOR)
+    if img is None:
+        raise SystemExit(f"Could not read image: {args.image}")
+    if args.board_area:
+        area = board_area_arg(args.board_area)
+    else:
+        area, _, _ = detect_board_area(img, cv2, np)
+        if area is None:
+            raise SystemExit("No board detected; pass --board-area")
+
+    try:
+        board = PackedBoard.from_placement(args.fen)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    grid = (board.rotated() if args.flipped else board).rows()
+
+    profile = ThemeProfile.calibrate(args.name, extract_board(img, area, cv2, np), grid)
+    profile.meta["placement"] = args.fen.split()[0]
+    path = get_theme_store().save(profile)
+    print(json.dumps({"profile": args.name, "path": path, "boardArea": area, "background": profile.to_json()["background"]}))
+
+
+class SequenceRecognizer:
+    """
+    연속 프레임의 증분 인식기 (sequence 모드).
+
+    마지막 분류 때의 칸별 서명(칸당 SEQUENCE_SIGNATURE_CELL px 로 작게 편 보드), 편 보드, 칸별 기물을
+    기억해 두고, 새 프레임은 서명만 만들어 칸별 평균 절대 차이를 비교합니다. 바뀐 칸이 없으면
+    warpPerspective(64x64) + absdiff 만으로 끝나고, 바뀐 칸만 기물 분류기로 다시 분류합니다.
+    새 위치가 stable_frames 프레임 동안 유지되면 GameRecord에 넣어 둔 수를 추론합니다.
+    한 수로 설명되지 않는 위치는 resync_frames 동안 유지될 때만 새 게임으로 확정합니다.
+
+    파이프라인에서는 prepare(서명과 편 보드, 상태 없음)를 앞 스레드에서, process(상태 갱신)를
+    다음 스레드에서 부릅니다. 보드 영역이 바뀌면 버전이 올라가 이전 영역으로 준비한 결과는 버려집니다.
+    """
+
+    def __init__(self, cv2, np, classifier, board_area=None, stable_frames=None, threshold=None, resync_frames=None):
+        from fen_moves import GameRecord
+
+        self.cv2, self.np = cv2, np
+        self.classifier = classifier
+        self.stable_frames = stable_frames or SEQUENCE_STABLE_FRAMES
+        self.resync_frames = max(self.stable_frames, resync_frames or SEQUENCE_RESYNC_FRAMES)
+        self.threshold = SEQUENCE_DIFF_THRESHOLD if threshold is None else threshold
+        self.game = GameRecord()
+        self.board_area = None
+        self.flipped = False
+        self.board_img = None  # 마지막으로 편 canonical 보드
+        self.labels = None  # 화면 기준 8x8 기물 (칸별 마지막 분류 결과)
+        self.committed = None  # 마지막으로 확정한 화면 기준 기물
+        self.pending = 0  # labels가 committed와 다른 채로 유지된 프레임 수
+        self._warp = (0, None, None)  # (영역 버전, 서명용 변환 행렬, boardArea) - 스레드 간에 한 번에 바꿉니다
+        self._reference = None  # 칸별로 마지막 분류 시점의 서명
+        self._previous = None  # prepare가 본 직전 프레임의 (버전, 서명)
+        self.stats = {"frames": 0, "noBoard": 0, "unchanged": 0, "reclassified": 0, "redetected": 0, "squares": 0}
+        if board_area:
+            self._set_area(board_area)
+
+    def _set_area(self, board_area):
+        np = self.np
+        size = 8 * SEQUENCE_SIGNATURE_CELL
+        dst = np.array([(0, 0), (size, 0), (size, size), (0, size)], dtype=np.float32)
+        self.board_area = board_area
+        matrix = self.cv2.getPerspectiveTransform(board_corners(board_area, np), dst)
+        self._warp = (self._warp[0] + 1, matrix, board_area)
+        self._reference = None
+
+    def signature(self, img, matrix=None):
+        """보드를 칸당 SEQUENCE_SIGNATURE_CELL px 로 편 작은 BGR 배열 (출력 크기만큼만 샘플링하므로 해상도와 무관)."""
+        size = 8 * SEQUENCE_SIGNATURE_CELL
+        return self.cv2.warpPerspective(
+            img, self._warp[1] if matrix is None else matrix, (size, size),
+            flags=self.cv2.INTER_LINEAR, borderMode=self.cv2.BORDER_REPLICATE,
         )
+
+    def square_diff(self, signature, reference=None):
+        """기준 서명 대비 칸별 평균 절대 차이 (8, 8)."""
+        reference = self._reference if reference is None else reference
+        # 정수배 축소의 INTER_AREA = 칸 블록 평균
+        diff = self.cv2.resize(self.cv2.absdiff(signature, reference), (8, 8), interpolation=self.cv2.INTER_AREA)
+        return diff.mean(axis=2)
+
+    def prepare(self, img):
+        """
+        process 전에 다른 스레드에서 미리 할 수 있는 warp 작업. 직전 프레임과 달라진 칸이 있으면
+        편 보드(extract_board)까지 만들어 둡니다. 보드 영역을 아직 모르면 None.
+
+        Returns: (영역 버전, 서명, 편 보드 또는 None)
+        """
+        version, matrix, board_area = self._warp
+        if matrix is None:
+            return None
+        signature = self.signature(img, matrix)
+        previous = self._previous
+        self._previous = (version, signature)
+        board_img = None
+        if previous is None or previous[0] != version or (self.square_diff(signature, previous[1]) > self.threshold).any():
+            with span("sequence.warp"):
+                board_img = extract_board(img, board_area, self.cv2, self.np)
+        return version, signature, board_img
+
+    def process(self, img, index=None, prepared=None):
+        """
+        프레임 하나(BGR)를 처리합니다. prepared는 같은 프레임의 prepare 결과입니다 (없으면 여기서 계산).
+
+        Returns: 새 위치를 확정했으면 position 레코드 dict, 아니면 None
+        """
+        cv2, np = self.cv2, self.np
+        signature = board_img = None
+        if prepared is not None and prepared[0] == self._warp[0]:
+            _, signature, board_img = prepared
+        self.stats["frames"] += 1
+        if self.board_area is None:
+            with span("sequence.detect"):
+                board_area, _, _ = detect_board_area(img, cv2, np)
+            if board_area is None:
+                self.stats["noBoard"] += 1
+                return None
+            self._set_area(board_area)
+
+        if signature is None:
+            signature = self.signature(img)
+        if self._reference is None:
+            changed = np.ones((8, 8), dtype=bool)
+        else:
+            changed = self.square_diff(signature) > self.threshold
+            count = int(changed.sum())
+            if count == 0:
+                self.stats["unchanged"] += 1
+                return self._settle(index)
+            if count >= SEQUENCE_REDETECT_SQUARES:
+                # 보드가 움직였거나 화면이 바뀌었을 수 있습니다: 이전 영역을 힌트로 다시 찾고 전부 다시 분류
+                self.stats["redetected"] += 1
+                with span("sequence.detect"):
+                    board_area, _, _ = detect_board_area(img, cv2, np, hint=self.board_area)
+                if board_area is None:
+                    self.stats["noBoard"] += 1
+                    return None
+                if board_area != self.board_area:
+                    self._set_area(board_area)
+                    signature, board_img = self.signature(img), None
+                changed = np.ones((8, 8), dtype=bool)
+
+        self._reclassify(img, changed, board_img)
+        if self._reference is None:
+            self._reference = signature.copy()
+        else:
+            cell = SEQUENCE_SIGNATURE_CELL
+            reference = self._reference.reshape(8, cell, 8, cell, 3).transpose(0, 2, 1, 3, 4)
+            reference[changed] = signature.reshape(8, cell, 8, cell, 3).transpose(0, 2, 1, 3, 4)[changed]
+        self.pending = 0
+        return self._settle(index)
+
+    def _reclassify(self, img, changed, board_img=None):
+        from fen_classifier import CLASSES, square_features
+
+        np = self.np
+        squares = np.flatnonzero(changed)
+        if board_img is None:
+            with span("sequence.warp"):
+                board_img = extract_board(img, self.board_area, self.cv2, np)
+        self.board_img = board_img
+        with span("sequence.classify"):
+            predicted = self.classifier.predict_proba(square_features(self.board_img, squares)).argmax(axis=1)
+        labels = [list(row) for row in self.labels] if self.labels else [[""] * 8 for _ in range(8)]
+        for square, label in zip(squares.tolist(), predicted.tolist()):
+            labels[square // 8][square % 8] = CLASSES[label]
+        if len(squares) == 64:
+            # 전체를 다시 분류했을 때만 보드 방향을 다시 판단합니다 (수 하나로 방향이 바뀌지 않도록)
+            self.flipped = board_is_flipped([['w' if p.isupper() else 'b' if p else '' for p in row] for row in labels])
+        self.labels = labels
+        self.stats["reclassified"] += 1
+        self.stats["squares"] += len(squares)
+
+    def _settle(self, index):
+        if self.labels is None or self.labels == self.committed:
+            self.pending = 0
+            return None
+        self.pending += 1
+        if self.pending < self.stable_frames:
+            return None
+        board = [row[::-1] for row in self.labels[::-1]] if self.flipped else self.labels
+        if self.pending < self.resync_frames and not self.game.explains(board):
+            return None
+        self.committed = [list(row) for row in self.labels]
+        pushed = self.game.push([list(row) for row in board])
+        move = pushed["move"]
+        return {
+            "type": "position",
+            "frame": index,
+            "fen": self.game.fen(),
+            "move": move.uci() if move else None,
+            "san": pushed["san"],
+            "newGame": pushed["newGame"],
+            "flipped": self.flipped,
+        }
+
+
+def iter_sequence_frames(path, cv2, np, step=1):
+    """
+    sequence 입력의 프레임을 순서대로 (index, meta, img) 로 냅니다. 디코드 실패 시 img는 None.
+    디렉터리/zip 이면 이미지를 이름 순으로 디코드하고, 그 밖의 파일은 cv2.VideoCapture로 읽습니다.
+    step > 1 이면 step 프레임마다 하나만 디코드합니다 (동영상은 grab만 하고 건너뜀).
+    """
+    import zipfile
+
+    if os.path.isdir(path) or zipfile.is_zipfile(path):
+        for index, source in enumerate(iter_batch_sources(path)):
+            if index % step:
+                continue
+            img = cv2.imdecode(np.frombuffer(_batch_read(source), np.uint8), cv2.IMREAD_COLOR)
+            yield index, {"source": source[2]}, img
+        return
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Not a directory, zip archive or readable video: {path}")
+    try:
+        index = -1
+        while capture.grab():
+            index += 1
+            if index % step:
+                continue
+            ok, img = capture.retrieve()
+            yield index, {"timeMs": round(capture.get(cv2.CAP_PROP_POS_MSEC), 1)}, img if ok else None
+    finally:
+        capture.release()
+
+
+_PIPELINE_END = object()
+
+
+def _pipeline_stage(work, inbox, outbox, failures):
+    """
+    파이프라인 스레드 본문: inbox 항목마다 work(item)을 outbox로 넘깁니다 (None이면 버림).
+    실패하면 앞 단계가 막히지 않도록 inbox를 끝까지 비우고, 어떤 경우든 끝 표시를 다음 단계로 넘깁니다.
+    """
+    try:
+        while True:
+            item = inbox.get()
+            if item is _PIPELINE_END:
+                break
+            result = work(item)
+            if result is not None:
+                outbox.put(result)
+    except BaseException as e:
+        failures.append(e)
+        while inbox.get() is not _PIPELINE_END:
+            pass
+    finally:
+        outbox.put(_PIPELINE_END)
+
+
+def run_sequence(argv):
+    """
+    sequence 서브커맨드. 프레임을 decode → warp(서명, 편 보드) → classify(SequenceRecognizer) → emit
+    파이프라인으로 처리합니다. 단계 사이는 크기 제한 큐이고 앞의 세 단계는 스레드입니다
+    (cv2 디코드/warp와 NumPy 연산은 GIL을 놓습니다). 큐가 차면 앞 단계가 기다리므로 동영상 길이와 관계없이
+    메모리에는 몇 프레임만 올라갑니다. 확정된 위치마다 position 레코드를, 마지막에 PGN 레코드를 NDJSON으로 씁니다.
+    """
+    import argparse
+    import collections
+    import queue
+    import threading
+    import time
+
+    parser = argparse.ArgumentParser(prog="recognize-fen.py sequence", description="Digitize a game from consecutive frames.")
+    parser.add_argument("source", help="video file, or directory (recursive) / .zip archive of frames in name order")
+    parser.add_argument("--out", default="-", help="output NDJSON path (default: stdout)")
+    parser.add_argument("--pgn", help="also write the PGN to this path")
+    parser.add_argument("--board-area", help="x1,y1,x2,y2 instead of detecting on the first frame")
+    parser.add_argument("--stable-frames", type=int, default=SEQUENCE_STABLE_FRAMES,
+                        help="frames a new position must persist before it is accepted")
+    parser.add_argument("--threshold", type=float, default=SEQUENCE_DIFF_THRESHOLD,
+                        help="per-square mean absolute difference (0..255) that marks a square as changed")
+    parser.add_argument("--resync-frames", type=int, default=SEQUENCE_RESYNC_FRAMES,
+                        help="frames an unexplained position must persist before a new game is started from it")
+    parser.add_argument("--frame-step", type=int, default=1, help="process every Nth frame")
+    parser.add_argument("--queue-size", type=int, default=SEQUENCE_QUEUE_SIZE, help="frames buffered between stages")
+    args = parser.parse_args(argv)
+
+    cv2, np = load_cv()
+    classifier = get_piece_classifier()
+    if classifier is None:
+        raise SystemExit("sequence mode needs the built-in piece classifier (CHESS_PIECE_MODEL)")
+    sequence = SequenceRecognizer(
+        cv2, np, classifier,
+        board_area=board_area_arg(args.board_area) if args.board_area else None,
+        stable_frames=max(1, args.stable_frames),
+        threshold=args.threshold,
+        resync_frames=args.resync_frames,
+    )
+
+    size = max(1, args.queue_size)
+    decoded, prepared, records = queue.Queue(size), queue.Queue(size), queue.Queue(size)
+    failures = []
+    # 시간 통계도 최근 프레임만 (길이와 관계없는 메모리)
+    unchanged_ms, changed_ms = collections.deque(maxlen=10000), collections.deque(maxlen=10000)
+
+    def decode():
+        try:
+            for item in iter_sequence_frames(args.source, cv2, np, max(1, args.frame_step)):
+                decoded.put(item)
+        except BaseException as e:
+            failures.append(e)
+        finally:
+            decoded.put(_PIPELINE_END)
+
+    def warp(item):
+        index, meta, img = item
+        return index, meta, img, sequence.prepare(img) if img is not None else None
+
+    def classify(item):
+        index, meta, img, ready = item
+        if img is None:
+            return {"type": "error", "frame": index, **meta, "error": "Could not decode image"}
+        unchanged = sequence.stats["unchanged"]
+        started = time.perf_counter()
+        record = sequence.process(img, index, ready)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        (unchanged_ms if sequence.stats["unchanged"] > unchanged else changed_ms).append(elapsed_ms)
+        if record is not None:
+            record.update(meta)
+        return record
+
+    threads = [
+        threading.Thread(target=decode, name="sequence-decode", daemon=True),
+        threading.Thread(target=_pipeline_stage, args=(warp, decoded, prepared, failures), name="sequence-warp", daemon=True),
+        threading.Thread(target=_pipeline_stage, args=(classify, prepared, records, failures), name="sequence-classify", daemon=True),
+    ]
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    started = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        while True:
+            record = records.get()
+            if record is _PIPELINE_END:
+                break
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+        for thread in threads:
+            thread.join()
+        if failures:
+            raise SystemExit(f"sequence failed: {failures[0]}")
+        pgn = sequence.game.pgn()
+        out.write(json.dumps({"type": "pgn", "pgn": pgn, "stats": sequence.stats}) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if args.pgn:
+        with open(args.pgn, "w", encoding="utf-8") as f:
+            f.write(pgn)
+
+    def median(values):
+        return round(float(np.median(values)), 3) if values else None
+
+    elapsed = time.perf_counter() - started
+    frames = sequence.stats["frames"]
+    print(
+        f"[sequence] {frames} frames in {elapsed:.2f}s ({frames / elapsed if elapsed > 0 else 0.0:.1f} frames/s) - "
+        f"unchanged p50 {median(unchanged_ms)} ms, changed p50 {median(changed_ms)} ms, "
+        f"{sequence.stats['squares']} squares reclassified",
+        file=sys.stderr,
     )
 
 
+def run_analyse(argv):
+    """analyse 서브커맨드. 위치 하나를 분석하여 JSON 한 줄로 출력합니다."""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="recognize-fen.py analyse", description="Analyse one position.")
+    parser.add_argument("fen", help="FEN (placement only implies white to move)")
+    parser.add_argument("--depth", type=int, help="search depth (default 15 when no --movetime)")
+    parser.add_argument("--movetime", type=int, help="search time in ms (local engine only)")
+    args = parser.parse_args(argv)
+    try:
+        print(json.dumps(handle_analyse({"fen": args.fen, "depth": args.depth, "movetime": args.movetime})))
+    finally:
+        if _engine_pool is not None:
+            _engine_pool.close()
+
+
+def main():
+    if sys.argv[1:2] == ["analyse"]:
+        run_analyse(sys.argv[2:])
+        return
+
+    if sys.argv[1:2] == ["batch"]:
+        run_batch(sys.argv[2:])
+        return
+
+    if sys.argv[1:2] == ["validate"]:
+        run_validate(sys.argv[2:])
+        return
+
+    if sys.argv[1:2] == ["sequence"]:
+        run_sequence(sys.argv[2:])
+        return
+
+    if sys.argv[1:2] == ["calibrate"]:
+        run_calibrate(sys.argv[2:])
+        return
+
+    if "--worker" in sys.argv[1:]:
+        run_worker()
+        return
+
+    if sys.argv[1:2] == ["--fork-server"]:
+        run_fork_server(sys.argv[2] if len(sys.argv) > 2 else FORK_SERVER_SOCKET)
+        return
+
+    tracer = Tracer()
+    with tracer.span("read_input"):
+        raw = sys.stdin.buffer.read()
+    image_data = None
+    try:
+        with tracer.span("parse_input"):
+            if raw[:len(FRAME_MAGIC)] == FRAME_MAGIC:
+                payload, image_data = parse_frame(raw)
+            else:
+                payload = json.loads(raw or b"{}")
+    except Exception:
+        payload = {}
+
+    print(json.dumps(handle_request(payload, image_data=image_data, tracer=tracer)))
+    # 무시된 채 아직 도는 감지 방식을 인터프리터 종료 때 기다리지 않습니다 (응답은 이미 썼으므로)
+    if _detect_scheduler is not None and _detect_scheduler.shutdown():
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(0)
+
+
 if __name__ == "__main__":
     main()
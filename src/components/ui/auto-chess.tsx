@@ -104,7 +104,7 @@ export const AutoChessComponent = () => {
 
     try {
       // 전체 화면 스크린샷을 찍어서 Python API가 체스판 영역을 찾도록 함
-      const result = await recognizeFen(null);
+      const result = await recognizeFen(null, { debug: "none" });
 
       if (result.boardArea && result.boardArea.topLeft && result.boardArea.bottomRight) {
         const area = result.boardArea;
@@ -269,7 +269,7 @@ export const AutoChessComponent = () => {
     try {
       // 1. 체스판 스크린샷 찍고 FEN 인식
       setStatus("🔍 체스판 스캔 중...");
-      const result = await recognizeFen(boardArea);
+      const result = await recognizeFen(boardArea, { debug: "none" });
 
       if (!result.fen) {
         addLog("⚠️ FEN 인식 실패");
@@ -6,8 +6,13 @@ export interface Position {
 export interface BoardArea {
   topLeft: Position;
   bottomRight: Position;
+  // recognizer가 찾은 실제 보드 모서리 (좌상, 우상, 우하, 좌하). 원근이 있으면 사각형이 아닐 수 있음
+  corners?: Position[];
 }
 
+// none: fen/boardArea만, info: + debugInfo, path: + 디버그 이미지 파일, image: + base64 이미지
+export type DebugLevel = "none" | "info" | "path" | "image";
+
 export interface RecognizeResult {
   fen: string | null;
   boardArea?: BoardArea | null;
@@ -15,6 +20,10 @@ export interface RecognizeResult {
   debugImagePath?: string | null;
 }
 
+// 이 앱 인스턴스의 세션 id. FEN API는 같은 세션의 직전 보드 영역만 다음 요청의 힌트로 재사용합니다.
+const FEN_SESSION_ID =
+  globalThis.crypto?.randomUUID?.() ?? `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
 export async function captureBoardImage(boardArea: BoardArea): Promise<string> {
   const { invoke } = await import("@tauri-apps/api/core");
   return invoke<string>("capture_board_image", { boardArea });
@@ -25,9 +34,19 @@ export async function captureFullscreenImage(): Promise<string> {
   return invoke<string>("capture_fullscreen_image");
 }
 
+function base64ToBytes(value: string): Uint8Array {
+  const binary = atob(value.replace(/^data:[^,]*,/, ""));
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i += 1) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  return bytes;
+}
+
 export async function fetchFenFromApi(payload: {
   imageBase64: string;
   boardArea?: BoardArea | null;
+  debug?: DebugLevel;
 }): Promise<RecognizeResult> {
   const rawUrl =
     import.meta.env.VITE_CHESS_FEN_API_URL || "http://127.0.0.1:5179/fen";
@@ -36,11 +55,20 @@ export async function fetchFenFromApi(payload: {
   const controller = new AbortController();
   const timeoutId = setTimeout(() => controller.abort(), 7000);
 
+  // VITE_CHESS_FEN_TRANSPORT=binary 이면 base64 JSON 대신 원본 bytes를 전송 (33% 작음)
+  const useBinary = import.meta.env.VITE_CHESS_FEN_TRANSPORT === "binary";
+  const { imageBase64, ...meta } = payload;
+  const body = useBinary ? base64ToBytes(imageBase64) : JSON.stringify(payload);
+  const headers: Record<string, string> = useBinary
+    ? { "Content-Type": "application/octet-stream", "X-Chess-Meta": JSON.stringify(meta) }
+    : { "Content-Type": "application/json" };
+  headers["X-Chess-Session"] = FEN_SESSION_ID;
+
   const attemptFetch = async () => {
     return await fetch(url, {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(payload),
+      headers,
+      body,
       signal: controller.signal,
     });
   };
@@ -98,9 +126,12 @@ export async function fetchFenFromApi(payload: {
   };
 }
 
-export async function recognizeFen(boardArea?: BoardArea | null): Promise<RecognizeResult> {
+export async function recognizeFen(
+  boardArea?: BoardArea | null,
+  options: { debug?: DebugLevel } = {}
+): Promise<RecognizeResult> {
   const imageBase64 = boardArea
     ? await captureBoardImage(boardArea)
     : await captureFullscreenImage();
-  return fetchFenFromApi({ boardArea: boardArea || null, imageBase64 });
+  return fetchFenFromApi({ boardArea: boardArea || null, imageBase64, debug: options.debug });
 }